@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.inventory import InventoryManagement
+from management.ledger import COLUMNS
+from management.sales import SalesManagement
+
+"""
+Benchmark of an end of day import of orders, added one by one with SalesManagement.add_order and at once with
+SalesManagement.add_orders. A tenth of the orders are invalid and rejected.
+
+Usage:
+python bulk_order_benchmark.py [orders]
+- 'orders': The number of orders to import, default 5000.
+"""
+
+
+def make_orders(orders):
+    """Returns a DataFrame of random selling and picking orders."""
+    generator = np.random.default_rng(0)
+    varieties = np.array(["Ambrosia", "Elberta", "Lapins", "Gala"])
+    return pd.DataFrame({
+        "sales_type": generator.choice(["selling", "picking"], orders),
+        "fruit_variety": varieties[generator.choice(4, orders, p=[0.3, 0.3, 0.3, 0.1])],
+        "weight": generator.integers(1, 20, orders),
+    })
+
+
+def run(directory, orders, bulk):
+    """Returns the import time in seconds and the number of orders written."""
+    files = [os.path.join(directory, name) for name in ["extra.csv", "remaining.csv", "inventory.csv"]]
+    order_file = os.path.join(directory, "orders.csv")
+    stock = np.full((1, len(COLUMNS)), orders * 20, dtype=np.int64)
+    stock[0, 0] = 1
+    for file_path in files:
+        pd.DataFrame(stock, columns=COLUMNS).to_csv(file_path, index=False)
+    if os.path.exists(order_file):
+        os.remove(order_file)
+
+    inventory_manager = InventoryManagement(*files)
+    sales_manager = SalesManagement(inventory_manager, order_file)
+    frame = make_orders(orders)
+    with redirect_stdout(StringIO()):
+        start = time.perf_counter()
+        if bulk:
+            sales_manager.add_orders(frame)
+        else:
+            for order in frame.itertuples(index=False):
+                try:
+                    sales_manager.add_order(order.sales_type, order.fruit_variety, int(order.weight))
+                except ValueError:
+                    pass
+        elapsed = time.perf_counter() - start
+    return elapsed, len(pd.read_csv(order_file))
+
+
+def main(orders):
+    with tempfile.TemporaryDirectory() as directory:
+        loop_time, loop_written = run(directory, orders, False)
+        bulk_time, bulk_written = run(directory, orders, True)
+    if loop_written != bulk_written:
+        raise AssertionError(f"{loop_written} orders written by add_order, {bulk_written} by add_orders")
+    print(f"orders: {orders}, written: {bulk_written}")
+    print(f"add_order loop: {loop_time:.3f} s ({orders / loop_time:.0f} orders/s)")
+    print(f"add_orders: {bulk_time:.3f} s ({orders / bulk_time:.0f} orders/s), {loop_time / bulk_time:.0f}x faster")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.inventory import InventoryManagement
+from management.ledger import COLUMNS, VARIETIES
+
+"""
+Stress test of InventoryManagement shared by several threads. Each thread adds and reserves inventory, either of
+its own variety or of one variety shared by all threads. The final inventory is checked for lost updates, and the
+throughput is printed for each number of threads, with the files written by each operation while it holds the file
+lock, or by the writer thread with write_behind.
+
+Usage:
+python concurrency_benchmark.py [operations]
+- 'operations': The number of operations of each thread, default 2000.
+"""
+
+
+def run(directory, threads_number, operations, write_behind, shared_variety):
+    """Returns the throughput in operations per second, after checking the final inventory."""
+    files = [os.path.join(directory, name) for name in ["extra.csv", "remaining.csv", "inventory.csv"]]
+    stock = np.full((1, len(COLUMNS)), 10 ** 9, dtype=np.int64)
+    stock[0, 0] = 1
+    for file_path in files:
+        pd.DataFrame(stock, columns=COLUMNS).to_csv(file_path, index=False)
+    manager = InventoryManagement(*files, write_behind=write_behind)
+
+    def worker(variety):
+        for i in range(operations // 2):
+            manager.add_inventory(variety, 2)
+            manager.try_reserve(variety, 1)
+
+    varieties = [VARIETIES[0] if shared_variety else VARIETIES[i % len(VARIETIES)] for i in range(threads_number)]
+    threads = [threading.Thread(target=worker, args=(variety,)) for variety in varieties]
+    with redirect_stdout(StringIO()):
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        manager.close()
+        elapsed = time.perf_counter() - start
+
+    last = pd.read_csv(files[2]).iloc[-1]
+    for variety in set(varieties):
+        expected = 10 ** 9 + varieties.count(variety) * (operations // 2)
+        if last[variety] != expected:
+            raise AssertionError(f"lost update on {variety}: {last[variety]} != {expected}")
+    return threads_number * operations / elapsed
+
+
+def main(operations):
+    print(f"{'threads':>8} {'variety':>8} {'per-op write (ops/s)':>22} {'write-behind (ops/s)':>22}")
+    with tempfile.TemporaryDirectory() as directory:
+        for threads_number in [1, 2, 4, 8]:
+            for shared_variety in [False, True]:
+                per_op = run(directory, threads_number, operations, False, shared_variety)
+                write_behind = run(directory, threads_number, operations, True, shared_variety)
+                label = "shared" if shared_variety else "own"
+                print(f"{threads_number:>8} {label:>8} {per_op:22.0f} {write_behind:22.0f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.inventory import InventoryManagement
+from management.ledger import COLUMNS
+
+"""
+Benchmark of the per-operation latency of InventoryManagement.add_inventory as the ledger grows.
+
+Usage:
+python inventory_append_benchmark.py [max_rows]
+- 'max_rows': The largest ledger size to test, default 1000000.
+"""
+
+
+def write_ledger(file_path, rows):
+    """Write a ledger with the given number of rows, each variety holding a large stock."""
+    data = np.full((rows, len(COLUMNS)), 100000, dtype=np.int64)
+    data[:, 0] = np.arange(1, rows + 1)
+    pd.DataFrame(data, columns=COLUMNS).to_csv(file_path, index=False)
+
+
+def time_operations(directory, rows, append_only, operations=200):
+    """Returns the mean latency in microseconds of add_inventory on a ledger of the given size."""
+    inventory_file = os.path.join(directory, "inventory.csv")
+    remaining_file = os.path.join(directory, "remaining_productivity.csv")
+    extra_file = os.path.join(directory, "extra_productivity.csv")
+    write_ledger(inventory_file, rows)
+    write_ledger(remaining_file, rows)
+    write_ledger(extra_file, 1)
+
+    manager = InventoryManagement(extra_file, remaining_file, inventory_file, append_only=append_only)
+    start = time.perf_counter()
+    for i in range(operations):
+        manager.add_inventory("Lapins", 1)
+    return (time.perf_counter() - start) / operations * 1e6
+
+
+def main(max_rows):
+    sizes = [size for size in [1000, 10000, 100000, 1000000] if size <= max_rows]
+    print(f"{'rows':>10} {'append (us/op)':>16} {'rewrite (us/op)':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            append_latency = time_operations(directory, rows, True)
+            # rewriting the whole file is too slow to repeat on the largest ledgers
+            if rows <= 100000:
+                rewrite_latency = f"{time_operations(directory, rows, False, operations=20):16.0f}"
+            else:
+                rewrite_latency = f"{'-':>16}"
+            print(f"{rows:>10} {append_latency:16.0f} {rewrite_latency}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
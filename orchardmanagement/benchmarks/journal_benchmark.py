@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.inventory import InventoryManagement
+from management.ledger import COLUMNS
+from management.sales import SalesManagement
+
+"""
+Benchmark of the latency of SalesManagement.add_order with a journal. Each mode adds the same selling orders:
+- 'no journal': the files are written by each order, without any sync.
+- 'journal': each order is synced to the journal once before the files are written.
+- 'journal, write-behind': the orders are committed by the writer thread, one sync for all the orders added
+  while the previous group was written.
+
+Usage:
+python journal_benchmark.py [orders]
+- 'orders': The number of selling orders to add in each mode, default 2000.
+"""
+
+
+def run(directory, orders, journal, write_behind):
+    """Returns the order latencies in seconds, and the number of journal syncs."""
+    files = [os.path.join(directory, name) for name in ["extra.csv", "remaining.csv", "inventory.csv"]]
+    order_file = os.path.join(directory, "orders.csv")
+    journal_file = os.path.join(directory, "journal.log") if journal else None
+    stock = np.full((1, len(COLUMNS)), orders * 10, dtype=np.int64)
+    stock[0, 0] = 1
+    for file_path in files:
+        pd.DataFrame(stock, columns=COLUMNS).to_csv(file_path, index=False)
+    for file_path in [order_file, journal_file]:
+        if file_path is not None and os.path.exists(file_path):
+            os.remove(file_path)
+
+    inventory_manager = InventoryManagement(*files, write_behind=write_behind, journal=journal_file)
+    sales_manager = SalesManagement(inventory_manager, order_file)
+    syncs = [0]
+    if journal:
+        write = inventory_manager.journal.write
+
+        def counted_write(targets):
+            written = write(targets)
+            syncs[0] += written
+            return written
+        inventory_manager.journal.write = counted_write
+    varieties = ["Ambrosia", "Elberta", "Lapins"]
+    latencies = []
+    with redirect_stdout(StringIO()):
+        for i in range(orders):
+            start = time.perf_counter()
+            sales_manager.add_order("selling", varieties[i % 3], 5)
+            latencies.append(time.perf_counter() - start)
+        inventory_manager.close()
+    if len(pd.read_csv(order_file)) != orders:
+        raise AssertionError("orders lost")
+    return np.array(latencies), syncs[0]
+
+
+def main(orders):
+    print(f"{'mode':>22} {'p50 (us)':>10} {'p99 (us)':>10} {'orders/s':>10} {'syncs':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, journal, write_behind in [("no journal", False, False), ("journal", True, False),
+                                            ("journal, write-behind", True, True)]:
+            latencies, syncs = run(directory, orders, journal, write_behind)
+            print(f"{mode:>22} {np.percentile(latencies, 50) * 1e6:10.0f} {np.percentile(latencies, 99) * 1e6:10.0f}"
+                  f" {orders / latencies.sum():10.0f} {syncs:7d}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
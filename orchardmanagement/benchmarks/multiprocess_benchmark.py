@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.inventory import InventoryManagement
+from management.ledger import COLUMNS, VARIETIES
+
+"""
+Benchmark of several processes writing the same inventory files, as two copies of the orchard CLI sharing a data
+directory. Each process adds inventory with its own InventoryManagement, serialized by the file lock, and the final
+inventory is checked for lost updates.
+
+Usage:
+python multiprocess_benchmark.py [operations]
+- 'operations': The number of operations of each process, default 500.
+"""
+
+
+def writer(files, variety, operations):
+    with redirect_stdout(StringIO()):
+        manager = InventoryManagement(*files)
+        for i in range(operations):
+            manager.add_inventory(variety, 1)
+
+
+def run(directory, writers, operations):
+    """Returns the throughput in operations per second of all writers, after checking the final inventory."""
+    files = [os.path.join(directory, name) for name in ["extra.csv", "remaining.csv", "inventory.csv"]]
+    stock = np.full((1, len(COLUMNS)), 10 ** 9, dtype=np.int64)
+    stock[0, 0] = 1
+    for file_path in files:
+        pd.DataFrame(stock, columns=COLUMNS).to_csv(file_path, index=False)
+
+    varieties = [VARIETIES[i % len(VARIETIES)] for i in range(writers)]
+    processes = [multiprocessing.Process(target=writer, args=(files, variety, operations)) for variety in varieties]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    inventory = pd.read_csv(files[2])
+    if len(inventory) != 1 + writers * operations:
+        raise AssertionError(f"{len(inventory)} rows written instead of {1 + writers * operations}")
+    for variety in set(varieties):
+        expected = 10 ** 9 + varieties.count(variety) * operations
+        if inventory[variety].iloc[-1] != expected:
+            raise AssertionError(f"lost update on {variety}")
+    return writers * operations / elapsed
+
+
+def main(operations):
+    print(f"{'writers':>8} {'throughput (ops/s)':>20}")
+    with tempfile.TemporaryDirectory() as directory:
+        for writers in [1, 2, 4, 8]:
+            print(f"{writers:>8} {run(directory, writers, operations):20.0f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
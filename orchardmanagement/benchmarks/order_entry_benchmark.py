@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.inventory import InventoryManagement
+from management.ledger import COLUMNS
+from management.sales import SalesManagement
+
+"""
+Benchmark of the sustained throughput of SalesManagement.add_order for selling orders. Each order reserves its
+weight with InventoryManagement.try_reserve, which writes one inventory row.
+
+Usage:
+python order_entry_benchmark.py [orders]
+- 'orders': The number of selling orders to add, default 5000.
+"""
+
+
+def main(orders):
+    with tempfile.TemporaryDirectory() as directory:
+        inventory_file = os.path.join(directory, "inventory.csv")
+        remaining_file = os.path.join(directory, "remaining_productivity.csv")
+        extra_file = os.path.join(directory, "extra_productivity.csv")
+        order_file = os.path.join(directory, "orders.csv")
+        stock = np.full((1, len(COLUMNS)), orders * 10, dtype=np.int64)
+        stock[0, 0] = 1
+        for file_path in [inventory_file, remaining_file, extra_file]:
+            pd.DataFrame(stock, columns=COLUMNS).to_csv(file_path, index=False)
+
+        inventory_manager = InventoryManagement(extra_file, remaining_file, inventory_file)
+        sales_manager = SalesManagement(inventory_manager, order_file)
+        varieties = ["Ambrosia", "Elberta", "Lapins"]
+        with redirect_stdout(StringIO()):
+            start = time.perf_counter()
+            for i in range(orders):
+                sales_manager.add_order("selling", varieties[i % 3], 5)
+            elapsed = time.perf_counter() - start
+
+        inventory_rows = len(pd.read_csv(inventory_file)) - 1
+        print(f"orders: {orders}")
+        print(f"throughput: {orders / elapsed:.0f} orders/s ({elapsed / orders * 1e6:.0f} us/order)")
+        print(f"inventory rows written per order: {inventory_rows / orders:.2f}")
+        print(f"Ambrosia left: {inventory_manager.available('Ambrosia')} of {orders * 10}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from management.order_store import compact_orders
+from management.sales import FRUIT_TYPE_NUMS
+
+"""
+Benchmark of the memory of SalesManagement.orders for a long order history. The same synthetic orders are measured
+as they were kept before, with Python strings and int64 columns, and with the compact dtypes of compact_orders:
+categorical sales_type and fruit_variety, narrow integers for the index, fruit_type and whole weights. The money
+columns stay float64 in both.
+
+Usage:
+python order_memory_benchmark.py [orders]
+- 'orders': The number of synthetic orders, default 10000000.
+"""
+
+
+def synthetic_orders(orders):
+    """Returns orders with the dtypes read from orders.csv before the compact dtypes."""
+    generator = np.random.default_rng(0)
+    varieties = np.array(list(FRUIT_TYPE_NUMS), dtype=object)
+    variety = varieties[generator.integers(0, len(varieties), orders)]
+    weight = generator.integers(1, 100, orders)
+    unit_price = generator.choice([0.8, 1.2, 1.5, 2.99], orders)
+    return pd.DataFrame({
+        "index": np.arange(1, orders + 1, dtype=np.int64),
+        "sales_type": np.array(["selling", "picking"], dtype=object)[generator.integers(0, 2, orders)],
+        "fruit_type": pd.Series(variety).map(FRUIT_TYPE_NUMS).to_numpy(np.int64),
+        "fruit_variety": variety,
+        "weight": weight,
+        "unit_price": unit_price,
+        "revenue": np.round(weight * unit_price, 2),
+    })
+
+
+def memory(orders):
+    """Returns the memory of each column in MB, strings included."""
+    return orders.memory_usage(index=False, deep=True) / 1e6
+
+
+def main(orders):
+    # the strings of each order are separate objects, as parsed from a CSV file
+    before = synthetic_orders(orders)
+    for column in ["sales_type", "fruit_variety"]:
+        before[column] = [str(value) for value in before[column]]
+    start = time.perf_counter()
+    after = compact_orders(before)
+    seconds = time.perf_counter() - start
+    before_memory = memory(before)
+    after_memory = memory(after)
+    print(f"{orders} orders, compacted in {seconds:.2f} s")
+    print(f"{'column':>14} {'before':>10} {'after':>14} {'MB before':>10} {'MB after':>9}")
+    for column in before.columns:
+        print(f"{column:>14} {str(before[column].dtype):>10} {str(after[column].dtype):>14} "
+              f"{before_memory[column]:10.1f} {after_memory[column]:9.1f}")
+    print(f"{'total':>14} {'':>10} {'':>14} {before_memory.sum():10.1f} {after_memory.sum():9.1f}"
+          f"  ({before_memory.sum() / after_memory.sum():.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
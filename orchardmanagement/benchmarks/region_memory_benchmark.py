@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from production.fruit_info import Apple
+from production.plantation import Region
+
+"""
+Benchmark of the memory of many Region and Fruit instances. The same synthetic regions are measured as instances of
+a class with a __dict__, as Region was before, and as instances of Region, which keeps its attributes in __slots__.
+The fruits are measured the same way against Apple.
+
+Usage:
+python region_memory_benchmark.py [regions]
+- 'regions': The number of synthetic regions, default 1000000.
+"""
+
+
+class DictRegion:
+    """A region with a per-instance __dict__, the attributes of Region before __slots__."""
+
+    def __init__(self, regionId, fruit_type_num, variety, area, areaType):
+        self.regionId = regionId
+        self.fruit_type_num = fruit_type_num
+        self.variety = variety
+        self.area = area
+        self.areaType = areaType
+
+
+class DictApple:
+    """An apple with a per-instance __dict__, the attributes of Fruit before __slots__."""
+
+    def __init__(self, variety, size, sweet, sour, taste, price, use):
+        self.variety = variety
+        self.size = size
+        self.sweet = sweet
+        self.sour = sour
+        self.taste = taste
+        self.__price = price
+        self.use = use
+
+
+def measure(build, count):
+    """Returns the memory in MB and the seconds taken to build count instances, the list included."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    instances = [build(i) for i in range(count)]
+    seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    del instances
+    return size, seconds
+
+
+def main(regions):
+    area_types = ["market", "pick"]
+    cases = [
+        ("Region", DictRegion, Region, lambda cls, i: cls(i, 1, "Ambrosia", float(i % 50), area_types[i % 2])),
+        ("Fruit", DictApple, Apple,
+         lambda cls, i: cls("Ambrosia", "big", "very sweet", "less sour", "crunchy", 1.2, "pie")),
+    ]
+    print(f"{regions} instances of each class")
+    print(f"{'class':>8} {'MB __dict__':>12} {'MB __slots__':>13} {'s __dict__':>11} {'s __slots__':>12}")
+    for name, dict_class, slot_class, build in cases:
+        dict_size, dict_seconds = measure(lambda i: build(dict_class, i), regions)
+        slot_size, slot_seconds = measure(lambda i: build(slot_class, i), regions)
+        print(f"{name:>8} {dict_size:12.1f} {slot_size:13.1f} {dict_seconds:11.2f} {slot_seconds:12.2f}"
+              f"  ({dict_size / slot_size:.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
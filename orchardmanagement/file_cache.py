@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+from file_lock import file_signature
+
+"""
+This module contains the load cache shared by the whole process, used to keep the Fruit and Region instances built
+from a data file while the file is unchanged, e.g. when a menu of fruit_info_operation is opened again.
+
+A cached value is keyed by the path of its file and checked against the modification time and size of the file,
+so a file written by another process is loaded again. The writers of the package invalidate the file they write as
+well, as a file rewritten within the resolution of its modification time may keep the same signature.
+"""
+
+
+class LoadCache:
+    """
+    Represents a least recently used cache of the values loaded from data files, e.g. the fruits of several
+    orchards' data directories. The least recently used value is dropped when the cache holds more than maxsize
+    values.
+
+    Attributes:
+    - maxsize (int): The number of values kept.
+    - hits (int): The number of loads answered from the cache.
+    - misses (int): The number of loads that read the file.
+    """
+
+    def __init__(self, maxsize=32):
+        """
+        Initializes an empty instance of LoadCache.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # (signature, value) keyed by (kind, absolute path), in the order of use
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Returns the number of values in the cache.
+        """
+        return len(self._values)
+
+    def get(self, kind, file_path, loader):
+        """
+        Returns the value of a file, loaded by loader if the file has changed since it was cached.
+
+        Parameters:
+        - kind (str): What is loaded from the file, e.g. "fruits", so one file can hold several values.
+        - file_path (str): The path of the file.
+        - loader (function): Called with no arguments to load the value from the file.
+
+        Returns:
+            The cached or loaded value. A missing file is not cached, the value of loader is returned.
+        """
+        key = (kind, os.path.abspath(file_path))
+        signature = file_signature(file_path)
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and signature is not None and cached[0] == signature:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        # the signature is taken before the file is read, so a write during the load is found by the next get
+        value = loader()
+        if signature is not None:
+            with self._lock:
+                self._values[key] = (signature, value)
+                self._values.move_to_end(key)
+                while len(self._values) > self.maxsize:
+                    self._values.popitem(last=False)
+        return value
+
+    def invalidate(self, file_path):
+        """
+        Drop the values of a file, e.g. after it is written.
+        """
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [key for key in self._values if key[1] == path]:
+                del self._values[key]
+
+    def clear(self):
+        """
+        Drop all the values.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+# the cache of the process
+load_cache = LoadCache()
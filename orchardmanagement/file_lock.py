@@ -0,0 +1,108 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on Windows, the locks only work between threads of one process there
+    fcntl = None
+
+"""
+This module contains the advisory file locks used to share the data files between several processes, e.g. two
+copies of the orchard CLI working on the same data directory.
+
+The lock of a data file is held on a separate file next to it, e.g. inventory.csv.lock for inventory.csv, so the
+data file can be rewritten while the lock is held. A lock is released by the operating system if the process
+holding it stops, so no lock is left behind by a crashed process.
+"""
+
+
+class FileLock:
+    """
+    Represents an exclusive advisory lock on a data file, held with fcntl.flock on its lock file. The lock is
+    reentrant: the thread holding it can acquire it again, e.g. add_fruit holding the lock of the fruit file while
+    calling file_store. Other threads of the process wait as they would for another process.
+
+    Attributes:
+    - file_path (str): The path of the data file.
+    - lock_path (str): The path of the lock file.
+    """
+
+    def __init__(self, file_path):
+        """
+        Initializes an instance of FileLock. Use file_lock(file_path) to get the lock shared by the whole process.
+        """
+        self.file_path = file_path
+        self.lock_path = file_path + ".lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        """
+        Wait until the lock is free and acquire it.
+        """
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.lock_path, "a")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except OSError:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        """
+        Release the lock, the lock file is unlocked when the outermost acquire is released.
+        """
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def file_lock(file_path):
+    """
+    Returns the lock of a data file. All callers in a process get the same FileLock for the same file, so the
+    lock is reentrant across modules.
+
+    Usage:
+    with file_lock("management/orders.csv"):
+        ...  # read, change and write orders.csv
+    """
+    key = os.path.abspath(file_path)
+    with _locks_lock:
+        if key not in _locks:
+            _locks[key] = FileLock(file_path)
+        return _locks[key]
+
+
+def file_signature(file_path):
+    """
+    Returns the modification time and size of a file, used to find out if another process has written it.
+    None if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -10,6 +10,9 @@ import inventory_operation
 import sales_operation
 import management.inventory as inventory
 import management.sales as sales
+from management.idempotency import key_file_path
+from management.ledger import sidecar_path
+from management.pricing import price_history_path
 
 
 def basic_choice_select(fruit_file, plantation_file, extra_productivity_file, remaining_productivity_file,
@@ -62,6 +65,10 @@ def clear_csv_file(file_path):
     df = pd.read_csv(file_path, nrows=0)
     # Overwrite the file, writing only the column names
     df.to_csv(file_path, index=False)
+    # The times recorded for the old rows
+    timeline_file = sidecar_path(file_path, "timeline")
+    if os.path.exists(timeline_file):
+        os.remove(timeline_file)
 
 
 def fruit_init(fruit_file):
@@ -70,12 +77,10 @@ def fruit_init(fruit_file):
     '''
     df = pd.DataFrame()
     df.to_csv(fruit_file, index=False)
-    fruit_info.add_fruit(1,"Ambrosia", "big", "very sweet",
-                         "less sour", "crunchy", 1.2, "pie",fruit_file)
-    fruit_info.add_fruit(3,"Elberta", "big", "very sweet",
-                         "less sour", "crunchy", 1.2, "pie",fruit_file)
-    fruit_info.add_fruit(2,"Lapins", "small", "median sweet",
-                         "median sour", "soft", 2.99, "cans",fruit_file)
+    # the seed fruits are checked and written at once
+    fruit_info.add_fruits([(1, "Ambrosia", "big", "very sweet", "less sour", "crunchy", 1.2, "pie"),
+                           (3, "Elberta", "big", "very sweet", "less sour", "crunchy", 1.2, "pie"),
+                           (2, "Lapins", "small", "median sweet", "median sour", "soft", 2.99, "cans")], fruit_file)
 
 def plantation_init(fruit_file, plantation_file):
 
@@ -105,12 +110,13 @@ def inventory_init(extra_productivity_file, remaining_productivity_file, invento
     clear_csv_file(extra_productivity_file)
     inventory_manager = inventory.InventoryManagement(extra_productivity_file, remaining_productivity_file,
                                                       inventory_file)
-    inventory_manager.total_product_estimate()
-    inventory_manager.add_inventory('Ambrosia', 300)
-    inventory_manager.add_inventory("Honeycrisp", 300)
-    inventory_manager.add_inventory("Gala", 300)
-    inventory_manager.add_inventory('Elberta', 400)
-    inventory_manager.add_inventory('Lapins', 500)
+    with inventory_manager.batch():
+        inventory_manager.total_product_estimate()
+        inventory_manager.add_inventory('Ambrosia', 300)
+        inventory_manager.add_inventory("Honeycrisp", 300)
+        inventory_manager.add_inventory("Gala", 300)
+        inventory_manager.add_inventory('Elberta', 400)
+        inventory_manager.add_inventory('Lapins', 500)
     sys.stdout = original_stdout
 
 
@@ -123,6 +129,10 @@ def sales_init(extra_productivity_file, remaining_productivity_file, inventory_f
     inventory_manager = inventory.InventoryManagement(extra_productivity_file, remaining_productivity_file,
                                                       inventory_file,)
     clear_csv_file(order_file)
+    # the prices and the idempotency keys of the old orders, the new orders are indexed from 1 again
+    for sidecar_file in [price_history_path(order_file), key_file_path(order_file)]:
+        if os.path.exists(sidecar_file):
+            os.remove(sidecar_file)
     # Instantiate the SalesManagement class with the inventory manager
     sales_manager = sales.SalesManagement(inventory_manager, order_file)
     # Add some orders
@@ -0,0 +1,279 @@
+import os
+import numpy as np
+import pandas as pd
+from management.revenue import week_bucket
+from production.plantation import region_class_load
+
+"""
+This module contains the revenue cube used by SalesManagement for dashboard queries, the revenue of the orders
+pre-aggregated by fruit variety, sales type, week and region in a dense NumPy array.
+"""
+
+# the plantation regions of the package, production/plantations.csv
+PLANTATION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "production",
+                               "plantations.csv")
+# the area type of the regions whose fruit is sold by each sales type
+REGION_AREA_TYPES = {"selling": "market", "picking": "pick"}
+
+
+class RevenueCube:
+    """
+    Represents the revenue of the orders as a dense array with one axis for each of DIMENSIONS, indexed by the code
+    of each label, e.g. the week of 2026-10-12. The cells hold revenue in cents.
+
+    An order has no region, so its revenue is shared between the regions of its variety by their area, the market
+    regions for selling orders and the pick regions for picking orders. The revenue of a variety without such a
+    region goes to the region None. Orders without a timestamp are not in the cube.
+
+    Two coarser levels can be queried as well: fruit_type groups the varieties, and season groups the weeks by the
+    year of their Monday.
+
+    Attributes:
+    - labels (dict): The labels of each dimension, in the order of their codes.
+    - fruit_types (dict): The fruit type of each variety.
+    - read_only (bool): True for a cube returned by slice, which holds only some regions, so no order can be added.
+    """
+
+    DIMENSIONS = ["fruit_variety", "sales_type", "week", "region"]
+    # the coarser level of a dimension, and how a label of the dimension maps to it
+    LEVELS = {"fruit_type": "fruit_variety", "season": "week"}
+
+    def __init__(self, regions=()):
+        """
+        Initializes an empty instance of RevenueCube.
+
+        Parameters:
+        - regions (list): The Region instances the revenue is shared between, e.g. the regions of plantations.csv.
+        """
+        self.labels = {dimension: [] for dimension in self.DIMENSIONS}
+        self.fruit_types = {}
+        self.read_only = False
+        self._codes = {dimension: {} for dimension in self.DIMENSIONS}
+        # the (regionId, area) pairs of each (variety, area type)
+        self._regions = {}
+        for region in regions:
+            self._code("region", region.regionId)
+            self._regions.setdefault((region.variety, region.areaType), []).append((region.regionId, region.area))
+        self._code("region", None)
+        # the share of each region in the revenue of each (variety, sales type)
+        self._shares = {}
+        self._data = np.zeros((4, 2, 8, len(self.labels["region"])))
+
+    @classmethod
+    def build(cls, orders, timestamps, regions=()):
+        """
+        Build the cube of the orders that have a timestamp.
+
+        Parameters:
+        - orders (pd.DataFrame): The orders, with the columns of ORDER_COLUMNS.
+        - timestamps (dict): The timestamp of each order, keyed by order index.
+        - regions (list): The Region instances the revenue is shared between.
+
+        Returns:
+            RevenueCube: The cube of the orders.
+        """
+        cube = cls(regions)
+        if orders.empty or not timestamps:
+            return cube
+        frame = orders[["index", "sales_type", "fruit_type", "fruit_variety", "revenue"]].copy()
+        frame["week"] = [None if timestamps.get(seq) is None else week_bucket(timestamps[seq])
+                         for seq in frame["index"]]
+        frame = frame[frame["week"].notna()]
+        if frame.empty:
+            return cube
+        cube.fruit_types.update(zip(frame["fruit_variety"], frame["fruit_type"]))
+        # the labels are coded in sorted order, then the revenue of each (variety, sales type, week) is summed
+        codes = []
+        for dimension in ["fruit_variety", "sales_type", "week"]:
+            for label in sorted(frame[dimension].unique()):
+                cube._code(dimension, label)
+            codes.append(np.asarray(frame[dimension].map(cube._codes[dimension]), dtype=np.int64))
+        cents = (pd.to_numeric(frame["revenue"]) * 100).round().to_numpy()
+        sums = np.zeros(cube._data.shape[:3])
+        np.add.at(sums, tuple(codes), cents)
+        # then shared between the regions
+        shares = np.zeros(cube._data.shape[:2] + cube._data.shape[3:])
+        for variety in cube.labels["fruit_variety"]:
+            for sales_type in cube.labels["sales_type"]:
+                shares[cube._codes["fruit_variety"][variety], cube._codes["sales_type"][sales_type]] = \
+                    cube._region_shares(variety, sales_type)
+        cube._data = sums[:, :, :, np.newaxis] * shares[:, :, np.newaxis, :]
+        return cube
+
+    def _code(self, dimension, label):
+        """
+        Returns the code of a label, a new label is given the next code and the array grows if it is full.
+        """
+        codes = self._codes[dimension]
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(self.labels[dimension])
+            self.labels[dimension].append(label)
+            if hasattr(self, "_data") and code >= self._data.shape[self.DIMENSIONS.index(dimension)]:
+                # the capacity of the axis is doubled, so a new label is usually only a new code
+                axis = self.DIMENSIONS.index(dimension)
+                padding = [(0, 0)] * self._data.ndim
+                padding[axis] = (0, self._data.shape[axis])
+                self._data = np.pad(self._data, padding)
+        return code
+
+    def _region_shares(self, variety, sales_type):
+        """
+        Returns the share of each region in the revenue of a variety and sales type, by region code.
+        """
+        key = (variety, sales_type)
+        if key not in self._shares:
+            shares = np.zeros(len(self.labels["region"]))
+            regions = self._regions.get((variety, REGION_AREA_TYPES.get(sales_type)), [])
+            total_area = sum(area for region_id, area in regions)
+            if total_area > 0:
+                for region_id, area in regions:
+                    shares[self._codes["region"][region_id]] += area / total_area
+            else:
+                shares[self._codes["region"][None]] = 1
+            self._shares[key] = shares
+        return self._shares[key]
+
+    @property
+    def values(self):
+        """The revenue in cents of each cell, an array with one axis for each of DIMENSIONS."""
+        return self._data[tuple(slice(0, len(self.labels[dimension])) for dimension in self.DIMENSIONS)]
+
+    def add(self, timestamp, sales_type, fruit_type, fruit_variety, revenue):
+        """
+        Add the revenue of an order to its cells.
+
+        Parameters:
+        - timestamp (datetime): The time the order was recorded.
+        - sales_type (str): "selling" or "picking".
+        - fruit_type (int): The type number of the fruit.
+        - fruit_variety (str): The variety of the fruit.
+        - revenue (float): The revenue of the order.
+        """
+        if self.read_only:
+            raise ValueError("A slice of a cube is read-only, please add the order to the whole cube")
+        self.fruit_types[fruit_variety] = fruit_type
+        variety_code = self._code("fruit_variety", fruit_variety)
+        sales_type_code = self._code("sales_type", sales_type)
+        week_code = self._code("week", week_bucket(timestamp))
+        self._data[variety_code, sales_type_code, week_code] += \
+            round(revenue * 100) * self._region_shares(fruit_variety, sales_type)
+
+    def _level_label(self, level, label):
+        """
+        Returns the label of the coarser level of a dimension label, e.g. the fruit type of a variety.
+        """
+        if level == "fruit_type":
+            return self.fruit_types[label]
+        return label.year
+
+    def _check_dimension(self, dimension):
+        """
+        Raise a ValueError if a name is neither a dimension nor a coarser level.
+        """
+        if dimension not in self.DIMENSIONS and dimension not in self.LEVELS:
+            raise ValueError(f"Dimension {dimension} not found, please choose from: "
+                             f"{', '.join(self.DIMENSIONS + list(self.LEVELS))}")
+
+    def slice(self, **values):
+        """
+        Returns the cube of some labels of some dimensions, e.g. cube.slice(fruit_type=1, season=2026).
+
+        Parameters:
+        - values: A label or a list of labels for each dimension or coarser level to keep.
+
+        Returns:
+            RevenueCube: A new read-only cube with only the cells of the labels, the other dimensions are kept whole.
+        """
+        positions = [list(range(len(self.labels[dimension]))) for dimension in self.DIMENSIONS]
+        for name, labels in values.items():
+            self._check_dimension(name)
+            if not isinstance(labels, (list, tuple, set)):
+                labels = [labels]
+            dimension = self.LEVELS.get(name, name)
+            axis = self.DIMENSIONS.index(dimension)
+            if name in self.LEVELS:
+                kept = [code for code in positions[axis]
+                        if self._level_label(name, self.labels[dimension][code]) in labels]
+            else:
+                kept = [code for code in positions[axis] if self.labels[dimension][code] in labels]
+            positions[axis] = kept
+        cube = RevenueCube.__new__(RevenueCube)
+        cube.labels = {dimension: [self.labels[dimension][code] for code in codes]
+                       for dimension, codes in zip(self.DIMENSIONS, positions)}
+        cube.fruit_types = dict(self.fruit_types)
+        cube.read_only = True
+        cube._codes = {dimension: {label: code for code, label in enumerate(labels)}
+                       for dimension, labels in cube.labels.items()}
+        # the shares of the regions are only used by add
+        cube._regions = {}
+        cube._shares = {}
+        cube._data = self.values[np.ix_(*positions)].copy()
+        return cube
+
+    def rollup(self, *dimensions):
+        """
+        Returns the revenue summed over all dimensions but some, e.g. cube.rollup("fruit_type", "season").
+
+        Parameters:
+        - dimensions: The dimensions or coarser levels to keep, at most one of each dimension. None for the total.
+
+        Returns:
+            pd.DataFrame: The columns of the dimensions and revenue, one row for each combination of labels with
+            revenue, sorted by labels, None last.
+        """
+        for name in dimensions:
+            self._check_dimension(name)
+        kept = [self.LEVELS.get(name, name) for name in dimensions]
+        if len(set(kept)) < len(kept):
+            raise ValueError("A dimension can be rolled up to one level only")
+        data = self.values
+        labels = []
+        for name, dimension in zip(dimensions, kept):
+            axis = self.DIMENSIONS.index(dimension)
+            if name in self.LEVELS:
+                # the labels of the dimension are grouped into the labels of the level by a 0/1 matrix
+                level_labels = [self._level_label(name, label) for label in self.labels[dimension]]
+                groups = sorted(set(level_labels))
+                matrix = np.zeros((len(level_labels), len(groups)))
+                matrix[np.arange(len(level_labels)), [groups.index(label) for label in level_labels]] = 1
+                data = np.moveaxis(np.tensordot(data, matrix, axes=([axis], [0])), -1, axis)
+                labels.append(groups)
+            else:
+                labels.append(self.labels[dimension])
+        axes = [self.DIMENSIONS.index(dimension) for dimension in kept]
+        data = data.sum(axis=tuple(axis for axis in range(data.ndim) if axis not in axes))
+        if not dimensions:
+            return pd.DataFrame({"revenue": [round(data.item()) / 100]})
+        # the kept axes are in the order of DIMENSIONS after the sum, and are put in the order asked for
+        data = np.transpose(data, np.argsort(np.argsort(axes)))
+        cells = np.argwhere(np.round(data) != 0)
+        rows = [[labels[position][code] for position, code in enumerate(cell)] + [np.round(data[tuple(cell)]) / 100]
+                for cell in cells]
+        rows.sort(key=lambda row: [(label is None, label) for label in row[:-1]])
+        frame = pd.DataFrame()
+        for position, name in enumerate(dimensions):
+            column = [row[position] for row in rows]
+            # a column with the region None keeps its integer region ids
+            frame[name] = pd.Series(column, dtype=object if None in column else None)
+        frame["revenue"] = [row[-1] for row in rows]
+        return frame
+
+    def drilldown(self, dimension, **values):
+        """
+        Returns the revenue of some cells broken down by a finer dimension, e.g.
+        cube.drilldown("week", fruit_variety="Ambrosia") for the revenue of Ambrosia of each week.
+
+        Parameters:
+        - dimension (str): The dimension or level to break the revenue down by.
+        - values: A label or a list of labels for each dimension or level of the cells.
+
+        Returns:
+            pd.DataFrame: The columns of the names of values, dimension and revenue.
+        """
+        return self.slice(**values).rollup(*list(values), dimension)
+
+
+def load_regions(plantation_file=PLANTATION_FILE):
+    """Returns the Region instances of a plantation file, an empty list if the file doesn't exist."""
+    return region_class_load(plantation_file)
@@ -0,0 +1,171 @@
+import csv
+import os
+from collections import OrderedDict
+from file_lock import file_signature
+from management.ledger import ends_with_newline, parse_number, sync_file
+
+"""
+This module contains the index of the idempotency keys of the sales orders, used by SalesManagement.add_order to
+recognize an order sent again, e.g. by a tablet retrying after a network error, and return the order already added
+instead of adding it twice.
+"""
+
+
+class IdempotencyIndex:
+    """
+    Represents the idempotency keys of the recent orders, a hash index from each key to the index of its order,
+    limited to the last window keys. The keys are appended to a CSV file, one (order index, key) row for each
+    order, and are written together with the orders and the ledgers of an InventoryManagement, so a key is never
+    written without its order.
+
+    The file keeps the keys older than the window until it is compacted, it is compacted automatically when it has
+    more than twice window rows if auto_compact is True.
+
+    Attributes:
+    - file_path (str): The path of the key file.
+    - window (int): The number of recent keys kept.
+    - auto_compact (bool): True to compact the file when it grows past twice the window.
+    """
+
+    columns = ["index", "key"]
+
+    def __init__(self, file_path, window=10000, auto_compact=True):
+        """
+        Initializes an instance of IdempotencyIndex and loads the recent keys of the file.
+        """
+        self.file_path = file_path
+        self.window = window
+        self.auto_compact = auto_compact
+        self._keys = OrderedDict()
+        self._rows = 0
+        self._last_index = None
+        self._signature = None
+        # keys staged but not written yet
+        self._unwritten = []
+        self._load()
+
+    def __len__(self):
+        """
+        Returns the number of keys in the window.
+        """
+        self.refresh()
+        return len(self._keys)
+
+    def _load(self):
+        """
+        Load the last window keys of the file.
+        """
+        self._keys = OrderedDict()
+        self._rows = 0
+        self._last_index = None
+        self._signature = file_signature(self.file_path)
+        if self._signature is not None:
+            with open(self.file_path, "r", newline="") as file:
+                file.readline()
+                for record in csv.reader(file):
+                    if len(record) == 2:
+                        self._remember(record[1], parse_number(record[0]))
+                        self._rows += 1
+        # the keys staged before the file was written by another process
+        for index, key in self._unwritten:
+            self._remember(key, index)
+
+    def _remember(self, key, index):
+        """
+        Add a key to the window, the oldest key is dropped when the window is full.
+        """
+        self._keys[key] = index
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.window:
+            self._keys.popitem(last=False)
+        if self._last_index is None or index > self._last_index:
+            self._last_index = index
+
+    def refresh(self):
+        """
+        Reload the keys if another process has written the file since it was last loaded or written.
+        """
+        if file_signature(self.file_path) != self._signature:
+            self._load()
+
+    def get(self, key):
+        """
+        Returns the index of the order of a key, None if the key is not in the window.
+        """
+        self.refresh()
+        return self._keys.get(key)
+
+    def stage(self, rows):
+        """
+        Add the keys of new orders to be written by the next flush(), e.g. together with the orders.
+
+        Parameters:
+        - rows (list): A list of [order index, key] rows.
+        """
+        for index, key in rows:
+            self._remember(key, index)
+            self._unwritten.append([index, key])
+
+    def pending(self):
+        """
+        Returns the keys staged but not written yet.
+        """
+        return [list(row) for row in self._unwritten]
+
+    def flush(self):
+        """
+        Append the staged keys to the file, and compact it if it has grown past twice the window.
+        """
+        if not self._unwritten:
+            return
+        new_file = not os.path.exists(self.file_path)
+        with open(self.file_path, "a", newline="") as file:
+            if not new_file and not ends_with_newline(self.file_path):
+                file.write("\n")
+            writer = csv.writer(file, lineterminator="\n")
+            if new_file:
+                writer.writerow(self.columns)
+            writer.writerows(self._unwritten)
+        self._rows += len(self._unwritten)
+        self._unwritten = []
+        self._signature = file_signature(self.file_path)
+        if self.auto_compact and self._rows > 2 * self.window:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the file with only the keys of the window, through a temporary file.
+        """
+        temporary_path = self.file_path + ".tmp"
+        with open(temporary_path, "w", newline="") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            writer.writerow(self.columns)
+            writer.writerows([index, key] for key, index in self._keys.items())
+        os.replace(temporary_path, self.file_path)
+        self._rows = len(self._keys)
+        self._signature = file_signature(self.file_path)
+
+    def recover(self, rows):
+        """
+        Write the keys of a journal that are missing from the file, the keys of orders already written are
+        skipped by their order index.
+
+        Returns:
+            int: The number of keys written.
+        """
+        missing = [row for row in rows if self._last_index is None or row[0] > self._last_index]
+        if missing:
+            self.stage(missing)
+            self.flush()
+        return len(missing)
+
+    def sync(self):
+        """
+        Flush the key file to disk.
+        """
+        sync_file(self.file_path)
+
+
+def key_file_path(order_file):
+    """Returns the path of the key file of an order file, e.g. orders_keys.csv for orders.csv."""
+    return f"{os.path.splitext(order_file)[0]}_keys.csv"
@@ -1,5 +1,18 @@
+import os
+import threading
+import weakref
 import pandas as pd
 import matplotlib.pyplot as plt
+from contextlib import contextmanager
+from datetime import datetime
+from file_lock import file_lock
+from management.journal import Journal
+from management.ledger import VARIETY_INDEX, ColumnarLedger, CsvLedger, Ledger, format_row, row_values
+
+
+# the instances of the process on each inventory file, whose reservations not written yet are counted by the others
+_instances = {}
+_instances_lock = threading.Lock()
 
 
 class HistoricalPlotter:
@@ -12,8 +25,9 @@ class HistoricalPlotter:
         Initialize a HistoricalPlotter instance.
 
         Parameters:
-        - remaining_productivity_file (str): The file path for the remaining productivity data.
-        - inventory_file (str): The file path for the inventory data.
+        - remaining_productivity_file (str): The file path for the remaining productivity data, or the directory
+          of a ColumnarLedger.
+        - inventory_file (str): The file path for the inventory data, or the directory of a ColumnarLedger.
         """
         self.inventory_file = inventory_file
         self.remaining_productivity_file = remaining_productivity_file
@@ -27,28 +41,33 @@ class HistoricalPlotter:
         - file_type (int): The type of file to use (1 for inventory, 2 for remaining capacity).
         """
         if file_type == 1:
-            data = pd.read_csv(self.inventory_file)
+            file_path = self.inventory_file
             title_file = "Inventory Management"
         else:
-            data = pd.read_csv(self.remaining_productivity_file)
+            file_path = self.remaining_productivity_file
             title_file = "Remaining Capacity"
 
-        x = range(1, len(data) + 1)
         if fruit_category == 1:
             labellist = ["Ambrosia", "Gala", "Honeycrisp"]
-            plt.stackplot(x, data.loc[:, 'Ambrosia'], data.loc[:, 'Gala'],
-                          data.loc[:, 'Honeycrisp'], labels=labellist)
             title_type = "Apple"
         elif fruit_category == 2:
             labellist = ["Lapins", "Sweetheart", "Skeena"]
-            plt.stackplot(x, data.loc[:, "Lapins"], data.loc[:, "Sweetheart"],
-                          data.loc[:, "Skeena"], labels=labellist)
             title_type = "Cherry"
         else:
             labellist = ["Redhaven", "Elberta", "Cresthaven"]
-            plt.stackplot(x, data.loc[:, "Redhaven"], data.loc[:, "Elberta"],
-                          data.loc[:, "Cresthaven"], labels=labellist)
             title_type = "Peach"
+
+        if os.path.isdir(file_path):
+            # the columns of a ColumnarLedger are read from the mapped files
+            ledger = ColumnarLedger(file_path)
+            columns = [ledger.column(label) for label in labellist]
+            length = len(ledger)
+        else:
+            data = pd.read_csv(file_path)
+            columns = [data.loc[:, label] for label in labellist]
+            length = len(data)
+        x = range(1, length + 1)
+        plt.stackplot(x, *columns, labels=labellist)
         title = f"{title_file} - {title_type}"
         plt.title(title)
         plt.xlabel('Index')
@@ -62,83 +81,334 @@ class InventoryManagement:
     """
     A class for managing inventory, remaining capacity, and extra productivity.
 
+    An instance can be shared by several threads and by several processes working on the same files. Every
+    operation holds the file lock of the inventory file from reloading the ledgers written by other processes,
+    through checking and changing the quantities, to writing its new rows, so no two operations, in one process or
+    in several, reserve the same fruit. The reads only hold a short lock of the ledgers, and only take the file lock
+    if another process has written one of the files.
+
+    Several instances of one process working on the same files, e.g. a batch of one instance opened inside a batch
+    of another, hold the same file lock. The reservations of the other instances that are not written yet are then
+    counted when the inventory is checked.
+
+    With a journal, the new rows of the ledgers and of the attached order stores are first written to the journal
+    as one record, synced to disk once, and then written to their files. If the program stops in between, the
+    missing rows are written from the journal the next time the files are opened.
     """
 
-    def __init__(self, extra_productivity_file, remaining_productivity_file, inventory_file):
+    def __init__(self, extra_productivity_file, remaining_productivity_file, inventory_file, append_only=True,
+                 write_behind=False, journal=None):
         """
         Initialize an InventoryManagement instance.
 
+        Parameters:
+        - extra_productivity_file (str or Ledger): The file path for the extra productivity data.
+        - remaining_productivity_file (str or Ledger): The file path for the remaining productivity data.
+        - inventory_file (str or Ledger): The file path for the inventory data.
+        - append_only (bool): If True, each operation appends only its new row to the end of the file,
+          otherwise the whole file is rewritten. Use compact() to rewrite the files when needed.
+        - write_behind (bool): If True, the files are written by a writer thread, and an operation releases the
+          file lock without waiting for its rows to be written. The rows of the operations made while the writer
+          thread is busy are written together. As another process may read the files before the rows are written,
+          use it only when one process writes the files. Call flush() to wait until every row is written, and
+          close() to stop the writer thread.
+        - journal (str or Journal): The file path of a journal, e.g. "management/journal.log". If given, the rows of
+          each flush are written to the journal first, and the rows missing from the files are recovered from it.
+
+        Note:
+        A file path is stored as a CsvLedger, and the path of an existing directory as a ColumnarLedger.
+        A Ledger instance such as DeltaLedger can be passed instead to choose another storage, e.g.
+        InventoryManagement(DeltaLedger("extra.csv"), DeltaLedger("remaining.csv"), DeltaLedger("inventory.csv")),
+        or InventoryManagement(SqliteLedger("orchard.db", "extra_productivity"),
+        SqliteLedger("orchard.db", "remaining_productivity"), SqliteLedger("orchard.db", "inventory")).
         """
-        self.extra_productivity_file = extra_productivity_file
-        self.remaining_productivity_file = remaining_productivity_file
-        self.inventory_file = inventory_file
-        self.inventory, self.remaining_productivity, self.extra_productivity = self.load_data()
+        self._ledgers = self.load_data(extra_productivity_file, remaining_productivity_file, inventory_file)
+        self.extra_productivity_file = self._ledgers[3].file_path
+        self.remaining_productivity_file = self._ledgers[2].file_path
+        self.inventory_file = self._ledgers[1].file_path
+        self.append_only = append_only
+        # the depth of the batches, only changed by the thread holding the file lock
+        self._batch_depth = 0
+        # True when rows were added since the last flush
+        self._dirty = False
+        # the lock of the ledgers, held while they are changed or read
+        self._lock = threading.RLock()
+        # the lock shared with other processes, held on the inventory file for the three ledgers
+        self._file_lock = file_lock(self.inventory_file)
+        with _instances_lock:
+            _instances.setdefault(os.path.abspath(self.inventory_file), weakref.WeakSet()).add(self)
+        # the order stores written with the ledgers, keyed by file path
+        self._stores = {}
+        if journal is not None and not isinstance(journal, Journal):
+            journal = Journal(journal)
+        self.journal = journal
+        if self.journal is not None:
+            with self._file_lock:
+                self.journal.recover(list(self._ledgers.values()))
+        self._writer = None
+        if write_behind:
+            # the writer thread only keeps a weak reference, and is stopped when the instance is collected
+            self._flush_requested = threading.Event()
+            self._stopping = threading.Event()
+            self._writer = threading.Thread(target=write_behind_loop, name="inventory-writer", daemon=True,
+                                            args=(weakref.ref(self), self._flush_requested, self._stopping))
+            self._writer.start()
+            weakref.finalize(self, stop_writer, self._flush_requested, self._stopping)
+
+    def _refresh(self):
+        """
+        Reload the ledgers written by another process. The file lock is only held if one of their files has
+        changed, while the files are read.
+        """
+        if any(ledger.changed() for ledger in self._ledgers.values()):
+            with self._file_lock, self._lock:
+                for ledger in self._ledgers.values():
+                    ledger.refresh()
 
-    def load_data(self):
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the lock of the ledgers, after reloading the ledgers written by another process.
+        """
+        self._refresh()
+        with self._lock:
+            yield
+
+    @property
+    def inventory(self):
+        """The inventory history as a DataFrame."""
+        with self._locked():
+            return self._ledgers[1].frame
+
+    @inventory.setter
+    def inventory(self, frame):
+        with self._locked():
+            self._ledgers[1].frame = frame
+
+    @property
+    def remaining_productivity(self):
+        """The remaining productivity history as a DataFrame."""
+        with self._locked():
+            return self._ledgers[2].frame
+
+    @remaining_productivity.setter
+    def remaining_productivity(self, frame):
+        with self._locked():
+            self._ledgers[2].frame = frame
+
+    @property
+    def extra_productivity(self):
+        """The extra productivity history as a DataFrame."""
+        with self._locked():
+            return self._ledgers[3].frame
+
+    @extra_productivity.setter
+    def extra_productivity(self, frame):
+        with self._locked():
+            self._ledgers[3].frame = frame
+
+    def load_data(self, extra_productivity_file, remaining_productivity_file, inventory_file):
         """
         Load data from CSV files (inventory, remaining productivity, extra productivity).
+        If a file doesn't exist, it is created with an empty history.
 
+        Returns:
+        - dict: The ledgers, keyed by 1 for inventory, 2 for remaining productivity and 3 for extra productivity.
         """
-        columns = ["index", "Ambrosia", "Gala", "Honeycrisp", "Lapins", "Sweetheart", "Skeena", "Redhaven", "Elberta",
-                   "Cresthaven"]
-        try:
-            inventory_data = pd.read_csv(self.inventory_file)
-        except FileNotFoundError:
-            # If the file doesn't exist, return an initial empty inventory
-            inventory_data = pd.DataFrame(columns=columns)
-            inventory_data.to_csv(self.inventory_file, index=True)
-
-        try:
-            remaining_productivity_data = pd.read_csv(self.remaining_productivity_file)
-        except FileNotFoundError:
-            # If the file doesn't exist, return an initial empty remaining productivity
-            remaining_productivity_data = pd.DataFrame(columns=columns)
-            remaining_productivity_data.to_csv(self.remaining_productivity_file, index=True)
-
-        try:
-            extra_productivity_data = pd.read_csv(self.extra_productivity_file)
-        except FileNotFoundError:
-            # If the file doesn't exist, return an initial empty extra productivity
-            extra_productivity_data = pd.DataFrame(columns=columns)
-            extra_productivity_data.to_csv(self.extra_productivity_file, index=True)
-
-        return inventory_data, remaining_productivity_data, extra_productivity_data
+        ledgers = {}
+        for filename, source in [(1, inventory_file), (2, remaining_productivity_file), (3, extra_productivity_file)]:
+            if isinstance(source, Ledger):
+                ledgers[filename] = source
+            elif os.path.isdir(source):
+                ledgers[filename] = ColumnarLedger(source)
+            else:
+                ledgers[filename] = CsvLedger(source)
+        return ledgers
 
-    def save_data(self, newdata, filename):
+    def save_data(self, newdata, filename, reason=""):
         """
         Save new data to the specified CSV file.
 
         Parameters:
-        - newdata (list): New data to be added to the DataFrame.
-        - filename (str): Name of the CSV file to save the data.
+        - newdata (list or pd.DataFrame): A list of the nine variety quantities for the remaining productivity,
+          a full row (index and nine quantities), or a one-row DataFrame to be added to the ledger.
+        - filename (int): The ledger to save the data, 1 for inventory, 2 for remaining productivity,
+          3 for extra productivity.
+        - reason (str): The operation that produced the data, recorded by ledgers that keep it.
         """
         if len(newdata) == 9:
             info = [1]
             info.extend(newdata)
-            self.remaining_productivity.loc[len(self.remaining_productivity)] = info
-            self.remaining_productivity.to_csv(self.remaining_productivity_file, index=False)
+            rows = [info]
+            ledger = self._ledgers[2]
+            reason = reason or "total_product_estimate"
         else:
+            if isinstance(newdata, list):
+                rows = [newdata]
+            else:
+                rows = [row_values(newdata)]
+            ledger = self._ledgers.get(filename, self._ledgers[3])
+        with self.batch(), self._lock:
+            ledger.add_rows(rows, reason)
+            self._dirty = True
+
+    def _stage(self, filename, reason):
+        """
+        Add the next row of a ledger, built from its current state, to be written by the next flush. Called while
+        the lock of the ledgers is held.
+        """
+        ledger = self._ledgers[filename]
+        ledger.add_rows([ledger.next_row()], reason)
+        self._dirty = True
+
+    def _available(self, position):
+        """
+        Returns the inventory of a variety, less the reservations of the other instances of this process on the
+        same files that are not written yet. Called while the file lock is held.
+        """
+        with _instances_lock:
+            others = [other for other in _instances.get(os.path.abspath(self.inventory_file), ()) if other is not self]
+        reserved = sum(min(other._ledgers[1].unwritten_change(position), 0) for other in others)
+        return self._ledgers[1].current[position] + reserved
+
+    def attach(self, order_store):
+        """
+        Write the orders staged in an order store together with the ledgers, the orders missing from the store
+        are recovered from the journal first.
+
+        Parameters:
+        - order_store (OrderStore): The order store, e.g. the order_store of a SalesManagement, or another store
+          of rows starting with an order index, e.g. its IdempotencyIndex.
+        """
+        with self._file_lock:
+            # the orders staged in a store attached before for the same file are written first
+            self.flush()
+            with self._lock:
+                if self.journal is not None:
+                    self.journal.recover([order_store])
+                self._stores[order_store.file_path] = order_store
+
+    def stage(self, order_store, rows):
+        """
+        Add new orders to an attached order store, they are written by the next flush with the ledgers.
+
+        Returns:
+            list: The timestamp recorded for each order, None for a store without a timeline.
+        """
+        with self._lock:
+            self._dirty = True
+            return order_store.stage(rows)
+
+    def flush(self):
+        """
+        Write the rows added since the last flush, each affected file is written once. The rows written by another
+        process since the ledgers were read are merged first. With a journal, the rows are written to the journal
+        first, with a single sync for all files. As the file lock is held by a batch until it exits, a flush of
+        another thread waits until the batch is written.
+        """
+        with self._file_lock, self._lock:
+            self._dirty = False
+            for ledger in self._ledgers.values():
+                ledger.refresh()
+            if self.journal is not None:
+                try:
+                    self.journal.write(list(self._ledgers.values()) + list(self._stores.values()))
+                except Exception:
+                    print("Fail to write the journal")
+                    return
+            for ledger in self._ledgers.values():
+                try:
+                    ledger.flush(rewrite=not self.append_only)
+                except FileNotFoundError:
+                    print(f"There is no {ledger.file_path} file")
+                except Exception:
+                    print("Fail to save data")
+            for store in self._stores.values():
+                try:
+                    store.flush()
+                except Exception:
+                    print("Fail to save data")
+            if self.journal is not None:
+                self.journal.written()
+
+    def close(self):
+        """
+        Write all rows and stop the writer thread. The instance can still be used, writing the files
+        in the thread of each operation. With a journal, the files are synced and the journal is emptied.
+        """
+        if self._writer is not None:
+            stop_writer(self._flush_requested, self._stopping)
+            self._writer.join()
+            self._writer = None
+        self.flush()
+        if self.journal is not None:
+            with self._file_lock, self._lock:
+                self.journal.checkpoint()
+
+    @contextmanager
+    def batch(self):
+        """
+        A context in which inventory operations are applied in memory only, and each affected file is
+        written once when the context exits. The file lock is held from the start of the batch, when the ledgers
+        written by other processes are reloaded, until its rows are written. Each operation is a batch of its own.
+
+        Usage:
+        with inventory_manager.batch():
+            inventory_manager.add_inventory("Ambrosia", 300)
+            inventory_manager.add_inventory("Gala", 300)
+        """
+        with self._file_lock:
+            with self._lock:
+                if self._batch_depth == 0:
+                    for ledger in self._ledgers.values():
+                        ledger.refresh()
+                self._batch_depth += 1
             try:
-                if filename == 1:
-                    self.inventory = pd.concat([self.inventory, newdata], ignore_index=True)
-                    self.inventory.to_csv(self.inventory_file, index=False)
-                elif filename == 2:
-                    self.remaining_productivity = pd.concat([self.remaining_productivity, newdata], ignore_index=True)
-                    self.remaining_productivity.to_csv(self.remaining_productivity_file, index=False)
+                yield self
+            finally:
+                with self._lock:
+                    self._batch_depth -= 1
+                    outermost = self._batch_depth == 0
+                if outermost and self._dirty:
+                    if self._writer is not None:
+                        self._flush_requested.set()
+                    else:
+                        self.flush()
+
+    def apply_many(self, changes):
+        """
+        Apply many inventory changes in one batch.
+
+        Parameters:
+        - changes (list): A list of (fruit_type, number) tuples. A positive number is added to the inventory
+          with add_inventory, a negative number is removed with remove_inventory.
+
+        Returns:
+            list: The result of remove_inventory for each removal, None for each addition.
+        """
+        results = []
+        with self.batch():
+            for fruit_type, number in changes:
+                if number >= 0:
+                    results.append(self.add_inventory(fruit_type, number))
                 else:
-                    self.extra_productivity = pd.concat([self.extra_productivity, newdata], ignore_index=True)
-                    self.extra_productivity.to_csv(self.extra_productivity_file, index=False)
+                    results.append(self.remove_inventory(fruit_type, -number))
+        return results
 
-            except FileNotFoundError:
-                print(f"There is no {filename} file")
-            except Exception:
-                print("Fail to save data")
+    def compact(self):
+        """
+        Rewrite the inventory, remaining productivity and extra productivity files from the in-memory history.
+        """
+        with self._file_lock, self._lock:
+            for ledger in self._ledgers.values():
+                ledger.refresh()
+                ledger.rewrite()
 
     def total_product_estimate(self):
         """
         Estimate total production based on the number of fruit trees and update inventory and remaining productivity.
         """
-        if len(self.remaining_productivity) > 0:
+        if self._ledgers[2].index is not None:
             raise ValueError("File is not empty, and cannot be initialized by total capacity")
 
         plantation_summary = {
@@ -171,18 +441,14 @@ class InventoryManagement:
         - fruit_type (str): The variety of fruit for inventory addition.
         - number (int): The quantity of fruit to add to the inventory.
         """
-        if fruit_type not in self.inventory.columns:
+        if fruit_type not in VARIETY_INDEX:
             raise ValueError("Fruit not found in inventory")
         else:
-            if self.inventory.empty:
-                current_inventory = pd.DataFrame([[0] * len(self.inventory.columns)], columns=self.inventory.columns)
-            else:
-                current_inventory = self.inventory.iloc[[-1]].copy()
-            new_row = current_inventory
-            new_row[fruit_type] += number
-            new_row["index"] = new_row["index"].max() + 1
-            self.save_data(new_row, 1)
-            self.remove_remaining_productivity(fruit_type, number)
+            ledger = self._ledgers[1]
+            with self.batch(), self._lock:
+                ledger.current[VARIETY_INDEX[fruit_type]] += number
+                self._stage(1, "add_inventory")
+                self._remove_remaining(fruit_type, number)
 
     def add_extra_productivity(self, fruit_type, number):
         """
@@ -192,15 +458,9 @@ class InventoryManagement:
         - fruit_type (str): The variety of fruit for extra productivity addition.
         - number (int): The quantity of extra productivity to add.
         """
-        if self.extra_productivity.empty:
-            current_extra = pd.DataFrame([[0] * len(self.extra_productivity.columns)],
-                                         columns=self.extra_productivity.columns)
-        else:
-            current_extra = self.extra_productivity.iloc[[-1]].copy()
-        new_row = current_extra
-        new_row[fruit_type] += number
-        new_row["index"] = new_row["index"].max() + 1
-        self.save_data(new_row, 3)
+        with self.batch(), self._lock:
+            self._ledgers[3].current[VARIETY_INDEX[fruit_type]] += number
+            self._stage(3, "add_extra_productivity")
 
     def remove_inventory(self, fruit_type, number):
         """
@@ -210,22 +470,92 @@ class InventoryManagement:
         - fruit_type (str): The variety of fruit for inventory removal.
         - number (int): The quantity of fruit to remove from the inventory.
         """
-        if fruit_type not in self.inventory.columns:
+        if fruit_type not in VARIETY_INDEX:
             raise ValueError("Fruit not found in inventory")
         else:
-            if self.inventory.empty:
+            if self.try_reserve(fruit_type, number, "remove_inventory"):
+                return True
+            ledger = self._ledgers[1]
+            if ledger.index is None:
                 print("Inventory is empty.")
-                return False
             else:
-                current_inventory = self.inventory.iloc[[-1]].copy()
-                current_number = current_inventory.at[current_inventory.index[-1], fruit_type]
-                if current_number < number:
-                    print(f"Not enough {fruit_type} in inventory, only {current_number} left")
-                    return False
-                new_row = current_inventory
-                new_row[fruit_type] -= number
-                new_row["index"] = new_row["index"].max() + 1
-                self.save_data(new_row, 1)
+                current_number = ledger.current[VARIETY_INDEX[fruit_type]]
+                print(f"Not enough {fruit_type} in inventory, only {current_number} left")
+        return False
+
+    def try_reserve(self, fruit_type, number, reason="try_reserve"):
+        """
+        Check that there is enough inventory of a specific fruit type and remove it in one step, writing one row.
+        Nothing is changed if there is not enough inventory.
+
+        Parameters:
+        - fruit_type (str): The variety of fruit to reserve.
+        - number (int): The quantity of fruit to reserve.
+        - reason (str): The operation recorded by ledgers that keep it.
+
+        Returns:
+            bool: True if the quantity was removed from the inventory, False if the fruit is not found, the
+            inventory is empty or there is not enough of the fruit.
+        """
+        position = VARIETY_INDEX.get(fruit_type)
+        if position is None:
+            return False
+        ledger = self._ledgers[1]
+        with self.batch(), self._lock:
+            if ledger.index is None or self._available(position) < number:
+                return False
+            ledger.current[position] -= number
+            self._stage(1, reason)
+        return True
+
+    def remove_many(self, inventory=None, remaining=None, reason="remove_many"):
+        """
+        Remove quantities of several varieties from the inventory and the remaining productivity, writing at most
+        one row to each ledger. Nothing is removed if there is not enough inventory for one of the varieties, or if
+        remaining productivity is to be removed before the capacity is estimated. Remaining productivity exceeded
+        by a quantity is recorded as extra productivity, as it is by remove_remaining_productivity.
+
+        Parameters:
+        - inventory (dict): The quantity to remove from the inventory for each variety, e.g. {"Ambrosia": 50}.
+        - remaining (dict): The quantity to remove from the remaining productivity for each variety.
+        - reason (str): The operation recorded by ledgers that keep it.
+
+        Returns:
+            bool: True if the quantities were removed, False if the inventory is empty, there is not enough of
+            one of the varieties, or the capacity is not estimated.
+        """
+        inventory = inventory or {}
+        remaining = remaining or {}
+        for fruit_type in list(inventory) + list(remaining):
+            if fruit_type not in VARIETY_INDEX:
+                raise ValueError("Fruit not found in inventory")
+        with self.batch(), self._lock:
+            ledger = self._ledgers[1]
+            remaining_ledger = self._ledgers[2]
+            if inventory and (ledger.index is None or
+                              any(self._available(VARIETY_INDEX[fruit_type]) < number
+                                  for fruit_type, number in inventory.items())):
+                return False
+            if remaining and remaining_ledger.index is None:
+                return False
+            if inventory:
+                for fruit_type, number in inventory.items():
+                    ledger.current[VARIETY_INDEX[fruit_type]] -= number
+                self._stage(1, reason)
+            if remaining:
+                extra_ledger = self._ledgers[3]
+                extra_changed = False
+                for fruit_type, number in remaining.items():
+                    position = VARIETY_INDEX[fruit_type]
+                    if remaining_ledger.current[position] < number:
+                        extra_ledger.current[position] += number - remaining_ledger.current[position]
+                        remaining_ledger.current[position] = 0
+                        extra_changed = True
+                    else:
+                        remaining_ledger.current[position] -= number
+                self._stage(2, reason)
+                if extra_changed:
+                    self._stage(3, reason)
         return True
 
     def remove_remaining_productivity(self, fruit_type, number, direct = 0):
@@ -240,67 +570,155 @@ class InventoryManagement:
         Returns:
             None
         """
-        if fruit_type not in self.remaining_productivity.columns:
+        if fruit_type not in VARIETY_INDEX:
             print(f"Fruit '{fruit_type}' not found.")
             return
-        else:
-            # check empty
-            if self.remaining_productivity.empty:
-                print("Please estimate capacity first.")
-                return
-            else:
-                current_capacity = self.remaining_productivity.iloc[[-1]].copy()
-
-                # Check if there's enough quantity to remove
-                current_number = current_capacity.at[current_capacity.index[-1], fruit_type]
-                new_row = current_capacity
-                if current_number < number:
-                    if direct == 0 :
-                        new_row[fruit_type] = 0
-                        print(
-                            f"The product of {fruit_type} exceeds expectations and will be recorded in the extra_productivity file.")
-                        extra_number = number - current_number
-                        self.add_extra_productivity(fruit_type, extra_number)
-                    else:
-                        print("The estimated yield will be set to 0")
-                        new_row[fruit_type] = 0
+        with self.batch():
+            self._remove_remaining(fruit_type, number, direct)
+
+    def _remove_remaining(self, fruit_type, number, direct=0):
+        """
+        Remove productivity for a specific fruit type, called by remove_remaining_productivity and add_inventory
+        in their batch. The rows are written when the batch exits.
+        """
+        # check empty
+        ledger = self._ledgers[2]
+        if ledger.index is None:
+            print("Please estimate capacity first.")
+            return
+        # Check if there's enough quantity to remove
+        position = VARIETY_INDEX[fruit_type]
+        with self._lock:
+            current_number = ledger.current[position]
+            if current_number < number:
+                if direct == 0 :
+                    print(
+                        f"The product of {fruit_type} exceeds expectations and will be recorded in the extra_productivity file.")
+                    extra_number = number - current_number
+                    self._ledgers[3].current[position] += extra_number
+                    self._stage(3, "add_extra_productivity")
                 else:
-                    new_row[fruit_type] -= number
-                # set new index number
-                new_row["index"] = new_row["index"].max() + 1
-                self.save_data(new_row, 2)
+                    print("The estimated yield will be set to 0")
+                ledger.current[position] = 0
+            else:
+                ledger.current[position] -= number
+            self._stage(2, "remove_remaining_productivity")
 
-    def get_current_inventory(self):
+    def state_at(self, seq_or_timestamp, filename=1):
         """
-        Get the current inventory status.
+        Get the state of a ledger at a past moment, e.g. the inventory at 14:00 yesterday.
+
+        Parameters:
+        - seq_or_timestamp (int, datetime or str): An index of the ledger, or a datetime or ISO format string
+          such as "2026-10-17 14:00".
+        - filename (int): The ledger to query, 1 for inventory, 2 for remaining productivity,
+          3 for extra productivity.
 
         Returns:
-            pd.DataFrame: A DataFrame representing the current inventory status.
+            list: The index and the quantity of each variety of the latest row at or before the given index or
+            time, None if there is no such row.
         """
-        if not self.inventory.empty:
-            print(self.inventory.iloc[[-1]])
-            return list(self.inventory.iloc[-1])
+        ledger = self._ledgers[filename]
+        if isinstance(seq_or_timestamp, str):
+            seq_or_timestamp = datetime.fromisoformat(seq_or_timestamp)
+        if isinstance(seq_or_timestamp, datetime):
+            with self._locked():
+                seq = ledger.timeline.seq_at(seq_or_timestamp)
+            if seq is None:
+                return None
         else:
-            print("Inventory is empty.")
+            seq = seq_or_timestamp
+        with self._locked():
+            return ledger.state_at(seq)
+
+    def available(self, fruit_type):
+        """
+        Get the current inventory of a specific fruit type, without building any DataFrame.
+
+        Parameters:
+        - fruit_type (str): The variety of fruit.
+
+        Returns:
+            The current quantity, less the reservations of the other instances of this process that are not written
+            yet, 0 if the inventory is empty, or None if the fruit is not found.
+        """
+        position = VARIETY_INDEX.get(fruit_type)
+        if position is None:
             return None
+        with self._locked():
+            return self._available(position)
+
+    def _current_row(self, filename, empty_message):
+        """
+        Print and return the latest row of a ledger, built from its current state vector.
+        """
+        ledger = self._ledgers[filename]
+        with self._locked():
+            if ledger.index is None:
+                print(empty_message)
+                return None
+            row = [ledger.index] + ledger.current
+        print(format_row(row))
+        return row
+
+    def get_current_inventory(self):
+        """
+        Get the current inventory status.
+
+        Returns:
+            list: The index and the quantity of each variety in the current inventory, None if it is empty.
+        """
+        return self._current_row(1, "Inventory is empty.")
 
     def get_remaining_productivity(self):
         """
         Get the remaining productivity status.
 
         Returns:
-            pd.DataFrame: A DataFrame representing the current remaining productivity status.
+            list: The index and the remaining productivity of each variety, None if it is not estimated.
+        """
+        return self._current_row(2, "Please estimate capacity first.")
+
+    def capacity_estimated(self):
+        """
+        Returns True if the remaining productivity has been estimated, e.g. by total_product_estimate.
         """
-        print(self.remaining_productivity.iloc[[-1]])
-        return list(self.remaining_productivity.iloc[-1])
+        with self._locked():
+            return self._ledgers[2].index is not None
 
     def get_extra_productivity(self):
         """
         Get the extra productivity status.
 
         Returns:
-            pd.DataFrame: A DataFrame representing the current extra productivity status.
+            list: The index and the extra productivity of each variety, None if there is no extra productivity.
         """
-        print(self.extra_productivity.iloc[[-1]])
-        return list(self.extra_productivity.iloc[-1])
+        return self._current_row(3, "There is no extra productivity.")
+
+
+def write_behind_loop(manager_ref, flush_requested, stopping):
+    """
+    The loop of the writer thread of an InventoryManagement, all the rows added while a flush is written are
+    written by the next one. The loop stops when the instance is closed or collected.
+    """
+    while True:
+        flush_requested.wait()
+        flush_requested.clear()
+        if stopping.is_set():
+            return
+        manager = manager_ref()
+        if manager is None:
+            return
+        try:
+            manager.flush()
+        except Exception:
+            print("Fail to save data")
+        del manager
 
+
+def stop_writer(flush_requested, stopping):
+    """
+    Stop the writer thread of an InventoryManagement.
+    """
+    stopping.set()
+    flush_requested.set()
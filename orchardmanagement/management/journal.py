@@ -0,0 +1,129 @@
+import json
+import os
+
+"""
+This module contains the journal used to write the ledgers and the sales orders together. Before the new rows of
+a group of operations are written, they are appended to the journal as one intent record and flushed to disk with
+a single fsync. If the program stops while the rows are written, the files are completed from the journal when
+they are opened again.
+"""
+
+
+class Journal:
+    """
+    Represents a journal of intent records, one JSON line for each group of operations, mapping the file path of
+    each ledger or order store to its new rows. Every row starts with its index, so a row already in a file is not
+    written twice when the journal is replayed.
+
+    The files are not synced after each group, the journal is enough to complete them. Every checkpoint_interval
+    groups, the files are synced and the journal is emptied.
+
+    Attributes:
+    - file_path (str): The path of the journal file.
+    - checkpoint_interval (int): The number of groups written between two checkpoints.
+    """
+
+    def __init__(self, file_path, checkpoint_interval=100):
+        """
+        Initializes an instance of Journal and reads the records left by the last run, which are replayed by
+        recover().
+        """
+        self.file_path = file_path
+        self.checkpoint_interval = checkpoint_interval
+        self._groups = 0
+        # the targets written since the last checkpoint, synced by the next checkpoint
+        self._written = {}
+        # the rows of each file path left by the last run and not recovered yet
+        self._unrecovered = {}
+        for record in self._read_records():
+            for path, rows in record.items():
+                self._unrecovered.setdefault(path, []).extend(rows)
+
+    def _read_records(self):
+        """
+        Returns the records of the journal file. A last line that was not completely written is ignored, the rows
+        of its group were not written to any file.
+        """
+        records = []
+        if not os.path.exists(self.file_path):
+            return records
+        with open(self.file_path, "r") as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+
+    def recover(self, targets):
+        """
+        Write the rows of the last run missing from some ledgers or order stores.
+
+        Parameters:
+        - targets (list): Ledgers or order stores, each with a file_path attribute and a recover(rows) method.
+
+        Returns:
+            int: The number of rows written.
+        """
+        recovered = 0
+        for target in targets:
+            rows = self._unrecovered.pop(target.file_path, None)
+            if rows:
+                recovered += target.recover(rows)
+                self._written[target.file_path] = target
+        return recovered
+
+    def write(self, targets):
+        """
+        Append the rows not written yet of some ledgers or order stores to the journal as one record, and sync it
+        to disk. Nothing is written if there is no new row.
+
+        Parameters:
+        - targets (list): Ledgers or order stores, each with a file_path attribute and a pending() method returning
+          its rows not written yet.
+
+        Returns:
+            bool: True if a record was written.
+        """
+        record = {}
+        for target in targets:
+            rows = target.pending()
+            if rows:
+                record[target.file_path] = rows
+                self._written[target.file_path] = target
+        if not record:
+            return False
+        with open(self.file_path, "a") as file:
+            file.write(json.dumps(record, default=plain_value) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        return True
+
+    def written(self):
+        """
+        Count a group as written to its files, and make a checkpoint every checkpoint_interval groups.
+        """
+        self._groups += 1
+        if self._groups >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Sync the files written since the last checkpoint and empty the journal. The rows of the last run not
+        recovered yet are kept.
+        """
+        for target in self._written.values():
+            target.sync()
+        self._written = {}
+        self._groups = 0
+        with open(self.file_path, "w") as file:
+            if self._unrecovered:
+                file.write(json.dumps(self._unrecovered, default=plain_value) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def plain_value(value):
+    """Convert a numpy number to a Python number, used to write rows as JSON."""
+    return value.item()
+
@@ -0,0 +1,1007 @@
+import bisect
+import csv
+import os
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from file_lock import file_signature
+
+"""
+This module contains the ledger storage used by InventoryManagement. A ledger is the history of one of the
+inventory, remaining productivity or extra productivity records, where each row records the quantity of all
+nine fruit varieties after one operation.
+
+Three ledgers are available: CsvLedger stores every row in a CSV file, DeltaLedger only stores the change of
+each operation together with periodic snapshots of the whole row, and ColumnarLedger stores each column as a
+binary file that is read with numpy.memmap. The time of every new row is recorded by a Timeline stored next
+to the ledger file.
+"""
+
+VARIETIES = ["Ambrosia", "Gala", "Honeycrisp", "Lapins", "Sweetheart", "Skeena", "Redhaven", "Elberta",
+             "Cresthaven"]
+COLUMNS = ["index"] + VARIETIES
+# position of each variety in the current state vector of a ledger
+VARIETY_INDEX = {variety: position for position, variety in enumerate(VARIETIES)}
+
+
+class Ledger(metaclass=ABCMeta):
+    """
+    Represents an abstract base class for the ledgers. It keeps the current state in memory and the
+    full history as a DataFrame that is only built when it is asked for.
+
+    Attributes:
+    - file_path (str): The path of the ledger file.
+    - index (int): The index of the latest row, None if the ledger is empty.
+    - current (list): The quantities of the nine varieties in the latest row, in the order of VARIETIES.
+      It is all 0 if the ledger is empty.
+    - timeline (Timeline): The time of each row added to the ledger.
+
+    Note:
+    Subclasses are required to implement _load_frame, _write and rewrite.
+    """
+
+    def __init__(self, file_path):
+        """
+        Initializes an instance of Ledger.
+        """
+        self.file_path = file_path
+        self.timeline = Timeline(sidecar_path(file_path, "timeline"))
+        self.index = None
+        self.current = [0] * len(VARIETIES)
+        # the history DataFrame, None until it is loaded
+        self._frame = None
+        # rows added since self._frame was built, merged into the DataFrame when it is asked for
+        self._tail = []
+        # rows not written to the file yet
+        self._unwritten = []
+        # the signature of the ledger when it was last read or written, None if changes can't be detected
+        self._signature = None
+        # the last row recorded, and the row the rows not written yet were added after
+        self._last_row = None
+        self._base_row = None
+
+    @property
+    def frame(self):
+        """
+        The full history of the ledger as a DataFrame.
+        """
+        if self._frame is None:
+            self._frame = self._load_frame()
+            # rows not written yet are not in the file
+            self._tail = list(self._unwritten)
+        if self._tail:
+            tail = pd.DataFrame(self._tail, columns=self._frame.columns)
+            if self._frame.empty:
+                self._frame = tail
+            else:
+                self._frame = pd.concat([self._frame, tail], ignore_index=True)
+            self._tail = []
+        return self._frame
+
+    @frame.setter
+    def frame(self, frame):
+        self._frame = frame
+        self._tail = []
+        self._unwritten = []
+        self._set_current(frame)
+
+    def _set_current(self, frame):
+        """
+        Set the current state from the last row of a history DataFrame.
+        """
+        if frame.empty:
+            self._set_row(None)
+        else:
+            self._set_row(row_values(frame.iloc[[-1]]))
+
+    def _set_row(self, row):
+        """
+        Set the current state from a row, the state vector is updated in place.
+        """
+        if row is None:
+            self.index = None
+            self.current[:] = [0] * len(VARIETIES)
+        else:
+            self.index = row[0]
+            self.current[:] = row[1:]
+        self._last_row = None if row is None else list(row)
+
+    def next_row(self):
+        """
+        Returns a new row with the next index and the current quantities.
+        """
+        index = 0 if self.index is None else self.index
+        return [index + 1] + self.current
+
+    def add_rows(self, rows, reason=""):
+        """
+        Add rows to the in-memory history without writing them. They are written by the next flush().
+
+        Parameters:
+        - rows (list): A list of rows, each row is a list of values in column order.
+        - reason (str): The operation that produced the rows.
+        """
+        timestamp = datetime.now()
+        for row in rows:
+            self.timeline.add(row[0], timestamp)
+        self._add_rows(rows, reason)
+
+    def _add_rows(self, rows, reason):
+        """
+        Add rows to the in-memory history, without recording their time.
+        """
+        if self._frame is not None:
+            self._tail.extend(rows)
+        if not self._unwritten:
+            # self.current may have been changed in place, the last recorded row is the base of the new rows
+            self._base_row = self._last_row
+        self._unwritten.extend(rows)
+        self._set_row(rows[-1])
+
+    def append(self, rows, reason=""):
+        """
+        Add rows to the history and write them to the ledger file.
+
+        Parameters:
+        - rows (list): A list of rows, each row is a list of values in column order.
+        - reason (str): The operation that produced the rows.
+        """
+        self.add_rows(rows, reason)
+        self.flush()
+
+    def flush(self, rewrite=False):
+        """
+        Write the rows added since the last flush. Nothing is written if there is no new row.
+
+        Parameters:
+        - rewrite (bool): If True, rewrite the whole file instead of appending the new rows.
+        """
+        self.timeline.flush()
+        if not self._unwritten:
+            return
+        if rewrite:
+            self.rewrite()
+        else:
+            self._write(self._unwritten)
+            self._unwritten = []
+
+    def pending(self):
+        """
+        Returns the rows added since the last flush, written to the journal before they are written to the ledger.
+        """
+        return [list(row) for row in self._unwritten]
+
+    def recover(self, rows):
+        """
+        Write the rows of a journal that are missing from the ledger, the rows already written are skipped by
+        their index.
+
+        Parameters:
+        - rows (list): A list of rows, each row is a list of values in column order.
+
+        Returns:
+            int: The number of rows written.
+        """
+        missing = [row for row in rows if self.index is None or row[0] > self.index]
+        if missing:
+            self.add_rows(missing, "recover")
+            self.flush()
+        return len(missing)
+
+    def sync(self):
+        """
+        Flush the ledger file and its timeline to disk.
+        """
+        sync_file(self.file_path)
+        sync_file(self.timeline.file_path)
+
+    def unwritten_change(self, position):
+        """
+        Returns the change of the quantity of a variety made by the rows not written yet.
+
+        Parameters:
+        - position (int): The position of the variety in VARIETIES.
+        """
+        if not self._unwritten:
+            return 0
+        base = self._base_row[1 + position] if self._base_row is not None else 0
+        return self.current[position] - base
+
+    def changed(self):
+        """
+        Returns True if another process has written the ledger since it was last read or written by this instance.
+        """
+        return self._signature is not None and self._read_signature() != self._signature
+
+    def refresh(self):
+        """
+        Reload the current state if another process has written the ledger since it was last read or written
+        by this instance. The rows not written yet are moved after the rows of the other process, each keeping its
+        change of every quantity, so neither process loses the operations of the other. Should be called while
+        the file lock of the ledger is held.
+
+        Returns:
+            bool: True if the ledger was reloaded.
+        """
+        if not self.changed():
+            return False
+        # the change of each row not written yet, from the row it was added after
+        previous = self._base_row[1:] if self._base_row is not None else [0] * len(VARIETIES)
+        changes = []
+        for row in self._unwritten:
+            changes.append((row[0], [new - old for new, old in zip(row[1:], previous)]))
+            previous = row[1:]
+        timestamps = self.timeline.unwritten()
+        self._unwritten = []
+        self._frame = None
+        self._tail = []
+        self._reload()
+        for seq, change in changes:
+            index = 0 if self.index is None else self.index
+            row = [index + 1] + [value + delta for value, delta in zip(self.current, change)]
+            self.timeline.add(row[0], timestamps.get(seq, datetime.now()))
+            self._add_rows([row], "refresh")
+        return True
+
+    def _read_signature(self):
+        """
+        Returns a value that changes when the ledger is written, e.g. the modification time and size of its file.
+        None for ledgers that don't detect changes made by other processes.
+        """
+        return None
+
+    def _reload(self):
+        """
+        Reload the current state from the ledger file, called by refresh() for ledgers that detect changes.
+        """
+        pass
+
+    def state_at(self, seq):
+        """
+        Returns the row of the latest operation at or before a seq number, found by binary search
+        on the index column. None if there is no operation before seq.
+        """
+        frame = self.frame
+        position = frame["index"].searchsorted(seq, side="right")
+        if position == 0:
+            return None
+        return row_values(frame.iloc[[position - 1]])
+
+    @abstractmethod
+    def _load_frame(self):
+        """
+        Abstract method, loads the full history from the ledger file as a DataFrame.
+        """
+        pass
+
+    @abstractmethod
+    def _write(self, rows):
+        """
+        Abstract method, writes new rows to the end of the ledger file.
+        """
+        pass
+
+    @abstractmethod
+    def rewrite(self):
+        """
+        Abstract method, rewrites the whole ledger file from the in-memory history.
+        """
+        pass
+
+
+class CsvLedger(Ledger):
+    """
+    Represents a ledger stored in a CSV file with one row for each operation. New rows are appended to
+    the end of the file instead of rewriting the whole history.
+
+    Attributes:
+    - columns (list): The column names of the ledger.
+    """
+
+    def __init__(self, file_path, columns=COLUMNS):
+        """
+        Initializes an instance of CsvLedger. Only the last row of the file is read, the full history is
+        loaded the first time the frame attribute is used.
+        """
+        Ledger.__init__(self, file_path)
+        self.columns = list(columns)
+        self._newline_checked = False
+        self._open()
+
+    def _open(self):
+        """
+        Set the current state from the last row of the CSV file, creating the file with a header if it
+        doesn't exist.
+        """
+        self._signature = file_signature(self.file_path)
+        if self._signature is None:
+            self._frame = self._load_frame()
+            self._signature = file_signature(self.file_path)
+            return
+        with open(self.file_path, "r", newline="") as file:
+            header = next(csv.reader([file.readline()]), [])
+        record = read_last_record(self.file_path)
+        if record is None:
+            self._set_row(None)
+            return
+        values = dict(zip(header, record))
+        if not all(values.get(column) for column in self.columns):
+            # the last row doesn't match the header, let pandas read the whole file
+            self._frame = self._load_frame()
+            self._set_current(self._frame)
+            return
+        self._set_row([parse_number(values[column]) for column in self.columns])
+
+    def _read_signature(self):
+        """
+        Returns the modification time and size of the CSV file.
+        """
+        return file_signature(self.file_path)
+
+    def _reload(self):
+        """
+        Reload the current state from the last row of the CSV file, and the timeline written with it.
+        """
+        self.timeline = Timeline(self.timeline.file_path)
+        self._newline_checked = False
+        self._open()
+
+    def _load_frame(self):
+        """
+        Load the history from the CSV file, creating the file with a header if it doesn't exist.
+        """
+        try:
+            return pd.read_csv(self.file_path)
+        except FileNotFoundError:
+            frame = pd.DataFrame(columns=self.columns)
+            frame.to_csv(self.file_path, index=False)
+            return frame
+
+    def _write(self, rows):
+        """
+        Write rows to the end of the CSV file.
+        """
+        with open(self.file_path, mode="a", newline="") as file:
+            if not self._newline_checked:
+                # a file edited by hand may not end with a newline
+                if not ends_with_newline(self.file_path):
+                    file.write("\n")
+                self._newline_checked = True
+            writer = csv.writer(file, lineterminator="\n")
+            writer.writerows(rows)
+        self._signature = file_signature(self.file_path)
+
+    def rewrite(self):
+        """
+        Rewrite the whole CSV file from the in-memory history.
+        """
+        self.frame.to_csv(self.file_path, index=False)
+        self._signature = file_signature(self.file_path)
+        self._newline_checked = True
+        self._unwritten = []
+        self.timeline.flush()
+
+
+class DeltaLedger(Ledger):
+    """
+    Represents a ledger stored as delta events. Each operation is recorded as one (seq, variety, delta, reason)
+    event for every variety it changes, and a snapshot of all nine quantities is written to a second file every
+    snapshot_interval events. The ledger is opened from the last snapshot plus the events written after it.
+
+    Attributes:
+    - snapshot_path (str): The path of the snapshot file, e.g. inventory_snapshots.csv for inventory.csv.
+    - snapshot_interval (int): The number of events between two snapshots.
+    """
+
+    event_columns = ["seq", "variety", "delta", "reason"]
+    snapshot_columns = ["seq", "offset"] + VARIETIES
+
+    def __init__(self, file_path, snapshot_interval=100):
+        """
+        Initializes an instance of DeltaLedger and loads the current state from the last snapshot.
+        """
+        Ledger.__init__(self, file_path)
+        self.snapshot_path = sidecar_path(file_path, "snapshots")
+        self.snapshot_interval = snapshot_interval
+        # seq numbers and (byte offset, state) of the snapshots, loaded on the first state_at call
+        self._snapshot_seqs = None
+        self._snapshots = None
+        # events and snapshots not written yet, in the order they are written
+        self._pending = []
+        self._since_snapshot = 0
+        self._replaced = False
+        # the quantities of the last recorded row, self.current may be changed in place before a row is added
+        self._recorded = [0] * len(VARIETIES)
+        self._open()
+
+    def _open(self):
+        """
+        Create the ledger files if they don't exist, and load the state from the last snapshot and the events
+        written after it.
+        """
+        for path, columns in [(self.file_path, self.event_columns), (self.snapshot_path, self.snapshot_columns)]:
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                write_header(path, columns)
+
+        snapshot = read_last_record(self.snapshot_path)
+        offset = None
+        if snapshot is not None:
+            offset = int(snapshot[1])
+            self._set_row([parse_number(snapshot[0])] + [parse_number(value) for value in snapshot[2:]])
+        for seq, variety, delta in self._read_events(offset):
+            self._apply_event(self.current, variety, delta)
+            self.index = seq
+            self._since_snapshot += 1
+        self._recorded[:] = self.current
+
+    def _read_events(self, offset=None, until=None):
+        """
+        Read events from the events file.
+
+        Parameters:
+        - offset (int): The byte offset to start reading, None to read from the first event.
+        - until (int): Stop before the first event with a seq number larger than until.
+
+        Returns: A generator of (seq, variety, delta) tuples.
+        """
+        with open(self.file_path, "r", newline="") as file:
+            if offset is None:
+                file.readline()
+            else:
+                file.seek(offset)
+            for record in csv.reader(file):
+                if not record:
+                    continue
+                seq = parse_number(record[0])
+                if until is not None and seq > until:
+                    break
+                yield seq, record[1], parse_number(record[2])
+
+    @staticmethod
+    def _apply_event(state, variety, delta):
+        """
+        Apply an event to a state vector. An event without a variety only records a seq number.
+        """
+        position = VARIETY_INDEX.get(variety)
+        if position is not None:
+            state[position] += delta
+
+    def _add_rows(self, rows, reason):
+        """
+        Add rows to the ledger. Only the varieties changed by each row are recorded as events.
+        """
+        for row in rows:
+            seq = row[0]
+            events = [(seq, variety, new - old, reason)
+                      for variety, old, new in zip(VARIETIES, self._recorded, row[1:]) if new != old]
+            if not events:
+                # keep the seq number of an operation that didn't change any quantity
+                events = [(seq, "", 0, reason)]
+            self._pending.extend(events)
+            Ledger._add_rows(self, [row], reason)
+            self._recorded[:] = row[1:]
+            self._since_snapshot += len(events)
+            if self._since_snapshot >= self.snapshot_interval:
+                self._pending.append(("snapshot", [seq] + self.current))
+                self._since_snapshot = 0
+
+    def flush(self, rewrite=False):
+        """
+        Write the events and snapshots added since the last flush. Events are always appended as they are
+        already a compact record of the history, unless the history was replaced through the frame attribute.
+
+        Parameters:
+        - rewrite (bool): If True and the history was replaced, rewrite both files.
+        """
+        self.timeline.flush()
+        if self._replaced and rewrite:
+            self.rewrite()
+            return
+        if not self._pending:
+            return
+        with open(self.file_path, "a", newline="") as events_file, \
+                open(self.snapshot_path, "a", newline="") as snapshot_file:
+            events_writer = csv.writer(events_file, lineterminator="\n")
+            snapshot_writer = csv.writer(snapshot_file, lineterminator="\n")
+            for pending in self._pending:
+                if pending[0] == "snapshot":
+                    events_file.flush()
+                    offset = events_file.tell()
+                    seq, values = pending[1][0], pending[1][1:]
+                    snapshot_writer.writerow([seq, offset] + values)
+                    if self._snapshots is not None:
+                        self._snapshot_seqs.append(seq)
+                        self._snapshots.append((offset, values))
+                else:
+                    events_writer.writerow(pending)
+        self._pending = []
+        self._unwritten = []
+
+    def _write(self, rows):
+        """
+        Rows are written as events by flush().
+        """
+        self.flush()
+
+    def _load_frame(self):
+        """
+        Rebuild the full history by replaying all events, one row for each seq number.
+        """
+        rows = []
+        state = [0] * len(VARIETIES)
+        last_seq = None
+        for seq, variety, delta in self._read_events():
+            if last_seq is not None and seq != last_seq:
+                rows.append([last_seq] + state)
+            self._apply_event(state, variety, delta)
+            last_seq = seq
+        if last_seq is not None:
+            rows.append([last_seq] + state)
+        if not rows:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+    @property
+    def frame(self):
+        """
+        The full history of the ledger as a DataFrame, the rows replayed from the events file followed by the rows
+        not written yet. Nothing is written, the events are written by flush().
+        """
+        return Ledger.frame.fget(self)
+
+    @frame.setter
+    def frame(self, frame):
+        Ledger.frame.fset(self, frame)
+        self._recorded[:] = self.current
+        self._pending = []
+        self._replaced = True
+
+    def rewrite(self):
+        """
+        Rewrite the events and snapshot files from the in-memory history. As the reason of an operation is not
+        kept in the history DataFrame, this only happens if the history was replaced through the frame attribute,
+        otherwise the new events are appended.
+        """
+        if not self._replaced:
+            self.flush()
+            return
+        frame = self.frame
+        write_header(self.file_path, self.event_columns)
+        write_header(self.snapshot_path, self.snapshot_columns)
+        self._replaced = False
+        self._snapshot_seqs = None
+        self._snapshots = None
+        self._pending = []
+        self._since_snapshot = 0
+        self._set_row(None)
+        self._recorded[:] = self.current
+        rows = [list(row) for row in frame.itertuples(index=False)]
+        if rows:
+            # the rows keep the times already recorded in the timeline
+            self._add_rows(rows, "rewrite")
+        self.flush()
+        self._tail = []
+        self._frame = frame
+
+    def state_at(self, seq):
+        """
+        Reconstruct the row at a seq number from the closest snapshot before it and the events after that snapshot.
+
+        Parameters:
+        - seq (int): The seq number.
+
+        Returns:
+            list: The row (index and nine quantities) of the latest operation at or before seq,
+            None if there is no operation before seq.
+        """
+        if self._snapshots is None:
+            self._snapshot_seqs = []
+            self._snapshots = []
+            with open(self.snapshot_path, "r", newline="") as file:
+                file.readline()
+                for record in csv.reader(file):
+                    if record:
+                        self._snapshot_seqs.append(parse_number(record[0]))
+                        self._snapshots.append((int(record[1]), [parse_number(value) for value in record[2:]]))
+
+        position = bisect.bisect_right(self._snapshot_seqs, seq)
+        if position == 0:
+            found_seq, offset, state = None, None, [0] * len(VARIETIES)
+        else:
+            found_seq = self._snapshot_seqs[position - 1]
+            offset, values = self._snapshots[position - 1]
+            state = list(values)
+        for event_seq, variety, delta in self._read_events(offset, until=seq):
+            self._apply_event(state, variety, delta)
+            found_seq = event_seq
+        row = None if found_seq is None else [found_seq] + state
+        # rows added in a batch are not written yet
+        for unwritten in self._unwritten:
+            if unwritten[0] <= seq:
+                row = list(unwritten)
+        return row
+
+    def sync(self):
+        """
+        Flush the events, snapshots and timeline files to disk.
+        """
+        Ledger.sync(self)
+        sync_file(self.snapshot_path)
+
+
+class ColumnarLedger(Ledger):
+    """
+    Represents a ledger stored as one binary file for each column in a directory, e.g. inventory/index.bin and
+    inventory/Ambrosia.bin. The index column is stored as 64-bit integers and the variety columns as 64-bit floats,
+    all little-endian, so the number of rows is the size of a file divided by 8. Columns are opened with
+    numpy.memmap, reading a column or a range of rows doesn't parse any text or copy the file into memory.
+    CSV files are only used to import and export the history.
+
+    Attributes:
+    - directory (str): The directory of the column files, it is also the file_path of the ledger.
+    """
+
+    dtypes = {column: np.dtype("<i8") if column == "index" else np.dtype("<f8") for column in COLUMNS}
+
+    def __init__(self, directory):
+        """
+        Initializes an instance of ColumnarLedger, creating the directory and empty column files if they don't
+        exist. Only the last row is read.
+        """
+        Ledger.__init__(self, directory)
+        self.directory = directory
+        self.timeline = Timeline(os.path.join(directory, "timeline.csv"))
+        os.makedirs(directory, exist_ok=True)
+        for column in COLUMNS:
+            if not os.path.exists(self._column_path(column)):
+                open(self._column_path(column), "wb").close()
+        self._length = min(os.path.getsize(self._column_path(column)) // self.dtypes[column].itemsize
+                           for column in COLUMNS)
+        for column in COLUMNS:
+            # a row only partly written when the program stopped is dropped
+            if os.path.getsize(self._column_path(column)) != self._length * self.dtypes[column].itemsize:
+                os.truncate(self._column_path(column), self._length * self.dtypes[column].itemsize)
+        self._maps = {}
+        if self._length > 0:
+            self._set_row(self._read_row(self._length - 1))
+
+    def __len__(self):
+        """
+        Returns the number of rows written to the column files.
+        """
+        return self._length
+
+    def _column_path(self, column):
+        """
+        Returns the path of the file of a column.
+        """
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def column(self, column, start=0, stop=None):
+        """
+        Returns a range of rows of a column as a read-only array mapped to the column file, without copying it.
+
+        Parameters:
+        - column (str): "index" or a variety, e.g. "Ambrosia".
+        - start (int): The position of the first row.
+        - stop (int): The position after the last row, None for the end of the column.
+
+        Returns:
+            np.ndarray: The values of the column, empty if the ledger is empty.
+        """
+        if column not in self.dtypes:
+            raise ValueError(f"Column {column} not found")
+        if self._length == 0:
+            return np.empty(0, dtype=self.dtypes[column])
+        if column not in self._maps:
+            self._maps[column] = np.memmap(self._column_path(column), dtype=self.dtypes[column], mode="r",
+                                           shape=(self._length,))
+        return self._maps[column][start:stop]
+
+    def _read_row(self, position):
+        """
+        Returns the row at a position of the column files, with whole numbers converted to int.
+        """
+        return [to_number(self.column(column)[position]) for column in COLUMNS]
+
+    def _load_frame(self):
+        """
+        Load the history from the column files. Variety columns holding only whole numbers are loaded as integers,
+        as they are from a CSV file.
+        """
+        if self._length == 0:
+            return pd.DataFrame(columns=COLUMNS)
+        data = {}
+        for column in COLUMNS:
+            values = np.array(self.column(column))
+            if values.dtype.kind == "f" and np.all(np.mod(values, 1) == 0):
+                values = values.astype(np.int64)
+            data[column] = values
+        return pd.DataFrame(data)
+
+    def _write_columns(self, rows, mode):
+        """
+        Write rows to the column files, mode "ab" appends them and "wb" replaces the files.
+        """
+        values = list(zip(*rows)) if rows else [[] for column in COLUMNS]
+        for column, column_values in zip(COLUMNS, values):
+            with open(self._column_path(column), mode) as file:
+                file.write(np.asarray(column_values, dtype=self.dtypes[column]).tobytes())
+        # the mapped files have a fixed size, they are mapped again on the next read
+        self._maps = {}
+
+    def _write(self, rows):
+        """
+        Append rows to the end of the column files.
+        """
+        self._write_columns(rows, "ab")
+        self._length += len(rows)
+
+    def rewrite(self):
+        """
+        Rewrite the column files from the in-memory history.
+        """
+        rows = [list(row) for row in self.frame.itertuples(index=False)]
+        self._write_columns(rows, "wb")
+        self._length = len(rows)
+        self._unwritten = []
+        self.timeline.flush()
+
+    def state_at(self, seq):
+        """
+        Returns the row of the latest operation at or before a seq number, found by binary search on the
+        mapped index column. None if there is no operation before seq.
+        """
+        position = int(np.searchsorted(self.column("index"), seq, side="right"))
+        row = None if position == 0 else self._read_row(position - 1)
+        # rows added in a batch are not written yet
+        for pending in self._unwritten:
+            if pending[0] <= seq:
+                row = list(pending)
+        return row
+
+    def sync(self):
+        """
+        Flush the column files and the timeline to disk.
+        """
+        for column in COLUMNS:
+            sync_file(self._column_path(column))
+        sync_file(self.timeline.file_path)
+
+    def import_csv(self, file_path):
+        """
+        Replace the history with the rows of a ledger CSV file.
+
+        Parameters:
+        - file_path (str): The path of the CSV file, with the columns of COLUMNS.
+        """
+        self.frame = pd.read_csv(file_path)[COLUMNS]
+        self.rewrite()
+
+    def export_csv(self, file_path):
+        """
+        Write the history to a CSV file.
+
+        Parameters:
+        - file_path (str): The path of the CSV file.
+        """
+        self.flush()
+        self.frame.to_csv(file_path, index=False)
+
+
+class Timeline:
+    """
+    Represents the time index of a ledger, a list of (seq, timestamp) pairs sorted by both seq and timestamp,
+    stored in a CSV file next to the ledger, e.g. inventory_timeline.csv for inventory.csv.
+    Rows written before the timeline existed have no timestamp.
+
+    Attributes:
+    - file_path (str): The path of the timeline file.
+    """
+
+    columns = ["seq", "timestamp"]
+
+    def __init__(self, file_path):
+        """
+        Initializes an instance of Timeline. The file is loaded on the first query.
+        """
+        self.file_path = file_path
+        self._seqs = None
+        self._timestamps = None
+        self._last_timestamp = None
+        self._last_checked = False
+        self._unwritten = []
+
+    def _load(self):
+        """
+        Load the seq numbers and timestamps from the timeline file.
+        """
+        self._seqs = []
+        self._timestamps = []
+        for seq, timestamp in self._read_entries():
+            self._seqs.append(seq)
+            self._timestamps.append(timestamp)
+        # entries added before the first query
+        for seq, timestamp in self._unwritten:
+            self._seqs.append(seq)
+            self._timestamps.append(timestamp)
+
+    def _read_entries(self):
+        """
+        Returns the (seq, timestamp) entries stored in the timeline file.
+        """
+        entries = []
+        if os.path.exists(self.file_path):
+            with open(self.file_path, "r", newline="") as file:
+                file.readline()
+                for record in csv.reader(file):
+                    if record:
+                        entries.append((parse_number(record[0]), datetime.fromisoformat(record[1])))
+        return entries
+
+    def _read_last_timestamp(self):
+        """
+        Returns the last timestamp stored in the timeline file, None if there is no entry.
+        """
+        if os.path.exists(self.file_path):
+            record = read_last_record(self.file_path)
+            if record is not None:
+                return datetime.fromisoformat(record[1])
+        return None
+
+    def add(self, seq, timestamp):
+        """
+        Record the time of a new row. A timestamp earlier than the previous one is moved forward, so the
+        timeline stays sorted if the system clock is set back.
+
+        Returns:
+            datetime: The timestamp recorded.
+        """
+        if not self._last_checked:
+            self._last_checked = True
+            self._last_timestamp = self._read_last_timestamp()
+        if self._last_timestamp is not None and timestamp < self._last_timestamp:
+            timestamp = self._last_timestamp
+        self._last_timestamp = timestamp
+        self._unwritten.append((seq, timestamp))
+        if self._seqs is not None:
+            self._seqs.append(seq)
+            self._timestamps.append(timestamp)
+        return timestamp
+
+    def unwritten(self):
+        """
+        Returns the timestamp of each row recorded since the last flush, keyed by seq number.
+        """
+        return dict(self._unwritten)
+
+    def entries(self):
+        """
+        Returns the timestamp of each recorded row, keyed by seq number.
+        """
+        if self._seqs is None:
+            self._load()
+        return dict(zip(self._seqs, self._timestamps))
+
+    def flush(self):
+        """
+        Write the entries added since the last flush to the end of the timeline file.
+        """
+        if not self._unwritten:
+            return
+        self._write_entries(self._unwritten)
+        self._unwritten = []
+
+    def _write_entries(self, entries):
+        """
+        Write (seq, timestamp) entries to the end of the timeline file.
+        """
+        new_file = not os.path.exists(self.file_path)
+        with open(self.file_path, "a", newline="") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            if new_file:
+                writer.writerow(self.columns)
+            writer.writerows([(seq, timestamp.isoformat()) for seq, timestamp in entries])
+
+    def seq_at(self, timestamp):
+        """
+        Returns the seq number of the latest row recorded at or before timestamp, found by binary search.
+        None if no row was recorded before timestamp.
+        """
+        if self._seqs is None:
+            self._load()
+        position = bisect.bisect_right(self._timestamps, timestamp)
+        if position == 0:
+            return None
+        return self._seqs[position - 1]
+
+    def timestamp_of(self, seq):
+        """
+        Returns the time a row was recorded, None if the row has no timestamp.
+        """
+        if self._seqs is None:
+            self._load()
+        position = bisect.bisect_left(self._seqs, seq)
+        if position < len(self._seqs) and self._seqs[position] == seq:
+            return self._timestamps[position]
+        return None
+
+
+def sidecar_path(file_path, name):
+    """Returns the path of a file stored next to a ledger, e.g. inventory_timeline.csv for inventory.csv."""
+    root, extension = os.path.splitext(file_path)
+    return f"{root}_{name}{extension or '.csv'}"
+
+
+def row_values(row):
+    """Convert a one-row DataFrame into a list of values, keeping the type of each column."""
+    return list(next(row.itertuples(index=False)))
+
+
+def parse_number(text):
+    """Convert a number read from a file to int, or to float if it is not an integer."""
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def to_number(value):
+    """Convert a number, e.g. a numpy number, to int if it is a whole number, otherwise to float."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def write_header(file_path, columns):
+    """Create or empty a CSV file, writing only the column names."""
+    with open(file_path, "w", newline="") as file:
+        csv.writer(file, lineterminator="\n").writerow(columns)
+
+
+def read_last_record(file_path):
+    """
+    Returns the fields of the last line of a CSV file without reading the whole file,
+    or None if the file only has a header.
+    """
+    with open(file_path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        end = file.tell()
+        block = 1024
+        data = b""
+        # read blocks backwards until the whole last line is read
+        while end > 0 and b"\n" not in data.rstrip(b"\r\n"):
+            start = max(0, end - block)
+            file.seek(start)
+            data = file.read(end - start) + data
+            end = start
+            block *= 2
+    lines = data.rstrip(b"\r\n").split(b"\n")
+    if len(lines) < 2 and end == 0:
+        return None
+    return next(csv.reader([lines[-1].decode().rstrip("\r")]))
+
+
+def sync_file(file_path):
+    """Flush a file to disk if it exists."""
+    if os.path.isfile(file_path):
+        with open(file_path, "rb+") as file:
+            os.fsync(file.fileno())
+
+
+def ends_with_newline(file_path):
+    """Returns True if the file is empty or its last character is a newline."""
+    with open(file_path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return True
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def format_row(row):
+    """Returns a one-line description of a ledger row, e.g. 'index: 2, Ambrosia: 300, Gala: 0, ...'."""
+    return ", ".join(f"{column}: {value}" for column, value in zip(COLUMNS, row))
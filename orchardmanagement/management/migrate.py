@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from management.ledger import CsvLedger
+from management.order_store import CsvOrderStore
+from management.sqlite_storage import SqliteLedger, SqliteOrderStore, connect
+
+"""
+This module copies the inventory ledgers and sales orders from the CSV files into a SQLite database.
+Running it again replaces the tables with the current content of the CSV files.
+
+Usage:
+python migrate.py orchard.db [--directory management]
+- 'orchard.db': The SQLite database to create or update.
+- '--directory': The folder of inventory.csv, remaining_productivity.csv, extra_productivity.csv and orders.csv.
+"""
+
+
+def migrate(db_path, extra_productivity_file, remaining_productivity_file, inventory_file, order_file):
+    """
+    Copy the CSV files of the inventory and sales modules into a SQLite database. The time of each ledger row
+    and order is copied from its timeline file. A missing file is skipped.
+
+    Parameters:
+    - db_path (str): The path of the SQLite database.
+    - extra_productivity_file (str): The file path for the extra productivity data.
+    - remaining_productivity_file (str): The file path for the remaining productivity data.
+    - inventory_file (str): The file path for the inventory data.
+    - order_file (str): The file path for the sales orders.
+
+    Returns:
+        dict: The number of rows copied into each table.
+    """
+    connection = connect(db_path)
+    copied = {}
+    for table, file_path in [("inventory", inventory_file), ("remaining_productivity", remaining_productivity_file),
+                             ("extra_productivity", extra_productivity_file)]:
+        if not os.path.exists(file_path):
+            print(f"There is no {file_path} file")
+            continue
+        source = CsvLedger(file_path)
+        target = SqliteLedger(db_path, table, connection)
+        target.frame = source.frame
+        target.rewrite()
+        # the recorded times are copied as they are, replacing the times of the rows copied before
+        target.timeline.replace(source.timeline._read_entries())
+        copied[table] = len(target.frame)
+
+    if os.path.exists(order_file):
+        source = CsvOrderStore(order_file)
+        orders = source.load()
+        target = SqliteOrderStore(db_path, "orders", connection)
+        target.rewrite(orders)
+        target.timeline.replace(source.timeline._read_entries())
+        copied["orders"] = len(orders)
+    else:
+        print(f"There is no {order_file} file")
+    connection.close()
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the inventory and sales CSV files into a SQLite database.")
+    parser.add_argument("db_path", help="the SQLite database to create or update")
+    parser.add_argument("--directory", default="management", help="the folder of the CSV files")
+    args = parser.parse_args()
+    copied = migrate(args.db_path,
+                     os.path.join(args.directory, "extra_productivity.csv"),
+                     os.path.join(args.directory, "remaining_productivity.csv"),
+                     os.path.join(args.directory, "inventory.csv"),
+                     os.path.join(args.directory, "orders.csv"))
+    for table, rows in copied.items():
+        print(f"{table}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
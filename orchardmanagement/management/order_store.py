@@ -0,0 +1,314 @@
+import csv
+import os
+from abc import ABCMeta, abstractmethod
+import pandas as pd
+from datetime import datetime
+from file_lock import file_lock, file_signature
+from management.ledger import Timeline, ends_with_newline, parse_number, read_last_record, sidecar_path, sync_file
+
+"""
+This module contains the storage of sales orders used by SalesManagement. An order store loads the orders as a
+DataFrame and writes only the new orders when an order is added.
+"""
+
+ORDER_COLUMNS = ["index", "sales_type", "fruit_type", "fruit_variety", "weight", "unit_price", "revenue"]
+# the columns an order summary can be grouped by
+SUMMARY_COLUMNS = ["sales_type", "fruit_type", "fruit_variety"]
+# the string columns of the orders, kept in memory as categoricals
+CATEGORY_COLUMNS = ["sales_type", "fruit_variety"]
+
+
+class OrderStore(metaclass=ABCMeta):
+    """
+    Represents an abstract base class for the storage of sales orders.
+
+    Attributes:
+    - file_path (str): The path of the file storing the orders.
+    - lock (FileLock): The lock of the file, held while the orders are read, changed and written.
+    - timeline (Timeline): The time each order was recorded, keyed by order index. Orders written before the
+      timeline existed have no timestamp.
+
+    Note:
+    Subclasses are required to implement _new_timeline, last_index, load, insert, rewrite, select and summary.
+    """
+
+    def __init__(self, file_path):
+        """
+        Initializes an instance of OrderStore.
+        """
+        self.file_path = file_path
+        self.lock = file_lock(file_path)
+        # the signature of the orders when they were last loaded or written
+        self._signature = None
+        # orders staged but not written yet
+        self._unwritten = []
+        self.timeline = self._new_timeline()
+
+    def changed(self):
+        """
+        Returns True if another process has written the orders since they were last loaded or written by
+        this instance.
+        """
+        return self._read_signature() != self._signature
+
+    def _read_signature(self):
+        """
+        Returns a value that changes when the orders are written, the modification time and size of the file.
+        """
+        return file_signature(self.file_path)
+
+    def stage(self, rows, timestamp=None):
+        """
+        Add new orders to be written by the next flush(), e.g. together with the ledgers of an InventoryManagement.
+
+        Parameters:
+        - rows (list): A list of orders, each order is a list of values in the order of ORDER_COLUMNS.
+        - timestamp (datetime): The time the orders were recorded, now if None.
+
+        Returns:
+            list: The timestamp recorded in the timeline for each order.
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+        self._unwritten.extend(list(row) for row in rows)
+        return [self.timeline.add(row[0], timestamp) for row in rows]
+
+    def pending(self):
+        """
+        Returns the orders staged but not written yet.
+        """
+        return [list(row) for row in self._unwritten]
+
+    def flush(self):
+        """
+        Write the staged orders and their timestamps. Nothing is written if there is no staged order.
+        """
+        if self._unwritten:
+            self.insert(self._unwritten)
+            self._unwritten = []
+        self.timeline.flush()
+
+    def recover(self, rows):
+        """
+        Write the orders of a journal that are missing from the store, the orders already written are skipped
+        by their index.
+
+        Returns:
+            int: The number of orders written.
+        """
+        last = self.last_index()
+        missing = [row for row in rows if last is None or row[0] > last]
+        if missing:
+            # the time of the recovered orders is the time they are recovered
+            self.stage(missing)
+            self.flush()
+        return len(missing)
+
+    def sync(self):
+        """
+        Flush the file of the orders and its timeline to disk.
+        """
+        sync_file(self.file_path)
+        sync_file(self.timeline.file_path)
+
+    def reload_timeline(self):
+        """
+        Read the timeline again, e.g. after another process has written orders.
+        """
+        self.timeline = self._new_timeline()
+
+    @abstractmethod
+    def summary(self, by="fruit_variety"):
+        """
+        Abstract method, returns the number of orders, weight and revenue of the whole history for each value of
+        a column of SUMMARY_COLUMNS, as a DataFrame with the columns by, orders, weight and revenue sorted by value.
+        """
+        pass
+
+    @abstractmethod
+    def _new_timeline(self):
+        """
+        Abstract method, returns the timeline of the orders.
+        """
+        pass
+
+    @abstractmethod
+    def last_index(self):
+        """
+        Abstract method, returns the index of the last stored order, None if there is no order.
+        """
+        pass
+
+    @abstractmethod
+    def load(self):
+        """
+        Abstract method, loads all orders as a DataFrame with the columns of ORDER_COLUMNS.
+        """
+        pass
+
+    @abstractmethod
+    def insert(self, rows):
+        """
+        Abstract method, writes new orders, each order is a list of values in the order of ORDER_COLUMNS.
+        """
+        pass
+
+    @abstractmethod
+    def rewrite(self, orders):
+        """
+        Abstract method, replaces all stored orders with the orders of a DataFrame.
+        """
+        pass
+
+    @abstractmethod
+    def select(self, column, value):
+        """
+        Abstract method, returns the orders whose column equals value as a DataFrame.
+        """
+        pass
+
+
+class CsvOrderStore(OrderStore):
+    """
+    Represents orders stored in a CSV file, new orders are appended to the end of the file.
+    """
+
+    def __init__(self, file_path):
+        """
+        Initializes an instance of CsvOrderStore.
+        """
+        OrderStore.__init__(self, file_path)
+        self._newline_checked = False
+
+    def load(self):
+        """
+        Load the orders from the CSV file, creating the file with a header if it doesn't exist.
+        """
+        try:
+            self._signature = file_signature(self.file_path)
+            # the strings are parsed into categoricals, not into one Python string for each order
+            return pd.read_csv(self.file_path, dtype={column: "category" for column in CATEGORY_COLUMNS})
+        except FileNotFoundError:
+            # If the file doesn't exist, return an initial empty DataFrame
+            orders = pd.DataFrame(columns=ORDER_COLUMNS)
+            orders.to_csv(self.file_path, index=False)
+            self._signature = file_signature(self.file_path)
+            return orders
+
+    def _new_timeline(self):
+        """
+        Returns the timeline stored in a CSV file next to the orders, e.g. orders_timeline.csv for orders.csv.
+        """
+        return Timeline(sidecar_path(self.file_path, "timeline"))
+
+    def last_index(self):
+        """
+        Returns the index of the last order of the CSV file, only the last line is read.
+        """
+        if not os.path.exists(self.file_path):
+            return None
+        record = read_last_record(self.file_path)
+        return None if not record else parse_number(record[0])
+
+    def insert(self, rows):
+        """
+        Write new orders to the end of the CSV file.
+        """
+        with open(self.file_path, mode="a", newline="") as file:
+            if not self._newline_checked:
+                if not ends_with_newline(self.file_path):
+                    file.write("\n")
+                self._newline_checked = True
+            csv.writer(file, lineterminator="\n").writerows(rows)
+        self._signature = file_signature(self.file_path)
+
+    def rewrite(self, orders):
+        """
+        Rewrite the whole CSV file from a DataFrame.
+        """
+        orders.to_csv(self.file_path, index=False)
+        self._signature = file_signature(self.file_path)
+        self._newline_checked = True
+
+    def select(self, column, value):
+        """
+        Returns the orders whose column equals value, the file is scanned as it has no index.
+        """
+        if not os.path.exists(self.file_path):
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        orders = pd.read_csv(self.file_path)
+        return orders[orders[column] == value].reset_index(drop=True)
+
+    def summary(self, by="fruit_variety"):
+        """
+        Returns the number of orders, weight and revenue for each value of a column, the file is scanned.
+        """
+        if not os.path.exists(self.file_path):
+            return summarize(pd.DataFrame(columns=ORDER_COLUMNS), by)
+        return summarize(pd.read_csv(self.file_path), by)
+
+
+def summarize(orders, by):
+    """
+    Returns the number of orders, weight and revenue of some orders for each value of a column of SUMMARY_COLUMNS.
+    """
+    if by not in SUMMARY_COLUMNS:
+        raise ValueError(f"Column {by} not found")
+    return orders.groupby(by).agg(orders=("index", "size"), weight=("weight", "sum"),
+                                  revenue=("revenue", "sum")).reset_index()
+
+
+def compact_orders(orders, like=None):
+    """
+    Returns the orders with compact dtypes: the columns of CATEGORY_COLUMNS as categoricals and the fruit_type
+    code as the narrowest integer type holding it. The index and whole weights are int64, so sums and new indexes
+    computed from them don't overflow. The unit_price and revenue stay float64, so the money is not rounded.
+
+    Parameters:
+    - orders (pd.DataFrame): The orders, with the columns of ORDER_COLUMNS.
+    - like (pd.DataFrame): Compact orders whose categories come first, so the codes of both match, e.g. the orders
+      new orders are appended to.
+
+    Returns:
+        pd.DataFrame: A new DataFrame of the orders.
+    """
+    # the columns are replaced, not written to, so the orders passed in are not changed
+    orders = orders.copy(deep=False)
+    for column in CATEGORY_COLUMNS:
+        categories = [] if like is None else list(like[column].cat.categories)
+        known = set(categories)
+        values = orders[column].dropna()
+        categories += sorted(value for value in values.unique() if value not in known)
+        orders[column] = pd.Categorical(orders[column], categories=categories)
+    # the fruit_type is a code, only compared and grouped by
+    orders["fruit_type"] = pd.to_numeric(pd.to_numeric(orders["fruit_type"]).astype("int64"), downcast="integer")
+    for column in ["index", "weight"]:
+        values = pd.to_numeric(orders[column])
+        if values.empty or (values % 1 == 0).all():
+            values = values.astype("int64")
+        orders[column] = values
+    for column in ["unit_price", "revenue"]:
+        orders[column] = pd.to_numeric(orders[column]).astype("float64")
+    return orders
+
+
+def append_orders(orders, rows):
+    """
+    Returns compact orders with new orders appended, the categories of both are merged so the columns stay
+    categorical.
+
+    Parameters:
+    - orders (pd.DataFrame): Compact orders, as returned by compact_orders().
+    - rows (list): The new orders, each order is a list of values in the order of ORDER_COLUMNS.
+
+    Returns:
+        pd.DataFrame: A new DataFrame of the orders.
+    """
+    tail = compact_orders(pd.DataFrame(rows, columns=ORDER_COLUMNS), like=orders)
+    if orders.empty:
+        return tail
+    orders = orders.copy(deep=False)
+    for column in CATEGORY_COLUMNS:
+        # the new categories are added at the end, the codes of the orders don't change
+        orders[column] = orders[column].cat.set_categories(tail[column].cat.categories)
+    return pd.concat([orders, tail], ignore_index=True)
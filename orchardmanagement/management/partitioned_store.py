@@ -0,0 +1,406 @@
+import csv
+import json
+import os
+import pandas as pd
+from datetime import datetime
+from file_lock import file_signature
+from management.ledger import Timeline, sync_file, sidecar_path, to_number
+from management.order_store import CATEGORY_COLUMNS, ORDER_COLUMNS, SUMMARY_COLUMNS, OrderStore
+
+"""
+This module contains the order store that writes the sales orders of each season, or of each month, to its own
+partition file, e.g. orders_2026.csv, next to a manifest of the partitions. Loading the orders of the current season
+and selecting orders only read the partitions that can hold them, and the revenue of the whole history is summed
+from the manifest without opening any partition file. The string columns are written as integer codes, and their
+dictionaries are stored once in the manifest.
+"""
+
+
+def season_key(timestamp):
+    """Returns the partition of a timestamp when partitioned by season, e.g. "2026", one season a year."""
+    return f"{timestamp.year:04d}"
+
+
+def month_key(timestamp):
+    """Returns the partition of a timestamp when partitioned by month, e.g. "2026-10"."""
+    return f"{timestamp.year:04d}-{timestamp.month:02d}"
+
+
+PARTITION_PERIODS = {"season": season_key, "month": month_key}
+
+
+class PartitionedOrderStore(OrderStore):
+    """
+    Represents orders stored in one CSV file for each season or month, in the time order the orders were recorded.
+    A new order is appended to the partition of its timestamp, and its timestamp to the timeline of the partition,
+    e.g. orders_2026_timeline.csv.
+
+    The manifest, manifest.json in the folder of the partitions, keeps for each partition its file name, its
+    number of orders, the first and last order index, and the number of orders, weight and revenue in cents for
+    each value of the columns of SUMMARY_COLUMNS. It is rewritten after each write and read again when another
+    process has written it.
+
+    The columns of CATEGORY_COLUMNS are written to the partitions as codes, the position of each value in the
+    dictionary of the column kept in the manifest, e.g. 0 for "selling". A new value is added to the end of its
+    dictionary, so the codes already written don't change, and the orders are loaded as categoricals.
+
+    Attributes:
+    - directory (str): The folder of the partition files and the manifest.
+    - period (str): "season" or "month", the time span of a partition.
+    - load_partitions (str or list): The partitions loaded by load(), "current" for the partition of the current
+      time, "all", or a list of partition keys, e.g. ["2025", "2026"].
+    - file_path (str): The path of the manifest, also used for the lock of the store and by the journal.
+    """
+
+    def __init__(self, directory, period="season", load_partitions="current"):
+        """
+        Initializes an instance of PartitionedOrderStore, creating the folder if it doesn't exist.
+        """
+        if period not in PARTITION_PERIODS:
+            raise ValueError(f"Period {period} not found, please choose from: {', '.join(PARTITION_PERIODS)}")
+        self.directory = directory
+        self.period = period
+        self.load_partitions = load_partitions
+        os.makedirs(directory, exist_ok=True)
+        self._manifest = {}
+        self._dictionaries = {column: [] for column in CATEGORY_COLUMNS}
+        self._manifest_signature = None
+        # the partition of each staged order, keyed by order index
+        self._partition_of = {}
+        # the partitions written since the last sync
+        self._touched = set()
+        OrderStore.__init__(self, os.path.join(directory, "manifest.json"))
+
+    def partition_key(self, timestamp):
+        """
+        Returns the key of the partition of a timestamp, e.g. "2026" by season or "2026-10" by month.
+        """
+        return PARTITION_PERIODS[self.period](timestamp)
+
+    def partition_path(self, key):
+        """
+        Returns the path of the file of a partition, e.g. orders_2026.csv.
+        """
+        return os.path.join(self.directory, f"orders_{key}.csv")
+
+    def manifest(self):
+        """
+        Returns the manifest of the partitions, keyed by partition key. It is read again if another process has
+        written it.
+        """
+        signature = file_signature(self.file_path)
+        if signature != self._manifest_signature:
+            if signature is None:
+                self._manifest = {}
+                self._dictionaries = {column: [] for column in CATEGORY_COLUMNS}
+            else:
+                with open(self.file_path, "r") as file:
+                    content = json.load(file)
+                self._manifest = content["partitions"]
+                self._dictionaries = content["dictionaries"]
+            self._manifest_signature = signature
+        return self._manifest
+
+    def dictionaries(self):
+        """
+        Returns the values of each column of CATEGORY_COLUMNS, in the order of their codes.
+        """
+        self.manifest()
+        return self._dictionaries
+
+    def _write_manifest(self, manifest, dictionaries=None):
+        """
+        Write the manifest to a temporary file and replace the old one, so a reader never sees a partial manifest.
+        """
+        if dictionaries is None:
+            dictionaries = self._dictionaries
+        temporary_path = self.file_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"period": self.period, "dictionaries": dictionaries, "partitions": manifest}, file, indent=1,
+                      sort_keys=True)
+        os.replace(temporary_path, self.file_path)
+        self._manifest = manifest
+        self._dictionaries = dictionaries
+        self._manifest_signature = file_signature(self.file_path)
+        self._signature = self._manifest_signature
+
+    def loaded_keys(self):
+        """
+        Returns the keys of the partitions read by load(), sorted, only the partitions that exist.
+        """
+        manifest = self.manifest()
+        if self.load_partitions == "all":
+            return sorted(manifest)
+        if self.load_partitions == "current":
+            keys = [self.partition_key(datetime.now())]
+        else:
+            keys = list(self.load_partitions)
+        return sorted(key for key in keys if key in manifest)
+
+    def stage(self, rows, timestamp=None):
+        """
+        Add new orders to be written by the next flush(), each to the partition of its recorded timestamp.
+        """
+        timestamps = OrderStore.stage(self, rows, timestamp)
+        for row, recorded in zip(rows, timestamps):
+            self._partition_of[row[0]] = self.partition_key(recorded)
+        return timestamps
+
+    def _new_timeline(self):
+        """
+        Returns the timeline of the orders, stored in one file for each partition.
+        """
+        return PartitionedTimeline(self)
+
+    def last_index(self):
+        """
+        Returns the index of the last order of all partitions, from the manifest.
+        """
+        indexes = [partition["max_index"] for partition in self.manifest().values()]
+        return max(indexes) if indexes else None
+
+    def load(self):
+        """
+        Load the orders of the partitions of load_partitions, e.g. only the current season.
+        """
+        self._signature = file_signature(self.file_path)
+        frames = [self._read_partition(key) for key in self.loaded_keys()]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def _read_partition(self, key, codes=False):
+        """
+        Returns the orders of a partition, with the columns of CATEGORY_COLUMNS as categoricals, or as their codes
+        if codes is True.
+        """
+        orders = pd.read_csv(self.partition_path(key))
+        if not codes:
+            orders = self._decode(orders)
+        return orders
+
+    def _decode(self, orders):
+        """
+        Returns orders with the codes of the columns of CATEGORY_COLUMNS replaced by categoricals of their values.
+        """
+        dictionaries = self.dictionaries()
+        for column in CATEGORY_COLUMNS:
+            orders[column] = pd.Categorical.from_codes(orders[column].astype("int64"), categories=dictionaries[column])
+        return orders
+
+    def _encode(self, values, column, dictionaries):
+        """
+        Returns the codes of the values of a column, the new values are added to the end of its dictionary.
+        """
+        dictionary = dictionaries[column]
+        positions = {value: code for code, value in enumerate(dictionary)}
+        codes = []
+        for value in values:
+            if value not in positions:
+                positions[value] = len(dictionary)
+                dictionary.append(value)
+            codes.append(positions[value])
+        return codes
+
+    def insert(self, rows):
+        """
+        Append new orders to the files of their partitions, and update the manifest.
+        """
+        manifest = {key: dict(partition) for key, partition in self.manifest().items()}
+        dictionaries = {column: list(values) for column, values in self.dictionaries().items()}
+        encoded = [list(row) for row in rows]
+        for column in CATEGORY_COLUMNS:
+            position = ORDER_COLUMNS.index(column)
+            for row, code in zip(encoded, self._encode([row[position] for row in rows], column, dictionaries)):
+                row[position] = code
+        if dictionaries != self._dictionaries:
+            # the new values are in the manifest before their codes are in a partition
+            self._write_manifest(self._manifest, dictionaries)
+        current = self.partition_key(datetime.now())
+        groups = {}
+        for row, encoded_row in zip(rows, encoded):
+            groups.setdefault(self._partition_of.pop(row[0], current), []).append((row, encoded_row))
+        for key, group in groups.items():
+            file_path = self.partition_path(key)
+            new_file = not os.path.exists(file_path)
+            with open(file_path, mode="a", newline="") as file:
+                writer = csv.writer(file, lineterminator="\n")
+                if new_file:
+                    writer.writerow(ORDER_COLUMNS)
+                writer.writerows(encoded_row for row, encoded_row in group)
+            group = [row for row, encoded_row in group]
+            manifest[key] = add_to_partition(manifest.get(key), os.path.basename(file_path), group)
+            self._touched.add(key)
+        self._write_manifest(manifest)
+
+    def rewrite(self, orders):
+        """
+        Replace all stored orders with the orders of a DataFrame. An order stays in the partition whose index range
+        holds its index, the other orders are written to the partition of the current time.
+        """
+        manifest = self.manifest()
+        ranges = sorted((partition["min_index"], partition["max_index"], key) for key, partition in manifest.items())
+        current = self.partition_key(datetime.now())
+        keys = []
+        for index in orders["index"]:
+            keys.append(next((key for first, last, key in ranges if first <= index <= last), current))
+        groups = {}
+        if not orders.empty:
+            groups = {key: group for key, group in orders.groupby(pd.Series(keys, index=orders.index), sort=True)}
+        new_manifest = {}
+        dictionaries = {column: [] for column in CATEGORY_COLUMNS}
+        for key, group in groups.items():
+            file_path = self.partition_path(key)
+            encoded = group[ORDER_COLUMNS].copy()
+            for column in CATEGORY_COLUMNS:
+                encoded[column] = self._encode(group[column], column, dictionaries)
+            encoded.to_csv(file_path, index=False)
+            new_manifest[key] = add_to_partition(None, os.path.basename(file_path),
+                                                 group[ORDER_COLUMNS].values.tolist())
+            self._touched.add(key)
+        for key in set(manifest) - set(new_manifest):
+            os.remove(self.partition_path(key))
+            # the times recorded for the orders of the partition
+            timeline_file = sidecar_path(self.partition_path(key), "timeline")
+            if os.path.exists(timeline_file):
+                os.remove(timeline_file)
+            self._touched.discard(key)
+        self._write_manifest(new_manifest, dictionaries)
+
+    def select(self, column, value):
+        """
+        Returns the orders whose column equals value. Only the partitions that can hold such orders are read, by
+        the index range of each partition for the index, and by the totals of the manifest for the columns of
+        SUMMARY_COLUMNS.
+        """
+        if column not in ORDER_COLUMNS:
+            raise ValueError(f"Column {column} not found")
+        frames = []
+        for key, partition in sorted(self.manifest().items()):
+            if column == "index" and not partition["min_index"] <= value <= partition["max_index"]:
+                continue
+            if column in SUMMARY_COLUMNS and value not in [total[0] for total in partition["totals"][column]]:
+                continue
+            orders = self._read_partition(key, codes=True)
+            if column in CATEGORY_COLUMNS:
+                # the codes are compared, only the selected orders are decoded
+                frames.append(orders[orders[column] == self.dictionaries()[column].index(value)])
+            else:
+                frames.append(orders[orders[column] == value])
+        if not frames:
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        return self._decode(pd.concat(frames, ignore_index=True))
+
+    def summary(self, by="fruit_variety"):
+        """
+        Returns the number of orders, weight and revenue of the whole history for each value of a column, summed
+        from the manifest without reading the partitions.
+        """
+        if by not in SUMMARY_COLUMNS:
+            raise ValueError(f"Column {by} not found")
+        totals = {}
+        for partition in self.manifest().values():
+            for value, orders, weight, cents in partition["totals"][by]:
+                total = totals.setdefault(value, [0, 0, 0])
+                total[0] += orders
+                total[1] += weight
+                total[2] += cents
+        items = sorted(totals.items())
+        return pd.DataFrame({by: [value for value, total in items],
+                             "orders": [total[0] for value, total in items],
+                             "weight": [total[1] for value, total in items],
+                             "revenue": [total[2] / 100 for value, total in items]})
+
+    def sync(self):
+        """
+        Flush the partitions written since the last sync, their timelines and the manifest to disk.
+        """
+        for key in self._touched:
+            sync_file(self.partition_path(key))
+            sync_file(sidecar_path(self.partition_path(key), "timeline"))
+        self._touched = set()
+        sync_file(self.file_path)
+
+
+def add_to_partition(partition, file_name, rows):
+    """
+    Returns the manifest entry of a partition after some orders are added to it.
+
+    Parameters:
+    - partition (dict): The manifest entry of the partition, None for a new partition.
+    - file_name (str): The name of the file of the partition.
+    - rows (list): The orders added, each order is a list of values in the order of ORDER_COLUMNS.
+
+    Returns:
+        dict: The new manifest entry.
+    """
+    if partition is None:
+        partition = {"file": file_name, "rows": 0, "min_index": None, "max_index": None,
+                     "totals": {column: [] for column in SUMMARY_COLUMNS}}
+    indexes = [int(row[0]) for row in rows]
+    entry = {"file": file_name, "rows": partition["rows"] + len(rows),
+             "min_index": min(indexes if partition["min_index"] is None else indexes + [partition["min_index"]]),
+             "max_index": max(indexes if partition["max_index"] is None else indexes + [partition["max_index"]]),
+             "totals": {}}
+    for position, column in enumerate(SUMMARY_COLUMNS, start=1):
+        totals = {value: [orders, weight, cents] for value, orders, weight, cents in partition["totals"][column]}
+        for row in rows:
+            total = totals.setdefault(to_number(row[position]) if position == 2 else str(row[position]), [0, 0, 0])
+            total[0] += 1
+            total[1] += to_number(row[4])
+            total[2] += int(round(float(row[6]) * 100))
+        entry["totals"][column] = [[value] + total for value, total in sorted(totals.items())]
+    return entry
+
+
+class PartitionedTimeline(Timeline):
+    """
+    Represents the timeline of a PartitionedOrderStore, stored in one file next to each partition. Only the
+    timelines of the loaded partitions are read, and each entry is written to the timeline of the partition of its
+    timestamp.
+
+    Attributes:
+    - file_path (str): The folder of the partitions.
+    """
+
+    def __init__(self, store):
+        """
+        Initializes an instance of PartitionedTimeline for the partitions of a store.
+        """
+        Timeline.__init__(self, store.directory)
+        self._store = store
+
+    def _partition_timeline(self, key):
+        """
+        Returns the timeline of a partition, e.g. orders_2026_timeline.csv.
+        """
+        return Timeline(sidecar_path(self._store.partition_path(key), "timeline"))
+
+    def _read_entries(self):
+        """
+        Returns the (seq, timestamp) entries of the loaded partitions.
+        """
+        entries = []
+        for key in self._store.loaded_keys():
+            entries.extend(self._partition_timeline(key)._read_entries())
+        return sorted(entries)
+
+    def _read_last_timestamp(self):
+        """
+        Returns the last timestamp of the latest partition, None if there is no partition.
+        """
+        manifest = self._store.manifest()
+        if not manifest:
+            return None
+        return self._partition_timeline(max(manifest))._read_last_timestamp()
+
+    def _write_entries(self, entries):
+        """
+        Write (seq, timestamp) entries to the end of the timelines of the partitions of their timestamps.
+        """
+        groups = {}
+        for seq, timestamp in entries:
+            groups.setdefault(self._store.partition_key(timestamp), []).append((seq, timestamp))
+        for key, group in groups.items():
+            self._partition_timeline(key)._write_entries(group)
@@ -0,0 +1,205 @@
+import bisect
+import csv
+import os
+from file_lock import file_lock, file_signature
+from management.ledger import ends_with_newline
+from production.fruit_info import Fruit, fruit_class_load
+
+"""
+This module contains the price index used by SalesManagement to price the orders. The unit prices are read from
+the fruit catalog, the file written by production.fruit_info, and looked up by (type_num, variety). The history of
+the prices is appended to a CSV file next to the orders, e.g. orders_prices.csv for orders.csv.
+"""
+
+# the fruit catalog of the package, production/fruits.csv
+FRUIT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "production", "fruits.csv")
+
+
+# the columns of the price history file
+HISTORY_COLUMNS = ["seq", "type_num", "variety", "price"]
+
+
+class PriceIndex:
+    """
+    Represents the unit prices of the fruit catalog, keyed by (type_num, variety).
+
+    The index is built once from the catalog. Before a lookup, it is reloaded if the catalog file was written, e.g.
+    by add_fruit or remove_fruit, and its fruits are checked again if set_price was called on any Fruit, e.g.
+    index.fruits[(1, "Ambrosia")].set_price(1.5). Each change is kept in the price history of the fruit, effective
+    from the seq number of the lookup that found it, usually the index of the order being priced. The prices loaded
+    with the catalog are effective from seq 0.
+
+    With a history file, each change is appended to the file as a (seq, type_num, variety, price) row, and the
+    history is read back from the file when the index is created, so the prices of past orders are kept. The
+    prices changed while no index was open are effective from the first lookup.
+
+    Attributes:
+    - fruit_file (str): The path of the fruit catalog.
+    - history_file (str): The path of the price history file, None if the history is kept in memory only.
+    - fruits (dict): The Fruit instances of the catalog, keyed by (type_num, variety).
+    - prices (dict): The current unit price of each fruit, keyed by (type_num, variety).
+    - history (dict): The (seq numbers, prices) lists of each fruit, sorted by seq number. A price of None means
+      the fruit was removed from the catalog.
+    """
+
+    def __init__(self, fruit_file=FRUIT_FILE, history_file=None):
+        """
+        Initializes an instance of PriceIndex, reads the price history and loads the prices of the catalog.
+
+        Parameters:
+        - fruit_file (str): The path of the fruit catalog, production/fruits.csv by default.
+        - history_file (str): The path of the price history file, e.g. price_history_path("orders.csv"). It is
+          created if it doesn't exist.
+        """
+        self.fruit_file = fruit_file
+        self.history_file = history_file
+        self.fruits = {}
+        self.prices = {}
+        self.history = {}
+        self._signature = None
+        self._price_changes = None
+        self._checked = False
+        self._replay()
+        # the prices of a new history are effective from seq 0, the changes since the last run from the next lookup
+        self._load(None if self.history else 0)
+
+    def _replay(self):
+        """
+        Read the price history from the history file, the last price of each fruit is its current price.
+        """
+        if self.history_file is None or not os.path.exists(self.history_file):
+            return
+        with open(self.history_file, newline="") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for row in reader:
+                if len(row) != 4:
+                    # a row cut by a crash during an append
+                    continue
+                key = (int(row[1]), row[2])
+                self._record(key, int(row[0]), float(row[3]) if row[3] else None)
+        self.prices = {key: values[-1] for key, (seqs, values) in self.history.items() if values[-1] is not None}
+
+    def _record(self, key, seq, price):
+        """
+        Add a price to the history of a fruit, a price at the same seq number replaces the previous one.
+
+        Returns:
+            bool: True if the history changed.
+        """
+        seqs, values = self.history.setdefault(key, ([], []))
+        if values and values[-1] == price:
+            return False
+        if seqs and seqs[-1] == seq:
+            values[-1] = price
+        else:
+            seqs.append(seq)
+            values.append(price)
+        return True
+
+    def _load(self, seq):
+        """
+        Load the fruits of the catalog and record the prices that changed, effective from seq. If seq is None, the
+        prices are checked by the next refresh.
+        """
+        self._signature = file_signature(self.fruit_file)
+        fruit_list = fruit_class_load(self.fruit_file) if self._signature is not None else []
+        self.fruits = {(fruit.get_type_num(), fruit.variety): fruit for fruit in fruit_list or [] if fruit is not None}
+        self._price_changes = Fruit.price_changes
+        if seq is not None:
+            self._update(seq)
+
+    def _update(self, seq):
+        """
+        Record the prices of the fruits that changed since the last update, effective from seq, and append them to
+        the history file.
+        """
+        prices = {key: fruit.get_price() for key, fruit in self.fruits.items()}
+        changes = []
+        for key in set(prices) | set(self.prices):
+            price = prices.get(key)
+            if key in self.prices and self.prices[key] == price:
+                continue
+            if self._record(key, seq, price):
+                changes.append([seq, key[0], key[1], price])
+        self.prices = prices
+        self._checked = True
+        if changes and self.history_file is not None:
+            self._append(sorted(changes, key=lambda change: (change[1], change[2])))
+
+    def _append(self, changes):
+        """
+        Append price changes to the history file.
+        """
+        try:
+            with file_lock(self.history_file):
+                new_file = not os.path.exists(self.history_file) or os.path.getsize(self.history_file) == 0
+                # a row cut by a crash is ended, and skipped when the history is read
+                separator = not new_file and not ends_with_newline(self.history_file)
+                with open(self.history_file, "a", newline="") as file:
+                    if separator:
+                        file.write("\n")
+                    writer = csv.writer(file, lineterminator="\n")
+                    if new_file:
+                        writer.writerow(HISTORY_COLUMNS)
+                    writer.writerows(changes)
+        except OSError:
+            print("Fail to save data")
+
+    def refresh(self, seq):
+        """
+        Reload the catalog if its file was written, or check the prices of the fruits if set_price was called.
+
+        Parameters:
+        - seq (int): The seq number from which the changed prices are effective.
+        """
+        if file_signature(self.fruit_file) != self._signature:
+            self._load(seq)
+        elif Fruit.price_changes != self._price_changes or not self._checked:
+            self._price_changes = Fruit.price_changes
+            self._update(seq)
+
+    def price(self, type_num, variety, seq):
+        """
+        Returns the current unit price of a fruit.
+
+        Parameters:
+        - type_num (int): The type number of the fruit, e.g. 1 for apples.
+        - variety (str): The variety of the fruit, e.g. "Ambrosia".
+        - seq (int): The seq number of the lookup, e.g. the index of the order, from which a changed price is
+          effective.
+
+        Returns:
+            float: The unit price, None if the fruit is not in the catalog.
+        """
+        self.refresh(seq)
+        return self.prices.get((type_num, variety))
+
+    def price_at(self, type_num, variety, seq):
+        """
+        Returns the unit price of a fruit effective at a seq number, found by binary search in its price history.
+        None if the fruit had no price at seq.
+        """
+        seqs, values = self.history.get((type_num, variety), ([], []))
+        position = bisect.bisect_right(seqs, seq)
+        if position == 0:
+            return None
+        return values[position - 1]
+
+    def reprice(self, orders):
+        """
+        Returns the unit price effective at the index of each order, e.g. to audit the unit_price column.
+
+        Parameters:
+        - orders (pd.DataFrame): Orders with the index, fruit_type and fruit_variety columns.
+
+        Returns:
+            list: The unit price of each order, None for a fruit that had no price.
+        """
+        return [self.price_at(type_num, variety, seq)
+                for seq, type_num, variety in zip(orders["index"], orders["fruit_type"], orders["fruit_variety"])]
+
+
+def price_history_path(order_file):
+    """Returns the path of the price history file of an order file, e.g. orders_prices.csv for orders.csv."""
+    return f"{os.path.splitext(order_file)[0]}_prices.csv"
@@ -0,0 +1,198 @@
+import bisect
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+"""
+This module contains the time index of the sales orders used by SalesManagement for revenue queries over a time
+range, and the daily, weekly and season revenue buckets.
+"""
+
+# the variables an order is indexed by, as in REVENUE_VARIABLES of management.sales
+INDEX_VARIABLES = ["sales_type", "fruit_type", "fruit_variety"]
+
+
+def day_bucket(timestamp):
+    """Returns the day of a timestamp."""
+    return timestamp.date()
+
+
+def week_bucket(timestamp):
+    """Returns the Monday of the week of a timestamp."""
+    return timestamp.date() - timedelta(days=timestamp.weekday())
+
+
+def season_bucket(timestamp):
+    """Returns the season of a timestamp, the orchard has one season a year."""
+    return timestamp.year
+
+
+PERIODS = {"day": day_bucket, "week": week_bucket, "season": season_bucket}
+
+
+class RevenueIndex:
+    """
+    Represents the revenue of the orders sorted by time. For the total and for each value of each variable, e.g.
+    fruit_type 2, the index keeps the timestamps of the orders and the prefix sums of their revenue in cents, so
+    the revenue of a time range is found with two binary searches. The revenue of each day, week and season is
+    added to its bucket when an order is added.
+
+    Orders are expected in time order, as recorded by the timeline of the order store. An order older than the
+    last one is still added to the buckets, and inserted in the sorted lists.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty instance of RevenueIndex.
+        """
+        # (timestamps, prefix sums) keyed by (variable, value), (None, None) for all orders
+        self._series = {}
+        # the revenue in cents of each (bucket, value) of each variable, for each period
+        self._buckets = {period: {variable: {} for variable in [None] + INDEX_VARIABLES} for period in PERIODS}
+
+    def __len__(self):
+        """
+        Returns the number of orders in the index.
+        """
+        series = self._series.get((None, None))
+        return 0 if series is None else len(series[0])
+
+    @classmethod
+    def build(cls, orders, timestamps):
+        """
+        Build the index of the orders that have a timestamp.
+
+        Parameters:
+        - orders (pd.DataFrame): The orders, with the columns of ORDER_COLUMNS.
+        - timestamps (dict): The timestamp of each order, keyed by order index.
+
+        Returns:
+            RevenueIndex: The index of the orders.
+        """
+        index = cls()
+        if orders.empty or not timestamps:
+            return index
+        frame = orders[["index"] + INDEX_VARIABLES + ["revenue"]].copy()
+        frame["timestamp"] = pd.Series([timestamps.get(seq) for seq in frame["index"]], index=frame.index,
+                                       dtype=object)
+        frame = frame[frame["timestamp"].notna()]
+        if frame.empty:
+            return index
+        frame = frame.sort_values("timestamp", kind="stable")
+        frame["cents"] = (pd.to_numeric(frame["revenue"]) * 100).round().astype("int64")
+
+        # the series and buckets are built column-wise, as add() would build them one order at a time
+        index._series[(None, None)] = index._prefix_series(frame)
+        for variable in INDEX_VARIABLES:
+            for value, group in frame.groupby(variable, sort=False):
+                index._series[(variable, value)] = index._prefix_series(group)
+        # every period is made of whole days, so the orders are grouped by day and only the days are put in buckets
+        days = pd.to_datetime(frame["timestamp"]).dt.normalize()
+        for variable in [None] + INDEX_VARIABLES:
+            if variable is None:
+                sums = frame["cents"].groupby(days).sum()
+                keys = [(day, None) for day in sums.index]
+            else:
+                sums = frame["cents"].groupby([days, frame[variable]]).sum()
+                keys = list(sums.index)
+            for (day, value), cents in zip(keys, sums.tolist()):
+                day = day.to_pydatetime()
+                for period, bucket_of in PERIODS.items():
+                    totals = index._buckets[period][variable]
+                    bucket = bucket_of(day)
+                    totals[(bucket, value)] = totals.get((bucket, value), 0) + cents
+        return index
+
+    @staticmethod
+    def _prefix_series(frame):
+        """
+        Returns the (timestamps, prefix sums) lists of some orders sorted by time.
+        """
+        return list(frame["timestamp"]), [0] + np.cumsum(frame["cents"].to_numpy()).tolist()
+
+    def add(self, timestamp, values, revenue):
+        """
+        Add an order to the index.
+
+        Parameters:
+        - timestamp (datetime): The time the order was recorded.
+        - values (list): The sales_type, fruit_type and fruit_variety of the order.
+        - revenue (float): The revenue of the order.
+        """
+        cents = int(round(revenue * 100))
+        keys = [(None, None)] + list(zip(INDEX_VARIABLES, values))
+        for key in keys:
+            timestamps, prefix = self._series.setdefault(key, ([], [0]))
+            if not timestamps or timestamps[-1] <= timestamp:
+                timestamps.append(timestamp)
+                prefix.append(prefix[-1] + cents)
+            else:
+                # an order older than the last one, the prefix sums after it are shifted
+                position = bisect.bisect_right(timestamps, timestamp)
+                timestamps.insert(position, timestamp)
+                prefix.insert(position + 1, prefix[position] + cents)
+                for i in range(position + 2, len(prefix)):
+                    prefix[i] += cents
+        for period, bucket_of in PERIODS.items():
+            bucket = bucket_of(timestamp)
+            for variable, value in keys:
+                totals = self._buckets[period][variable]
+                totals[(bucket, value)] = totals.get((bucket, value), 0) + cents
+
+    def _range_cents(self, key, start, end):
+        """
+        Returns the revenue in cents of a series between start, included, and end, excluded.
+        """
+        timestamps, prefix = self._series.get(key, ([], [0]))
+        first = 0 if start is None else bisect.bisect_left(timestamps, start)
+        last = len(timestamps) if end is None else bisect.bisect_left(timestamps, end)
+        return prefix[last] - prefix[first] if last > first else 0
+
+    def between(self, start, end, by=None):
+        """
+        Returns the revenue of the orders recorded between start, included, and end, excluded.
+
+        Parameters:
+        - start (datetime): The start of the range, None for the first order.
+        - end (datetime): The end of the range, None for after the last order.
+        - by (str): A variable of INDEX_VARIABLES, None for the total revenue.
+
+        Returns:
+            float or dict: The total revenue, or the revenue of each value of the variable sorted by value, only
+            the values with orders in the range.
+        """
+        if by is None:
+            return self._range_cents((None, None), start, end) / 100
+        if by not in INDEX_VARIABLES:
+            raise ValueError(f"Variable {by} not found")
+        totals = {}
+        for variable, value in sorted((key for key in self._series if key[0] == by), key=lambda key: key[1]):
+            timestamps = self._series[(variable, value)][0]
+            first = 0 if start is None else bisect.bisect_left(timestamps, start)
+            last = len(timestamps) if end is None else bisect.bisect_left(timestamps, end)
+            if last > first:
+                totals[value] = self._range_cents((variable, value), start, end) / 100
+        return totals
+
+    def rollup(self, period, by=None):
+        """
+        Returns the revenue of each bucket of a period, from the buckets updated when the orders are added.
+
+        Parameters:
+        - period (str): "day", "week" (buckets named by their Monday) or "season" (buckets named by their year).
+        - by (str): A variable of INDEX_VARIABLES, None for the total revenue of each bucket.
+
+        Returns:
+            pd.DataFrame: The columns period, by if given, and revenue, sorted by bucket and value.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Period {period} not found, please choose from: {', '.join(PERIODS)}")
+        if by is not None and by not in INDEX_VARIABLES:
+            raise ValueError(f"Variable {by} not found")
+        items = sorted(self._buckets[period][by].items())
+        if by is None:
+            return pd.DataFrame({period: [bucket for (bucket, value), cents in items],
+                                 "revenue": [cents / 100 for key, cents in items]})
+        return pd.DataFrame({period: [bucket for (bucket, value), cents in items],
+                             by: [value for (bucket, value), cents in items],
+                             "revenue": [cents / 100 for key, cents in items]})
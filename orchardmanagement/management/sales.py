@@ -2,7 +2,23 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import csv
 import os
+from datetime import datetime
+from file_lock import file_signature
+from management.cube import PLANTATION_FILE, RevenueCube, load_regions
+from management.idempotency import IdempotencyIndex, key_file_path
 from management.inventory import InventoryManagement
+from management.ledger import VARIETY_INDEX, to_number
+from management.order_store import CsvOrderStore, OrderStore, append_orders, compact_orders
+from management.pricing import FRUIT_FILE, PriceIndex, price_history_path
+from management.revenue import RevenueIndex
+
+# the fruit type number of each variety, 1 for apples, 2 for cherries and 3 for peaches
+FRUIT_TYPE_NUMS = {"Ambrosia": 1, "Gala": 1, "Honeycrisp": 1, "Lapins": 2, "Sweetheart": 2, "Skeena": 2,
+                   "Redhaven": 3, "Elberta": 3, "Cresthaven": 3}
+# the columns of the orders passed to add_orders
+ORDER_INPUT_COLUMNS = ["sales_type", "fruit_variety", "weight"]
+# the variables with running revenue totals
+REVENUE_VARIABLES = ["sales_type", "fruit_type", "fruit_variety"]
 
 
 class SalesManagement:
@@ -12,35 +28,122 @@ class SalesManagement:
     Attributes:
     - inventory_manager (InventoryManagement): An instance of the InventoryManagement class.
     - fruit_file (str): The path to the file containing fruit information.
+    - price_index (PriceIndex): The unit prices of the fruits, read from the fruit file.
     - order_file (str): The path to the file containing sales orders.
-    - orders (pd.DataFrame): DataFrame to store sales order data.
+    - order_store (OrderStore): The storage of the sales orders.
+    - order_keys (IdempotencyIndex): The idempotency keys of the recent orders added by add_order.
+    - orders (pd.DataFrame): DataFrame to store sales order data, with sales_type and fruit_variety as categoricals
+      and narrow integer dtypes.
     """
 
-    def __init__(self, inventory_manager, order_file):
+    def __init__(self, inventory_manager, order_file, fruit_file=FRUIT_FILE, key_window=10000):
         """
         Initialize a SalesManagement instance.
+
+        Parameters:
+        - inventory_manager (InventoryManagement): The inventory manager used to check and remove inventory.
+        - order_file (str or OrderStore): The file path for the sales orders, stored as a CsvOrderStore.
+          An OrderStore instance such as SqliteOrderStore or PartitionedOrderStore can be passed instead to choose
+          another storage. The orders loaded by a PartitionedOrderStore are only those of its loaded partitions.
+        - fruit_file (str or PriceIndex): The file path for the fruit information, production/fruits.csv by default,
+          which gives the unit price of each fruit. The history of the prices is stored next to the orders, e.g. in
+          orders_prices.csv for orders.csv. A PriceIndex can be passed instead to share it.
+        - key_window (int): The number of recent idempotency keys kept, stored next to the orders, e.g. in
+          orders_keys.csv for orders.csv.
         """
         self.inventory_manager = inventory_manager
-        self.order_file = order_file
+        if isinstance(order_file, OrderStore):
+            self.order_store = order_file
+        else:
+            self.order_store = CsvOrderStore(order_file)
+        self.order_file = self.order_store.file_path
+        if isinstance(fruit_file, PriceIndex):
+            self.price_index = fruit_file
+        else:
+            self.price_index = PriceIndex(fruit_file, price_history_path(self.order_file))
+        self.fruit_file = self.price_index.fruit_file
+        self.order_keys = IdempotencyIndex(key_file_path(self.order_file), key_window)
+        # the orders and their keys are written with the inventory ledgers, and recovered from their journal
+        self.inventory_manager.attach(self.order_store)
+        self.inventory_manager.attach(self.order_keys)
         self.orders = self.load_data()
 
+    @property
+    def orders(self):
+        """The sales orders as a DataFrame."""
+        if self._order_tail:
+            self._orders = append_orders(self._orders, self._order_tail)
+            self._order_tail = []
+        return self._orders
+
+    @orders.setter
+    def orders(self, frame):
+        # the strings are kept as categorical codes and the fruit type in the narrowest dtype, see compact_orders
+        frame = compact_orders(frame)
+        self._orders = frame
+        # orders added since the DataFrame was built, merged into it when it is asked for
+        self._order_tail = []
+        # the orders of other partitions are not loaded, but their indexes are not reused
+        last_indexes = [index for index in [None if frame.empty else int(frame["index"].max()),
+                                            self.order_store.last_index()] if index is not None]
+        self._last_index = max(last_indexes) if last_indexes else None
+        # the running revenue totals in cents for each value of each variable, rebuilt only when the orders are
+        # replaced or reloaded
+        self._revenue = {variable: {} for variable in REVENUE_VARIABLES}
+        self._add_revenue(frame)
+        # the revenue of the orders sorted by the time they were recorded
+        self._time_index = RevenueIndex.build(frame, self.order_store.timeline.entries())
+        # the revenue cube, built by the first revenue_cube() call after the orders are replaced or reloaded
+        self._cube = None
+        self._cube_source = None
+
+    def _add_revenue(self, frame):
+        """
+        Add the revenue of some orders to the running totals, one groupby for each variable.
+        """
+        if frame.empty:
+            return
+        cents = (pd.to_numeric(frame["revenue"]) * 100).round().astype("int64")
+        for variable in REVENUE_VARIABLES:
+            totals = self._revenue[variable]
+            for value, total in cents.groupby(frame[variable]).sum().items():
+                totals[value] = totals.get(value, 0) + int(total)
+
+    def _add_revenue_row(self, row):
+        """
+        Add the revenue of one order, a list of values in the order of ORDER_COLUMNS, to the running totals.
+        """
+        cents = int(round(row[6] * 100))
+        for variable, value in zip(REVENUE_VARIABLES, [row[1], row[2], row[3]]):
+            totals = self._revenue[variable]
+            totals[value] = totals.get(value, 0) + cents
+
+    def revenue_totals(self, variable):
+        """
+        Returns the total revenue for each value of a variable, from the running totals.
+
+        Parameters:
+        - variable (str): One of REVENUE_VARIABLES, e.g. "fruit_type".
+
+        Returns:
+            dict: The total revenue of each value, e.g. {1: 60.0, 2: 119.6, 3: 60.0}, sorted by value.
+        """
+        if variable not in REVENUE_VARIABLES:
+            raise ValueError(f"Variable {variable} not found")
+        self.refresh()
+        return {value: cents / 100 for value, cents in sorted(self._revenue[variable].items())}
+
     def load_data(self):
         """
-        Load sales order data from a CSV file.
+        Load sales order data from the order store, and the time of each order from its timeline.
 
         Returns:
         - pd.DataFrame: DataFrame containing sales order data.
         """
-        columns = ["index", "sales_type", "fruit_type", "fruit_variety", "weight", "unit_price", "revenue"]
-        try:
-            orders_data = pd.read_csv(self.order_file)
-        except FileNotFoundError:
-            # If the file doesn't exist, return an initial empty DataFrame
-            orders_data = pd.DataFrame(columns=columns)
-            orders_data.to_csv(self.order_file, index=True)
-        return orders_data
+        self.order_store.reload_timeline()
+        return self.order_store.load()
 
-    def add_order(self, sales_type, fruit_variety, weight):
+    def add_order(self, sales_type, fruit_variety, weight, idempotency_key=None):
         """
         Add a new sales order.
 
@@ -48,68 +151,295 @@ class SalesManagement:
         - sales_type (str): The type of sales operation ('selling' or 'picking').
         - fruit_variety (str): The variety of fruit for the order.
         - weight (float): The weight of the fruit in the order.
+        - idempotency_key (str): A key chosen by the client for the order, e.g. a UUID. If an order with the same
+          key was added among the recent key_window orders, nothing is written again. Use find_order_by_key to get
+          the order added with a key.
+
+        Returns:
+            bool: True if the order is added, or was already added with the same key, False if it cannot be added,
+            e.g. when there is not enough inventory for a selling order.
+        """
+        with self.order_store.lock, self.inventory_manager.batch():
+            self.refresh()
+            if idempotency_key is None:
+                return self._add_order(sales_type, fruit_variety, weight)
+            if self.order_keys.get(idempotency_key) is not None:
+                print("Order already added")
+                return True
+            added = self._add_order(sales_type, fruit_variety, weight)
+            if added is True:
+                # the key is written with the order, in the same flush
+                self.inventory_manager.stage(self.order_keys, [[self._last_index, idempotency_key]])
+            return added
+
+    def find_order_by_key(self, idempotency_key):
         """
-        if fruit_variety not in self.inventory_manager.inventory.columns:
+        Find the order added with an idempotency key, e.g. to answer a client retrying an order.
+
+        Returns:
+            pd.Series: The order, None if no order was added with the key among the recent key_window orders.
+        """
+        with self.order_store.lock:
+            self.refresh()
+            index = self.order_keys.get(idempotency_key)
+        return None if index is None else self.find_order(index)
+
+    def find_order(self, index):
+        """
+        Find an order by its index, by binary search in the loaded orders, or in the order store if the order is
+        not loaded, e.g. in a past season of a PartitionedOrderStore.
+
+        Returns:
+            pd.Series: The order, None if there is no order with the index.
+        """
+        indexes = self.orders["index"]
+        position = indexes.searchsorted(index)
+        if position < len(indexes) and indexes.iloc[position] == index:
+            return self.orders.iloc[position]
+        orders = self.order_store.select("index", index)
+        return None if orders.empty else orders.iloc[0]
+
+    def refresh(self):
+        """
+        Reload the orders if another process has written them since they were last loaded or written.
+        """
+        if self.order_store.changed():
+            self.orders = self.load_data()
+
+    def _add_order(self, sales_type, fruit_variety, weight):
+        """
+        Add a new sales order, called by add_order while the lock of the order file is held, in a batch of the
+        inventory manager so the order and its inventory rows are written in one flush.
+        """
+        if fruit_variety not in VARIETY_INDEX:
             print(f"Fruit '{fruit_variety}' not found.")
             return
         else:
-            # file setting
-            if sales_type == "selling":
-                if not self.inventory_manager.remove_inventory(fruit_variety, weight):
-                    print("Order cannot be added.")
-                else:
-                    self.inventory_manager.remove_inventory(fruit_variety, weight)
-                    print("Order added")
-            elif sales_type == "picking":
-                self.inventory_manager.remove_remaining_productivity(fruit_variety, weight)
-                print("Order added")
-            else:
+            if sales_type not in ["selling", "picking"]:
                 print("sales_type not found, please choose from selling and picking")
                 return False
             # index setting
-            if self.orders.empty:
+            if self._last_index is None:
                 new_index = 1
             else:
-                new_index = self.orders["index"].max() + 1
-            # fruit variety setting
-            if fruit_variety in ["Ambrosia", "Gala", "Honeycrisp"]:
-                fruit_type_num = 1
-            elif fruit_variety in ["Lapins", "Sweetheart", "Skeena"]:
-                fruit_type_num = 2
-            elif fruit_variety in ["Redhaven", "Elberta", "Cresthaven"]:
-                fruit_type_num = 3
+                new_index = self._last_index + 1
+            # fruit variety setting, the price is looked up in the fruit catalog
+            fruit_type_num = FRUIT_TYPE_NUMS[fruit_variety]
+            unit_price = self.price_index.price(fruit_type_num, fruit_variety, new_index)
+            if unit_price is None:
+                raise ValueError("There is no instance of this fruit")
+
+            # file setting, the inventory is checked and removed in one step
+            if sales_type == "selling":
+                if not self.inventory_manager.try_reserve(fruit_variety, weight, "selling"):
+                    print("Order cannot be added.")
+                    return False
+                print("Order added")
             else:
-                print("Variety not found")
-                return False
+                self.inventory_manager.remove_remaining_productivity(fruit_variety, weight)
+                print("Order added")
+
+            row = [new_index, sales_type, fruit_type_num, fruit_variety, weight, unit_price,
+                   round(weight * unit_price, 2)]
+            self._order_tail.append(row)
+            self._last_index = new_index
+            self._add_revenue_row(row)
+            # the new order is written with the inventory rows when the batch exits
+            timestamp = self.inventory_manager.stage(self.order_store, [row])[0]
+            self._time_index.add(timestamp, row[1:4], row[6])
+            if self._cube is not None:
+                self._cube.add(timestamp, *row[1:4], row[6])
+            return True
+
+    def add_orders(self, orders):
+        """
+        Add many sales orders at once, e.g. the orders of a day imported from the farm stand. The orders are
+        validated column-wise, the inventory and remaining productivity of each variety are changed once for all
+        the orders, and all new orders are written in one write.
 
-            if fruit_variety == "Ambrosia":
-                unit_price = 1.20
-            elif fruit_variety == "Elberta":
-                unit_price = 1.20
-            elif fruit_variety == "Lapins":
-                unit_price = 2.99
+        Selling orders of a variety are accepted in order against the inventory left by the orders accepted before
+        them, so an order larger than what is left is rejected, and a smaller order after it can still be accepted.
+        Picking orders are rejected while the capacity is not estimated. If the inventory is changed by another
+        process in between, all the orders are rejected.
+
+        Parameters:
+        - orders (pd.DataFrame or iterable): The orders, a DataFrame with the columns sales_type, fruit_variety and
+          weight, or an iterable of (sales_type, fruit_variety, weight) tuples or of dicts with these keys.
+
+        Returns:
+            pd.DataFrame: The reject report, one row for each rejected order with its sales_type, fruit_variety,
+            weight and the reason it was rejected, indexed by the position of the order in the input. Empty if
+            every order is added.
+        """
+        if isinstance(orders, pd.DataFrame):
+            frame = orders.reset_index(drop=True)
+        else:
+            rows = list(orders)
+            if rows and isinstance(rows[0], dict):
+                frame = pd.DataFrame(rows)
             else:
-                raise ValueError("There is no instance of this fruit")
+                frame = pd.DataFrame(rows, columns=ORDER_INPUT_COLUMNS)
+        missing = [column for column in ORDER_INPUT_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Columns {missing} not found")
+        frame = frame[ORDER_INPUT_COLUMNS]
+        weight = pd.to_numeric(frame["weight"], errors="coerce")
+
+        # the first failing check gives the reason of a rejected order
+        reason = pd.Series(None, index=frame.index, dtype=object)
+        checks = [(~frame["fruit_variety"].isin(list(VARIETY_INDEX)), "unknown variety"),
+                  (~frame["sales_type"].isin(["selling", "picking"]), "unknown sales type"),
+                  (~(weight > 0), "invalid weight")]
+        for failed, message in checks:
+            reason = reason.mask(failed & reason.isna(), message)
+
+        with self.order_store.lock, self.inventory_manager.batch():
+            self.refresh()
+            first_index = 1 if self._last_index is None else self._last_index + 1
+            # the prices of the catalog, changed prices are effective from the first new order
+            self.price_index.refresh(first_index)
+            unit_prices = {variety: self.price_index.prices[(type_num, variety)]
+                           for variety, type_num in FRUIT_TYPE_NUMS.items()
+                           if (type_num, variety) in self.price_index.prices}
+            reason = reason.mask(~frame["fruit_variety"].isin(list(unit_prices)) & reason.isna(), "no price")
+            if not self.inventory_manager.capacity_estimated():
+                # there is no remaining productivity to remove the picked weight from
+                reason = reason.mask((frame["sales_type"] == "picking") & reason.isna(), "capacity not estimated")
+            selling = reason.isna() & (frame["sales_type"] == "selling")
+            # 0 for every variety if the inventory is empty
+            available = {variety: self.inventory_manager.available(variety) for variety in VARIETY_INDEX}
+            short = []
+            for position, name, number in zip(frame.index[selling], frame["fruit_variety"][selling],
+                                              weight[selling]):
+                if number > available[name]:
+                    short.append(position)
+                else:
+                    available[name] -= number
+            reason[short] = "not enough inventory"
+
+            accepted = reason.isna()
+            sales_type = frame["sales_type"][accepted]
+            variety = frame["fruit_variety"][accepted]
+            totals = weight[accepted].groupby([sales_type, variety]).sum()
+            inventory = {name: to_number(number) for (kind, name), number in totals.items() if kind == "selling"}
+            remaining = {name: to_number(number) for (kind, name), number in totals.items() if kind == "picking"}
+            if not self.inventory_manager.remove_many(inventory, remaining, "add_orders"):
+                # the inventory was changed by another process since it was read, no order is written
+                reason = reason.mask(accepted, "not enough inventory")
+                accepted = reason.isna()
+                sales_type = frame["sales_type"][accepted]
+                variety = frame["fruit_variety"][accepted]
 
-            new_order = pd.DataFrame(columns=self.orders.columns)
-            new_order = pd.DataFrame({
-                "index": [new_index],
-                "sales_type": [sales_type],
-                "fruit_type": [fruit_type_num],
-                "fruit_variety": [fruit_variety],
-                "weight": [weight],
-                "unit_price": [unit_price],
-                "revenue": [round(weight * unit_price, 2)]
+            accepted_weight = weight[accepted]
+            if (accepted_weight % 1 == 0).all():
+                # whole weights are written as integers, as add_order writes them
+                accepted_weight = accepted_weight.astype("int64")
+            unit_price = variety.map(unit_prices)
+            new_orders = pd.DataFrame({
+                "index": range(first_index, first_index + len(variety)),
+                "sales_type": sales_type,
+                "fruit_type": variety.map(FRUIT_TYPE_NUMS),
+                "fruit_variety": variety,
+                "weight": accepted_weight,
+                "unit_price": unit_price,
+                "revenue": (accepted_weight * unit_price).round(2),
             })
+            rows = new_orders.values.tolist()
+            if rows:
+                self._order_tail.extend(rows)
+                self._last_index = rows[-1][0]
+                self._add_revenue(new_orders)
+                timestamps = self.inventory_manager.stage(self.order_store, rows)
+                for timestamp, row in zip(timestamps, rows):
+                    self._time_index.add(timestamp, row[1:4], row[6])
+                    if self._cube is not None:
+                        self._cube.add(timestamp, *row[1:4], row[6])
 
-            self.orders = pd.concat([self.orders, new_order], ignore_index=True)
-            self.orders.to_csv(self.order_file, index=False)
-            return True
+        rejects = frame[~accepted].copy()
+        rejects["reason"] = reason[~accepted]
+        return rejects
+
+    def revenue_between(self, start=None, end=None, by=None):
+        """
+        Get the revenue of the orders recorded in a time range, e.g. the orders of this morning. Orders recorded
+        before the orders had timestamps are not counted.
+
+        Parameters:
+        - start (datetime or str): The start of the range, included, as a datetime or an ISO format string such as
+          "2026-10-17 08:00". None for the first order.
+        - end (datetime or str): The end of the range, excluded. None for after the last order.
+        - by (str): None for the total revenue, or the variable to group the revenue by, one of REVENUE_VARIABLES.
+
+        Returns:
+            float or pd.DataFrame: The total revenue, or a DataFrame with the columns by and revenue.
+        """
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        if isinstance(end, str):
+            end = datetime.fromisoformat(end)
+        self.refresh()
+        totals = self._time_index.between(start, end, by)
+        if by is None:
+            return totals
+        return pd.DataFrame({by: list(totals), 'revenue': list(totals.values())})
+
+    def revenue_rollup(self, period="day", by=None):
+        """
+        Get the revenue of each day, week or season, from buckets updated when the orders are added.
+
+        Parameters:
+        - period (str): "day", "week" or "season".
+        - by (str): None for the total revenue of each bucket, or the variable to group the revenue by, one of
+          REVENUE_VARIABLES.
+
+        Returns:
+            pd.DataFrame: The columns period, by if given, and revenue.
+        """
+        self.refresh()
+        return self._time_index.rollup(period, by)
+
+    def revenue_cube(self, plantation_file=PLANTATION_FILE):
+        """
+        Get the revenue cube of the orders by fruit variety, sales type, week and region, e.g.
+        sales_manager.revenue_cube().rollup("fruit_type", "week"). The cube is built once from the orders and their
+        timeline, and updated as orders are added. It is built again when the orders are reloaded, or when the
+        regions of the plantation file change.
+
+        Parameters:
+        - plantation_file (str): The file of the regions the revenue is shared between, production/plantations.csv
+          by default.
+
+        Returns:
+            RevenueCube: The cube, updated by the orders added later.
+        """
+        self.refresh()
+        source = (os.path.abspath(plantation_file), file_signature(plantation_file))
+        if self._cube is None or self._cube_source != source:
+            self._cube = RevenueCube.build(self.orders, self.order_store.timeline.entries(),
+                                           load_regions(plantation_file))
+            self._cube_source = source
+        return self._cube
+
+    def revenue_history(self, by="fruit_variety"):
+        """
+        Get the number of orders, weight and revenue of the whole order history, including the orders not loaded,
+        e.g. the past seasons of a PartitionedOrderStore.
+
+        Parameters:
+        - by (str): The variable to group the orders by, one of REVENUE_VARIABLES.
+
+        Returns:
+            pd.DataFrame: The columns by, orders, weight and revenue.
+        """
+        with self.order_store.lock:
+            self.inventory_manager.flush()
+            return self.order_store.summary(by)
 
     def order_display(self):
         """
         Display the sales order data.
         """
+        self.refresh()
         print(self.orders)
         return len(self.orders)
 
@@ -120,6 +450,17 @@ class SalesManagement:
         Parameters:
         - variable (str): The variable for grouping revenue data.
         """
+        self.refresh()
+        if variable in REVENUE_VARIABLES:
+            # the running totals, without reading the orders
+            totals = self.revenue_totals(variable)
+            if not totals:
+                print("No data available.")
+                return
+            revenue_by_variable = pd.DataFrame({variable: list(totals), 'revenue': list(totals.values())})
+            print(revenue_by_variable)
+            return revenue_by_variable
+
         if variable not in self.orders.columns:
             print(f"Variable {variable} not found. Please choose from: sales_type or fruit_type.")
             return
@@ -136,7 +477,8 @@ class SalesManagement:
         """
         Plot a pie chart of revenue distribution by fruit type.
         """
-        if self.orders.empty:
+        totals = self.revenue_totals("fruit_type")
+        if not totals:
             print("No data available for plotting.")
             return
 
@@ -146,11 +488,8 @@ class SalesManagement:
             3: 'Peach'
         }
 
-        self.orders['fruit_type_label'] = self.orders['fruit_type'].map(fruit_type_mapping)
-        revenue_by_fruit_type = self.orders.groupby('fruit_type_label')['revenue'].sum().reset_index()
-
         plt.figure(figsize=(8, 8))
-        plt.pie(revenue_by_fruit_type['revenue'], labels=revenue_by_fruit_type['fruit_type_label'],
+        plt.pie(list(totals.values()), labels=[fruit_type_mapping.get(value, value) for value in totals],
                 autopct='%1.1f%%', startangle=140)
         plt.title('Revenue Distribution by Fruit Type')
         plt.show()
@@ -163,10 +502,9 @@ class SalesManagement:
         - fruit_variety (str): The variety of fruit for the inventory check.
         - weight (float): The weight of the fruit to be sold.
         """
-        current_inventory = self.inventory_manager.inventory.iloc[[-1]].copy()
+        inventory_weight = self.inventory_manager.available(fruit_variety)
 
-        if fruit_variety in current_inventory.columns:
-            inventory_weight = current_inventory[fruit_variety].iloc[0]
+        if inventory_weight is not None:
             print(inventory_weight)
             if inventory_weight >= weight:
                 print(f"Inventory of {fruit_variety} is enough for this order.")
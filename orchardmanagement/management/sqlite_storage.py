@@ -0,0 +1,305 @@
+import sqlite3
+import pandas as pd
+from datetime import datetime
+from management.ledger import COLUMNS, Ledger, Timeline
+from management.order_store import ORDER_COLUMNS, SUMMARY_COLUMNS, OrderStore
+
+"""
+This module contains the SQLite storage of the inventory ledgers and sales orders. All tables can be stored in
+one database file, e.g. SqliteLedger("orchard.db", "inventory") and SqliteOrderStore("orchard.db").
+
+The database is opened in WAL mode, so readers are not blocked while an operation is written. New rows are
+inserted with parameterized statements, which sqlite3 keeps prepared in its statement cache, and queries by
+index, fruit variety, fruit type or sales type use the indexes of the tables.
+"""
+
+
+def connect(db_path):
+    """
+    Open a connection to a SQLite database in WAL mode.
+
+    Parameters:
+    - db_path (str): The path of the database file, it is created if it doesn't exist.
+
+    Returns:
+        sqlite3.Connection: The connection to the database.
+    """
+    # the rows of an InventoryManagement are written by its writer thread, under the lock of its ledgers
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode the database stays consistent after a crash with NORMAL, only the last commits may be lost
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def quote(name):
+    """Returns a column or table name quoted for SQL, e.g. "index"."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def plain_values(row):
+    """Convert the numpy numbers of a row to Python numbers, which sqlite3 can store."""
+    return [value.item() if hasattr(value, "item") else value for value in row]
+
+
+class SqliteLedger(Ledger):
+    """
+    Represents a ledger stored in a SQLite table with one row for each operation, the index column is the
+    primary key of the table.
+
+    Attributes:
+    - table (str): The name of the table, e.g. "inventory".
+    - connection (sqlite3.Connection): The connection to the database.
+    """
+
+    def __init__(self, db_path, table, connection=None):
+        """
+        Initializes an instance of SqliteLedger, creating the table if it doesn't exist. Only the last row is
+        read, the full history is loaded the first time the frame attribute is used.
+
+        Parameters:
+        - db_path (str): The path of the database file.
+        - table (str): The name of the table.
+        - connection (sqlite3.Connection): An open connection to the database, a new one is opened if None.
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table}")
+        Ledger.__init__(self, db_path)
+        self.table = table
+        self.connection = connection if connection is not None else connect(db_path)
+        columns = ", ".join(f"{quote(column)} NUMERIC" for column in COLUMNS[1:])
+        with self.connection:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ("index" INTEGER PRIMARY KEY, {columns})')
+        self._insert_sql = f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(COLUMNS))})"
+        self._reload()
+
+    def _read_signature(self):
+        """
+        Returns the largest index and the number of rows of the table, which change when rows are written to it.
+        The commits of other tables of the database, e.g. of the other ledgers, don't change it.
+        """
+        return self.connection.execute(f'SELECT MAX("index"), COUNT(*) FROM {self.table}').fetchone()
+
+    def _reload(self):
+        """
+        Reload the current state from the last row of the table.
+        """
+        self._signature = self._read_signature()
+        self.timeline = SqliteTimeline(self.file_path, f"{self.table}_timeline", self.connection)
+        last = self.connection.execute(f'SELECT * FROM {self.table} ORDER BY "index" DESC LIMIT 1').fetchone()
+        self._set_row(None if last is None else list(last))
+
+    def _load_frame(self):
+        """
+        Load the history from the table, sorted by index.
+        """
+        frame = pd.read_sql_query(f'SELECT * FROM {self.table} ORDER BY "index"', self.connection)
+        if frame.empty:
+            return pd.DataFrame(columns=COLUMNS)
+        return frame
+
+    def _write(self, rows):
+        """
+        Insert rows into the table in one transaction.
+        """
+        with self.connection:
+            self.connection.executemany(self._insert_sql, [plain_values(row) for row in rows])
+        self._signature = self._read_signature()
+
+    def rewrite(self):
+        """
+        Replace all rows of the table with the in-memory history in one transaction.
+        """
+        rows = [plain_values(row) for row in self.frame.itertuples(index=False)]
+        with self.connection:
+            self.connection.execute(f"DELETE FROM {self.table}")
+            self.connection.executemany(self._insert_sql, rows)
+        self._signature = self._read_signature()
+        self._unwritten = []
+        self.timeline.flush()
+
+    def state_at(self, seq):
+        """
+        Returns the row of the latest operation at or before a seq number, found with the primary key index.
+        None if there is no operation before seq.
+        """
+        row = self.connection.execute(f'SELECT * FROM {self.table} WHERE "index" <= ? ORDER BY "index" DESC LIMIT 1',
+                                      (seq,)).fetchone()
+        row = None if row is None else list(row)
+        # rows added in a batch are not inserted yet
+        for pending in self._unwritten:
+            if pending[0] <= seq:
+                row = list(pending)
+        return row
+
+    def sync(self):
+        """
+        The rows are written to disk by the SQLite commit, nothing to do.
+        """
+        pass
+
+
+class SqliteTimeline(Timeline):
+    """
+    Represents the time index of a SqliteLedger, stored in a table of the same database.
+
+    Attributes:
+    - table (str): The name of the table, e.g. "inventory_timeline".
+    - connection (sqlite3.Connection): The connection to the database.
+    """
+
+    def __init__(self, db_path, table, connection):
+        """
+        Initializes an instance of SqliteTimeline, creating the table if it doesn't exist.
+        """
+        Timeline.__init__(self, db_path)
+        self.table = table
+        self.connection = connection
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (seq INTEGER PRIMARY KEY, timestamp TEXT)")
+
+    def _read_entries(self):
+        """
+        Returns the (seq, timestamp) entries stored in the table, sorted by seq.
+        """
+        cursor = self.connection.execute(f"SELECT seq, timestamp FROM {self.table} ORDER BY seq")
+        return [(seq, datetime.fromisoformat(timestamp)) for seq, timestamp in cursor]
+
+    def _read_last_timestamp(self):
+        """
+        Returns the timestamp of the largest seq number in the table, None if there is no entry.
+        """
+        last = self.connection.execute(f"SELECT timestamp FROM {self.table} ORDER BY seq DESC LIMIT 1").fetchone()
+        return None if last is None else datetime.fromisoformat(last[0])
+
+    def _write_entries(self, entries):
+        """
+        Insert (seq, timestamp) entries into the table in one transaction.
+        """
+        with self.connection:
+            self.connection.executemany(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?)",
+                                        [(seq, timestamp.isoformat()) for seq, timestamp in entries])
+
+    def replace(self, entries):
+        """
+        Replace all entries of the table with (seq, timestamp) entries in one transaction.
+        """
+        with self.connection:
+            self.connection.execute(f"DELETE FROM {self.table}")
+            self.connection.executemany(f"INSERT INTO {self.table} VALUES (?, ?)",
+                                        [(seq, timestamp.isoformat()) for seq, timestamp in entries])
+
+
+class SqliteOrderStore(OrderStore):
+    """
+    Represents sales orders stored in a SQLite table. The index column is the primary key, and the fruit variety,
+    fruit type and sales type columns are indexed.
+
+    Attributes:
+    - table (str): The name of the table, "orders" by default.
+    - connection (sqlite3.Connection): The connection to the database.
+    """
+
+    column_types = ["INTEGER PRIMARY KEY", "TEXT", "INTEGER", "TEXT", "REAL", "REAL", "REAL"]
+    indexed_columns = ["fruit_variety", "fruit_type", "sales_type"]
+
+    def __init__(self, db_path, table="orders", connection=None):
+        """
+        Initializes an instance of SqliteOrderStore, creating the table and its indexes if they don't exist.
+
+        Parameters:
+        - db_path (str): The path of the database file.
+        - table (str): The name of the table.
+        - connection (sqlite3.Connection): An open connection to the database, a new one is opened if None.
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table}")
+        self.table = table
+        self.connection = connection if connection is not None else connect(db_path)
+        OrderStore.__init__(self, db_path)
+        columns = ", ".join(f"{quote(column)} {column_type}"
+                            for column, column_type in zip(ORDER_COLUMNS, self.column_types))
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            for column in self.indexed_columns:
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})")
+        self._insert_sql = f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(ORDER_COLUMNS))})"
+
+    def _read_signature(self):
+        """
+        Returns the largest index and the number of orders of the table, which change when orders are written to it.
+        The commits of the ledgers stored in the same database don't change it.
+        """
+        return self.connection.execute(f'SELECT MAX("index"), COUNT(*) FROM {self.table}').fetchone()
+
+    def _new_timeline(self):
+        """
+        Returns the timeline stored in a table of the same database, e.g. orders_timeline.
+        """
+        return SqliteTimeline(self.file_path, f"{self.table}_timeline", self.connection)
+
+    def last_index(self):
+        """
+        Returns the largest index of the table, None if there is no order.
+        """
+        return self.connection.execute(f'SELECT MAX("index") FROM {self.table}').fetchone()[0]
+
+    def sync(self):
+        """
+        The orders are written to disk by the SQLite commit, nothing to do.
+        """
+        pass
+
+    def load(self):
+        """
+        Load all orders from the table, sorted by index.
+        """
+        self._signature = self._read_signature()
+        orders = pd.read_sql_query(f'SELECT * FROM {self.table} ORDER BY "index"', self.connection)
+        if orders.empty:
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        return orders
+
+    def insert(self, rows):
+        """
+        Insert new orders into the table in one transaction.
+        """
+        with self.connection:
+            self.connection.executemany(self._insert_sql, [plain_values(row) for row in rows])
+        self._signature = self._read_signature()
+
+    def rewrite(self, orders):
+        """
+        Replace all orders of the table with the orders of a DataFrame in one transaction.
+        """
+        rows = [plain_values(row) for row in orders[ORDER_COLUMNS].itertuples(index=False)]
+        with self.connection:
+            self.connection.execute(f"DELETE FROM {self.table}")
+            self.connection.executemany(self._insert_sql, rows)
+        self._signature = self._read_signature()
+
+    def select(self, column, value):
+        """
+        Returns the orders whose column equals value, found with the index of the column.
+
+        Parameters:
+        - column (str): One of the columns of ORDER_COLUMNS, e.g. "fruit_variety".
+        - value: The value to look for, e.g. "Ambrosia".
+        """
+        if column not in ORDER_COLUMNS:
+            raise ValueError(f"Column {column} not found")
+        orders = pd.read_sql_query(f'SELECT * FROM {self.table} WHERE {quote(column)} = ? ORDER BY "index"',
+                                   self.connection, params=(plain_values([value])[0],))
+        if orders.empty:
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        return orders
+
+    def summary(self, by="fruit_variety"):
+        """
+        Returns the number of orders, weight and revenue for each value of a column, grouped by SQLite.
+        """
+        if by not in SUMMARY_COLUMNS:
+            raise ValueError(f"Column {by} not found")
+        return pd.read_sql_query(f'SELECT {quote(by)}, COUNT(*) AS orders, SUM(weight) AS weight, '
+                                 f'SUM(revenue) AS revenue FROM {self.table} GROUP BY {quote(by)} ORDER BY {quote(by)}',
+                                 self.connection)
@@ -13,8 +13,7 @@ def region_operations(fruit_file, plantation_file):
     - 'plantation_file': Path to the file containing orchard region information.
     """
 
-    data_region = plantation.region_loading(plantation_file)
-    region_list = plantation.region_class_tranfer(data_region)
+    region_list = plantation.region_class_load(plantation_file)
     fruits_list = fruit_info.fruit_class_load(fruit_file)
 
     while True:
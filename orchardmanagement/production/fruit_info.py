@@ -1,6 +1,11 @@
+import copy
 import csv
+import os
 from datetime import datetime
 from abc import ABCMeta, abstractmethod
+import pandas as pd
+from file_cache import load_cache
+from file_lock import file_lock
 """
 Module Description:
 
@@ -9,6 +14,16 @@ planted in an orchard. It includes functionality for checking fruit availability
 fruit information to and from CSV files, and retrieving specific fruit instances based on type number
 and variety.
 
+The fruit file is append-only: a new fruit is one line appended to the file, and a removed fruit is a tombstone
+line with the negative type number and the variety, e.g. "-1,Ambrosia". The tombstones are folded when the file is
+loaded, and the file is compacted, rewritten with only the current fruits, when it has as many outdated lines as
+current fruits.
+
+The file is read by iter_fruits, a generator built on the csv module that creates one Fruit at a time, or by
+load_fruit_frame, which parses a very large file with pandas. A line that cannot be parsed is reported with its line
+number.
+The fruits of a file are kept in the load cache of the process while the file is unchanged.
+
 Please see the docstrings within each function and class for more detailed information.
 """
 
@@ -23,8 +38,18 @@ class Fruit(metaclass=ABCMeta):
          and get_type methods.
     The `variety` parameter must be one of the varieties stored in the `season_dict` of the subclass.
     No two fruit classes in the orchard are allowed to have same type number and variety.
+
+    The attributes of an instance are kept in __slots__ instead of a __dict__, as a large orchard loads many
+    fruits, so a Fruit cannot be given other attributes.
+
+    Class Attributes:
+    - price_changes (int): The number of set_price calls on any fruit, used by price indexes to find out that a
+      price may have changed.
     """
 
+    __slots__ = ("variety", "size", "sweet", "sour", "taste", "__price", "use")
+    price_changes = 0
+
     def __init__(self, variety, size, sweet, sour, taste, price, use):
         """
         Initializes an instance of Fruit.
@@ -69,6 +94,7 @@ class Fruit(metaclass=ABCMeta):
         Sets the price of the fruit.
         """
         self.__price = price
+        Fruit.price_changes += 1
 
 
     @abstractmethod
@@ -105,6 +131,7 @@ class Apple(Fruit):
 
     type_num = 1
     type = "apple"
+    __slots__ = ()
 
     season_dict = {"Ambrosia": [9,10],
                    "Gala": [8,9,10],
@@ -158,6 +185,7 @@ class Cherry(Fruit):
     """
     type_num = 2
     type = "cherry"
+    __slots__ = ()
 
     season_dict = {"Lapins": [6,7],
                    "Sweetheart": [6,7],
@@ -214,6 +242,7 @@ class Peach(Fruit):
 
     type_num = 3
     type = "peach"
+    __slots__ = ()
 
     season_dict = {"Redhaven": [7, 8],
                    "Elberta": [8, 9],
@@ -255,6 +284,34 @@ class Peach(Fruit):
             return False
 
 
+# the fields of a line of the fruit file
+FRUIT_COLUMNS = ["type_num", "variety", "size", "sweet", "sour", "taste", "price", "use"]
+# the fruit class of each type number
+FRUIT_CLASSES = {Apple.type_num: Apple, Cherry.type_num: Cherry, Peach.type_num: Peach}
+
+
+class FruitFileError(ValueError):
+    """
+    Raised for a line of a fruit file that cannot be parsed.
+
+    Attributes:
+    - file_path (str): The path of the fruit file.
+    - line_number (int): The number of the line in the file, from 1, None if unknown.
+    - message (str): What is wrong with the line.
+    """
+
+    def __init__(self, file_path, line_number, message):
+        ValueError.__init__(self, file_path, line_number, message)
+        self.file_path = file_path
+        self.line_number = line_number
+        self.message = message
+
+    def __str__(self):
+        if self.line_number is None:
+            return f"{self.file_path}: {self.message}"
+        return f"{self.file_path}, line {self.line_number}: {self.message}"
+
+
 def datetime_transfer(date):
     """
     Convert 'MM-DD' date string to month (MM).
@@ -287,10 +344,25 @@ def available_season_fruit(date,fruit_list):
 
 
 def file_store(file_path, store_data):
-    """Store data in a CSV file."""
-    with open(file_path, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerows(store_data)
+    """Store data in a CSV file, holding the lock of the file."""
+    with file_lock(file_path):
+        with open(file_path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerows(store_data)
+        load_cache.invalidate(file_path)
+
+
+def fruit_record(fruit):
+    """Returns the line of a fruit in the fruit file, as a tuple of fields."""
+    type_num = fruit.get_type_num()
+    variety = fruit.variety
+    size = fruit.size
+    sweet = fruit.sweet
+    sour = fruit.sour
+    taste = fruit.taste
+    price = round(fruit.get_price(), 2)
+    use = fruit.use
+    return tuple([type_num, variety, size, sweet, sour, taste, price, use])
 
 
 def fruit_information_store(fruit_list, csv_file_path):
@@ -300,125 +372,443 @@ def fruit_information_store(fruit_list, csv_file_path):
     fruit_info_list = []
     for fruit in fruit_list:
         if fruit is not None:
-            type_num = fruit.get_type_num()
-            variety = fruit.variety
-            size = fruit.size
-            sweet = fruit.sweet
-            sour = fruit.sour
-            taste = fruit.taste
-            price = round(fruit.get_price(), 2)
-            use = fruit.use
-
-            fruit_info = tuple([type_num, variety, size, sweet, sour, taste, price, use])
-            fruit_info_list.append(fruit_info)
+            fruit_info_list.append(fruit_record(fruit))
 
     file_store(csv_file_path, fruit_info_list)
 
 
+def file_append(file_path, store_data):
+    """Append rows to a CSV file, holding the lock of the file. A last line without a line break is completed."""
+    with file_lock(file_path):
+        with open(file_path, mode='a+', newline='') as file:
+            if file.tell() > 0:
+                file.seek(file.tell() - 1)
+                if file.read(1) not in ("\n", "\r"):
+                    file.write("\n")
+            writer = csv.writer(file)
+            writer.writerows(store_data)
+        load_cache.invalidate(file_path)
+
+
 def file_load(file_path):
-    """Helper method: Load data from a file. Returns a list of file rows."""
-    file_rows = []
+    """
+    Helper method: Load data from a file. Returns a list of file rows, parsed by the csv module so a quoted field
+    may hold commas, e.g. "crisp, juicy".
+    """
     try:
-        with open(file_path, "r") as infile:
-            for line in infile:
-                line = line.strip(" \n")
-                fields = line.split(",")
-                for i in range(0, len(fields)):
-                    fields[i] = fields[i].strip()
-                file_rows.append(fields)
-
-        return file_rows
+        with open(file_path, "r", newline="") as infile:
+            # an empty line is ['']
+            return [[field.strip() for field in row] or [''] for row in csv.reader(infile)]
     except FileNotFoundError:
         print(f"There is no file {file_path}")
 
 
-def fruit_class_load(fruit_file):
-    """Load fruit information from a file and return a list of Fruit instances."""
+def iter_fruit_rows(fruit_file):
+    """
+    Yield the line number and the stripped fields of each non-empty line of a fruit file, parsed by the csv module.
+    """
+    with open(fruit_file, "r", newline="") as infile:
+        reader = csv.reader(infile)
+        for row in reader:
+            fields = [field.strip() for field in row]
+            if any(fields):
+                yield reader.line_num, fields
+
+
+def parse_fruit_row(row):
+    """
+    Returns the typed fields of a line of a fruit file, (type_num, variety, size, sweet, sour, taste, price, use)
+    for a fruit, or (type_num, variety) with a negative type_num for a tombstone.
+
+    Raises:
+        ValueError: If the line is neither a fruit nor a tombstone.
+    """
+    try:
+        type_num = int(row[0])
+    except ValueError:
+        raise ValueError(f"type_num '{row[0]}' is not an integer")
+    if type_num < 0:
+        if len(row) < 2 or not row[1]:
+            raise ValueError("a tombstone needs a variety")
+        return type_num, row[1]
+    if type_num not in FRUIT_CLASSES:
+        raise ValueError(f"type_num {type_num} is not a valid production type num")
+    if len(row) != len(FRUIT_COLUMNS):
+        raise ValueError(f"expected {len(FRUIT_COLUMNS)} fields, found {len(row)}")
+    try:
+        price = float(row[6])
+    except ValueError:
+        raise ValueError(f"price '{row[6]}' is not a number")
+    return type_num, row[1], row[2], row[3], row[4], row[5], price, row[7]
+
+
+def iter_fruits(fruit_file, errors="raise"):
+    """
+    Yield the fruits of a fruit file in the order of their lines, one Fruit at a time. The tombstones are folded
+    by a first pass that reads only the keys of the lines, so a removed fruit is never created.
+
+    Parameters:
+    - fruit_file (str): The path of the fruit file.
+    - errors (str): "raise" to raise a FruitFileError for the first line that cannot be parsed, or "report" to
+      print the error of each such line, with its line number, and skip the line.
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist.
+        FruitFileError: For a line that cannot be parsed, with errors="raise".
+    """
+    keys, outdated = fruit_file_keys(fruit_file)
+    # without outdated lines, every fruit line is current
+    current_lines = set(keys.values()) if outdated else None
+    for line_number, row in iter_fruit_rows(fruit_file):
+        try:
+            record = parse_fruit_row(row)
+        except ValueError as error:
+            fruit_file_error = FruitFileError(fruit_file, line_number, str(error))
+            if errors == "raise":
+                raise fruit_file_error
+            print(fruit_file_error)
+            continue
+        if record[0] < 0 or (current_lines is not None and line_number not in current_lines):
+            continue
+        yield FRUIT_CLASSES[record[0]](*record[1:])
+
+
+def load_fruit_frame(fruit_file, errors="raise"):
+    """
+    Load the fruits of a fruit file as a DataFrame, for very large files. The file is parsed by pandas, the fields
+    are typed and checked column-wise, and the tombstones are folded with a groupby.
+
+    Parameters:
+    - fruit_file (str): The path of the fruit file.
+    - errors (str): "raise" or "report", as for iter_fruits.
+
+    Returns:
+        pd.DataFrame: The columns of FRUIT_COLUMNS and line, the line number of each current fruit, in the order
+        of the lines.
+
+    Raises:
+        FruitFileError: For a line that cannot be parsed, with errors="raise", or a line with too many fields.
+    """
     try:
-        file_rows = file_load(fruit_file)
-        fruit_list = []
-
-        if file_rows == [['']]:
-            # check if the file exist but empty
-            return fruit_list
-
-        for row in file_rows:
-            fruit = None
-            # title_list = ["type_num", "variety", "size", "sweet", "sour", "taste", "price", "use"]
-            type_num = int(row[0])
-            variety = row[1]
-            size = row[2]
-            sweet = row[3]
-            sour = row[4]
-            taste = row[5]
-            price = float(row[6])
-            use = row[7]
-
-            if type_num == 1:
-                fruit = Apple(variety, size, sweet, sour, taste, price, use)
-            elif type_num == 2:
-                fruit = Cherry(variety, size, sweet, sour, taste, price, use)
-            elif type_num == 3:
-                fruit = Peach(variety, size, sweet, sour, taste, price, use)
+        frame = pd.read_csv(fruit_file, header=None, names=FRUIT_COLUMNS, dtype=str, skip_blank_lines=False,
+                            keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=FRUIT_COLUMNS + ["line"])
+    except pd.errors.ParserError as error:
+        # pandas names the line, e.g. "Expected 8 fields in line 4, saw 9"
+        raise FruitFileError(fruit_file, None, str(error))
+    frame = frame.fillna("").apply(lambda column: column.str.strip())
+    frame["line"] = range(1, len(frame) + 1)
+    frame = frame[(frame[FRUIT_COLUMNS] != "").any(axis=1)]
+
+    type_num = pd.to_numeric(frame["type_num"], errors="coerce")
+    price = pd.to_numeric(frame["price"], errors="coerce")
+    tombstone = type_num < 0
+    # the first failing check gives the error of a line
+    checks = [(type_num.isna() | (type_num % 1 != 0), "type_num is not an integer"),
+              (~tombstone & ~type_num.isin(list(FRUIT_CLASSES)), "type_num is not a valid production type num"),
+              (frame["variety"] == "", "the variety is missing"),
+              (~tombstone & (frame[FRUIT_COLUMNS[2:]] == "").any(axis=1), "a field is missing"),
+              (~tombstone & price.isna(), "price is not a number")]
+    error = pd.Series(None, index=frame.index, dtype=object)
+    for failed, message in checks:
+        error = error.mask(failed & error.isna(), message)
+    invalid = error.notna()
+    for line_number, message in zip(frame["line"][invalid], error[invalid]):
+        fruit_file_error = FruitFileError(fruit_file, int(line_number), message)
+        if errors == "raise":
+            raise fruit_file_error
+        print(fruit_file_error)
+    frame = frame[~invalid].assign(type_num=type_num[~invalid].astype("int64"), price=price[~invalid])
+    tombstone = frame["type_num"] < 0
+
+    # a fruit line is current if it comes after the last tombstone of its fruit, and the first such line is kept
+    keys = [frame["type_num"].abs(), frame["variety"]]
+    last_tombstone = frame["line"].where(tombstone).groupby(keys).transform("max")
+    current = ~tombstone & (last_tombstone.isna() | (frame["line"] > last_tombstone))
+    frame = frame[current].drop_duplicates(["type_num", "variety"], keep="first")
+    return frame.reset_index(drop=True)
+
+
+def fruit_class_load(fruit_file, engine="csv"):
+    """
+    Load fruit information from a file and return a FruitRegistry of Fruit instances, None if the file doesn't
+    exist. A line that cannot be parsed is reported with its line number and skipped.
+
+    The fruits are kept in the load cache while the file is unchanged, and each call returns a new FruitRegistry of
+    copies of them, so a price set on a returned fruit doesn't change the fruits of the other callers.
+
+    Parameters:
+    - fruit_file (str): The path of the fruit file.
+    - engine (str): "csv" to stream the lines with iter_fruits, or "pandas" to parse them with load_fruit_frame,
+      faster for very large files.
+    """
+    if not os.path.exists(fruit_file):
+        print(f"There is no file {fruit_file}")
+        return None
+    cached = load_cache.get("fruits", fruit_file, lambda: _fruit_file_load(fruit_file, engine))
+    return FruitRegistry(None if fruit is None else copy.copy(fruit) for fruit in cached)
+
+
+def _fruit_file_load(fruit_file, engine):
+    """
+    Helper method: Load the fruits of a file with an engine of fruit_class_load.
+    """
+    if engine == "pandas":
+        frame = load_fruit_frame(fruit_file, errors="report")
+        return FruitRegistry(FRUIT_CLASSES[record[0]](*record[1:])
+                             for record in frame[FRUIT_COLUMNS].itertuples(index=False))
+    return FruitRegistry(iter_fruits(fruit_file, errors="report"))
+
+
+class FruitRegistry(list):
+    """
+    Represents a list of fruits with hash indexes, so a fruit is found by (type_num, variety) without scanning the
+    list. It is a list, so callers that iterate, index or append the fruit list are unchanged; every change of the
+    list updates the indexes. A None entry, e.g. a row of an invalid type num in the fruit file, is kept in the list
+    but not indexed.
+
+    Usage:
+    fruit_list = fruit_class_load("production/fruits.csv")
+    fruit_list.get(1, "Ambrosia")
+    fruit_list.by_type(3)
+    """
+
+    def __init__(self, fruits=()):
+        """
+        Initializes an instance of FruitRegistry with some fruits.
+        """
+        list.__init__(self, fruits)
+        self._rebuild()
+
+    def _rebuild(self):
+        """
+        Build the indexes from the list, after a change of any position.
+        """
+        # the first fruit of each (type_num, variety), as found by a scan of the list
+        self._by_key = {}
+        self._by_type = {}
+        self._by_variety = {}
+        for fruit in self:
+            self._index(fruit)
+
+    def _index(self, fruit):
+        """
+        Add a fruit at the end of the list to the indexes.
+        """
+        if fruit is None:
+            return
+        type_num = fruit.get_type_num()
+        self._by_key.setdefault((type_num, fruit.variety), fruit)
+        self._by_type.setdefault(type_num, []).append(fruit)
+        self._by_variety.setdefault(fruit.variety, []).append(fruit)
+
+    def _unindex(self, fruit):
+        """
+        Remove a fruit removed from the list from the indexes, only the entries of its type number and variety are
+        changed.
+        """
+        if fruit is None:
+            return
+        type_num = fruit.get_type_num()
+        for index, value in [(self._by_type, type_num), (self._by_variety, fruit.variety)]:
+            fruits = index[value]
+            del fruits[next(position for position, other in enumerate(fruits) if other is fruit)]
+            if not fruits:
+                del index[value]
+        key = (type_num, fruit.variety)
+        if self._by_key.get(key) is fruit:
+            # the next fruit of the same key in the list, if the fruit was not the only one
+            same_key = [other for other in self._by_variety.get(fruit.variety, []) if other.get_type_num() == type_num]
+            if same_key:
+                self._by_key[key] = same_key[0]
             else:
-                print("These is not a valid production type num, please check your file content")
-            fruit_list.append(fruit)
-        return fruit_list
+                del self._by_key[key]
 
-    except:
-        # check if the file is not exist
-        print("None file exist")
+    def get(self, type_num, variety):
+        """
+        Returns the fruit of a type number and variety, None if there is no such fruit.
+        """
+        return self._by_key.get((type_num, variety))
+
+    def by_type(self, type_num):
+        """
+        Returns the fruits of a type number, e.g. all the apples for 1, in the order of the list.
+        """
+        return list(self._by_type.get(type_num, []))
+
+    def by_variety(self, variety):
+        """
+        Returns the fruits of a variety, in the order of the list.
+        """
+        return list(self._by_variety.get(variety, []))
+
+    def remove_fruit(self, type_num, variety):
+        """
+        Remove the fruit of a type number and variety.
+
+        Returns:
+            Fruit: The removed fruit, None if there is no such fruit.
+        """
+        fruit = self.get(type_num, variety)
+        if fruit is not None:
+            self.remove(fruit)
+        return fruit
+
+    def append(self, fruit):
+        list.append(self, fruit)
+        self._index(fruit)
+
+    def extend(self, fruits):
+        fruits = list(fruits)
+        list.extend(self, fruits)
+        for fruit in fruits:
+            self._index(fruit)
+
+    def __iadd__(self, fruits):
+        self.extend(fruits)
+        return self
+
+    # a removed fruit is removed from the indexes of its keys only
+    def remove(self, fruit):
+        self.pop(self.index(fruit))
+
+    def pop(self, position=-1):
+        fruit = list.pop(self, position)
+        self._unindex(fruit)
+        return fruit
+
+    def __delitem__(self, position):
+        removed = self[position] if isinstance(position, slice) else [self[position]]
+        list.__delitem__(self, position)
+        for fruit in removed:
+            self._unindex(fruit)
+
+    # the other changes may move fruits before others of the same key, the indexes are built again
+    def insert(self, position, fruit):
+        list.insert(self, position, fruit)
+        self._rebuild()
+
+    def clear(self):
+        list.clear(self)
+        self._rebuild()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._rebuild()
+
+    def reverse(self):
+        list.reverse(self)
+        self._rebuild()
+
+    def __setitem__(self, position, fruit):
+        list.__setitem__(self, position, fruit)
+        self._rebuild()
 
 
 def get_fruit(fruit_type_num, variety, fruit_list):
-    """Retrieve a unique fruit class based on type number and variety from the given fruit list."""
+    """
+    Retrieve a unique fruit class based on type number and variety from the given fruit list, by its index if the
+    list is a FruitRegistry, e.g. as loaded by fruit_class_load.
+    """
+    if isinstance(fruit_list, FruitRegistry):
+        return fruit_list.get(fruit_type_num, variety)
     for fruit in fruit_list:
         if fruit_type_num == fruit.get_type_num() and variety == fruit.variety:
             return fruit
 
 
+def fruit_file_keys(fruit_file):
+    """
+    Returns the line number of each fruit of a fruit file keyed by (type_num, variety), with the tombstones folded,
+    and the number of lines of the file that are outdated, the lines of removed fruits and the tombstones. Only the
+    first two fields of each line are used, no Fruit is created.
+    """
+    keys = {}
+    lines = 0
+    try:
+        for line_number, fields in iter_fruit_rows(fruit_file):
+            if len(fields) < 2:
+                continue
+            try:
+                type_num = int(fields[0])
+            except ValueError:
+                # reported when the fruits are loaded
+                continue
+            lines += 1
+            if type_num < 0:
+                keys.pop((-type_num, fields[1]), None)
+            else:
+                keys.setdefault((type_num, fields[1]), line_number)
+    except FileNotFoundError:
+        pass
+    return keys, lines - len(keys)
+
+
+def add_fruits(fruits, fruit_file):
+    """
+    Add new fruits to the fruit file with one append. Each fruit is checked against the season_dict of its class,
+    and should not have the same type_num and variety as a fruit of the file or an earlier fruit of the list.
+    The lock of the file is held from reading the fruits of the file to appending the new ones.
+
+    Parameters:
+    - fruits (list): (type_num, variety, size, sweet, sour, taste, price, use) tuples.
+    - fruit_file (str): The path of the fruit file.
+
+    Returns:
+        list: The Fruit instances added, the invalid or existing fruits are skipped.
+    """
+    with file_lock(fruit_file):
+        # the keys of the file are read once for all the fruits
+        keys, outdated = fruit_file_keys(fruit_file)
+        fruit_created_list = []
+        for fruit_type_num, variety, size, sweet, sour, taste, price, use in fruits:
+            if (fruit_type_num, variety) in keys:
+                print("Fail to add new fruit, the input fruit is already exist")
+                continue
+            fruit_class = FRUIT_CLASSES.get(fruit_type_num)
+            if fruit_class is None or variety not in fruit_class.season_dict:
+                print("Invalid input, please enter fruit information with correct type_num and variety")
+                continue
+            fruit_created = fruit_class(variety, size, sweet, sour, taste, price, use)
+            keys[(fruit_type_num, variety)] = None
+            fruit_created_list.append(fruit_created)
+        if fruit_created_list:
+            file_append(fruit_file, [fruit_record(fruit) for fruit in fruit_created_list])
+        return fruit_created_list
+
+
 def add_fruit(fruit_type_num, variety, size, sweet, sour, taste, price, use, fruit_file):
     """
     Add a new type of fruit record to the list of fruits. The new fruit should not have same type_num
-    and variety with existed fruits.
-    """
-    # check there is no same fruit record at first
-    fruit_list = fruit_class_load(fruit_file)
-    fruit_created = None
-    if get_fruit(fruit_type_num, variety, fruit_list) is None:
-        if fruit_type_num == Apple.type_num and variety in list(Apple.season_dict.keys()):
-            fruit_created = Apple(variety, size, sweet, sour, taste, price, use)
-        elif fruit_type_num == Cherry.type_num and variety in list(Cherry.season_dict.keys()):
-            fruit_created = Cherry(variety, size, sweet, sour, taste, price, use)
-        elif fruit_type_num == Peach.type_num and variety in list(Peach.season_dict.keys()):
-            fruit_created = Peach(variety, size, sweet, sour, taste, price, use)
-        else:
-            print("Invalid input, please enter fruit information with correct type_num and variety")
-        fruit_list.append(fruit_created)
-        fruit_information_store(fruit_list, fruit_file)
-    else:
-        print("Fail to add new fruit, the input fruit is already exist")
+    and variety with existed fruits. The fruit is one line appended to the file, under the lock of the file.
+    """
+    add_fruits([(fruit_type_num, variety, size, sweet, sour, taste, price, use)], fruit_file)
 
 
 def remove_fruit(fruit_type_num, variety, fruit_file):
     """
     Remove a fruit record from the list of fruits based on the type number and variety.
+    A tombstone line is appended to the file, and the file is compacted when it has as many outdated lines as
+    fruits. The lock of the file is held from reading the fruits to writing the tombstone.
     """
-    try:
-        fruit_list = fruit_class_load(fruit_file)
-    except ValueError:
-        fruit_list = []
-
-    fruit_len_prev = len(fruit_list)
-    print(len(fruit_list))
-    for i in range(0, len(fruit_list)):
-        fruit = fruit_list[i]
-        if fruit.get_type_num() == fruit_type_num and fruit.variety == variety:
-            del fruit_list[i]
-            break
-    if fruit_len_prev == len(fruit_list):
-        print("Fail to remove fruit, this fruit is not exist")
-    fruit_information_store(fruit_list, fruit_file)
+    with file_lock(fruit_file):
+        keys, outdated = fruit_file_keys(fruit_file)
+        if (fruit_type_num, variety) not in keys:
+            print("Fail to remove fruit, this fruit is not exist")
+            return
+        file_append(fruit_file, [(-fruit_type_num, variety)])
+        # the fruit line and its tombstone are outdated
+        if outdated + 2 >= len(keys) - 1:
+            compact_fruit_file(fruit_file)
+
+
+def compact_fruit_file(fruit_file):
+    """
+    Rewrite the fruit file with only its current fruits, without the removed fruits and the tombstones.
+    """
+    with file_lock(fruit_file):
+        fruit_information_store(fruit_class_load(fruit_file), fruit_file)
 
 
 
@@ -1,9 +1,13 @@
+import copy
 import production.fruit_info as fruit_info
 import pandas as pd
+from file_cache import load_cache
+from file_lock import file_lock
 
 """
 This module contains classes and functions related to fruit cultivation regions, including the Region class,
-area calculations, region summary report, and data storage using DataFrames.
+area calculations, region summary report, and data storage using DataFrames. The regions of a file are kept in the
+load cache of the process while the file is unchanged.
 """
 
 class Region():
@@ -17,7 +21,10 @@ class Region():
     - variety (str): The variety of the fruit cultivated in the region.
     - area (float): The area of the region for fruit cultivation.
     - areaType (str): The type of the region, either "market" or "pick".
+
+    The attributes are kept in __slots__ instead of a __dict__, as an orchard may have millions of regions.
     """
+    __slots__ = ("regionId", "fruit_type_num", "variety", "area", "areaType")
     areaType_list = ["market", "pick"]
 
     def __init__(self, regionId, fruit_type_num, variety, area, areaType):
@@ -124,6 +131,23 @@ def fruit_index_list(plantation_list, fruit_type_num, fruit_variety):
                 fruit_index_pick.append(region.regionId)
     return fruit_index_pick, fruit_index_market
 
+def group_regions(region_list):
+    """
+    Group the regions by fruit in one pass, returns a dict keyed by (fruit type number, variety) of
+    [picking region IDs, marketing region IDs, picking area, marketing area].
+    """
+    groups = {}
+    for region in region_list:
+        group = groups.setdefault((region.fruit_type_num, region.variety), [[], [], 0, 0])
+        if region.get_area_type() == "market":
+            group[1].append(region.regionId)
+            group[3] += region.area
+        else:
+            group[0].append(region.regionId)
+            group[2] += region.area
+    return groups
+
+
 def region_summary(fruit_list, region_list):
     """
     Generate a summary DataFrame with picking and marketing area information for each fruit type and variety.
@@ -136,13 +160,15 @@ def region_summary(fruit_list, region_list):
     index_dict_pick = {}
     index_dict_market = {}
 
+    # the regions are grouped once, not scanned again for each fruit
+    regions_by_fruit = group_regions(region_list)
     for f in fruit_list:
         fruit_type_num = f.get_type_num()
         variety = f.variety
         display_name = variety+ " " + f.type
 
-        picking_regions, marketing_regions = fruit_index_list(region_list, fruit_type_num, variety)
-        picking_area, marketing_area = area_amount_variety(region_list, fruit_type_num, variety)
+        picking_regions, marketing_regions, picking_area, marketing_area = regions_by_fruit.get(
+            (fruit_type_num, variety), [[], [], 0, 0])
 
         area_dict_pick[display_name] = picking_area
         area_dict_market[display_name] = marketing_area
@@ -189,23 +215,26 @@ def region_saving(plantation_file,region_list):
     """
     Save region information from a list of Region instances to a DataFrame and store it in a CSV file.
     CSV file columns: 'regionId', 'fruit_type_num', 'variety', 'area', 'areaType'.
+    The lock of the file is held while it is written.
     """
-    data_region = region_loading(plantation_file)
+    with file_lock(plantation_file):
+        data_region = region_loading(plantation_file)
 
-    region_info_list = []
-    for r in region_list:
-        regionId = r.regionId
-        fruit_type_num = r.fruit_type_num
-        variety = r.variety
-        area = r.area
-        areaType = r.get_area_type()
+        region_info_list = []
+        for r in region_list:
+            regionId = r.regionId
+            fruit_type_num = r.fruit_type_num
+            variety = r.variety
+            area = r.area
+            areaType = r.get_area_type()
 
-        region_info = [regionId, fruit_type_num, variety, area, areaType]
-        region_info_list.append(region_info)
+            region_info = [regionId, fruit_type_num, variety, area, areaType]
+            region_info_list.append(region_info)
 
-    data_region = pd.DataFrame(region_info_list, columns=data_region.columns)
-    data_region.to_csv(plantation_file, index=False, header=True)
-    #print("successful save")
+        data_region = pd.DataFrame(region_info_list, columns=data_region.columns)
+        data_region.to_csv(plantation_file, index=False, header=True)
+        load_cache.invalidate(plantation_file)
+        #print("successful save")
 
 
 def region_loading(plantation_file):
@@ -230,6 +259,17 @@ def region_class_tranfer(data_region):
     return region_list
 
 
+def region_class_load(plantation_file):
+    """
+    Load region information from a CSV file and return a list of Region class instances. The regions are kept in
+    the load cache while the file is unchanged, and each call returns a new list of copies of them, so an area type
+    set on a returned region doesn't change the regions of the other callers.
+    """
+    region_list = load_cache.get("regions", plantation_file,
+                                 lambda: region_class_tranfer(region_loading(plantation_file)))
+    return [copy.copy(region) for region in region_list]
+
+
 class FruitNoneException(Exception):
     error_message = "planted fruit is not exist"
     def __init__(self, fruit):
@@ -256,26 +296,27 @@ def add_region(regionId, fruit_type_num, variety, area, areaType, fruit_list, pl
 
     Note:
     add_region is used for plantation initialize, it will only call at the start of main.
+    The lock of the file is held from loading the regions to saving them.
     """
-    data_region = region_loading(planatation_file)
-    region_list = region_class_tranfer(data_region)
-    regionId_set = set()
-    for region in region_list:
-        regionId_set.add(region.regionId)
-    try:
-        fruit = fruit_info.get_fruit(fruit_type_num, variety, fruit_list)
-        if fruit is None:
-            raise FruitNoneException(fruit)
-        if regionId in regionId_set:
-            raise RegionExistException(regionId, regionId_set)
-    except FruitNoneException as e:
-        print(f"Fail to add region, {e}")
-    except RegionExistException as r:
-        print(f"Fail to add region, {r}")
-    else:
-        region = Region(regionId, fruit_type_num, variety, area, areaType)
-        region_list.append(region)
-        region_saving(planatation_file, region_list)
+    with file_lock(planatation_file):
+        region_list = region_class_load(planatation_file)
+        regionId_set = set()
+        for region in region_list:
+            regionId_set.add(region.regionId)
+        try:
+            fruit = fruit_info.get_fruit(fruit_type_num, variety, fruit_list)
+            if fruit is None:
+                raise FruitNoneException(fruit)
+            if regionId in regionId_set:
+                raise RegionExistException(regionId, regionId_set)
+        except FruitNoneException as e:
+            print(f"Fail to add region, {e}")
+        except RegionExistException as r:
+            print(f"Fail to add region, {r}")
+        else:
+            region = Region(regionId, fruit_type_num, variety, area, areaType)
+            region_list.append(region)
+            region_saving(planatation_file, region_list)
 
 
 
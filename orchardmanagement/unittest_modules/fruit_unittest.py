@@ -1,10 +1,12 @@
 import os.path
 import sys
 import unittest
+from unittest.mock import patch
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import production.fruit_info as fruit_info
+from file_cache import LoadCache
 
 
 
@@ -105,6 +107,38 @@ class FruitInfoTestCase(unittest.TestCase):
         self.assertEqual(fruit_info.get_fruit(3, "Elberta", self.fruit_list), self.p1)
         self.assertEqual(fruit_info.get_fruit(3, "Redhaven", self.fruit_list), self.p2)
 
+    def test_fruit_registry(self):
+        registry = fruit_info.FruitRegistry(self.fruit_list)
+        self.assertIsInstance(registry, list)
+        self.assertEqual(fruit_info.get_fruit(3, "Redhaven", registry), self.p2)
+        self.assertIsNone(registry.get(1, "Redhaven"))
+        self.assertEqual(registry.by_type(3), [self.p1, self.p2])
+        self.assertEqual(registry.by_variety("Lapins"), [self.c1])
+        # the indexes follow the changes of the list
+        a2 = fruit_info.Apple("Gala", "median", "sweet", "less sour", "crunchy", 0.8, "pie")
+        registry.append(a2)
+        self.assertEqual(registry.get(1, "Gala"), a2)
+        self.assertEqual(registry.remove_fruit(3, "Elberta"), self.p1)
+        self.assertIsNone(registry.get(3, "Elberta"))
+        del registry[0]
+        self.assertIsNone(registry.get(1, "Ambrosia"))
+        self.assertEqual(registry.by_type(1), [a2])
+        self.assertEqual(len(registry), 3)
+        self.assertEqual(len(self.fruit_list), 4)
+        # a duplicate of a removed fruit is found in its place, the indexes are not built again
+        duplicate = fruit_info.Apple("Gala", "big", "sweet", "less sour", "crunchy", 0.9, "pie")
+        registry.append(duplicate)
+        with patch.object(registry, "_rebuild") as rebuild:
+            registry.remove(a2)
+            self.assertIs(registry.get(1, "Gala"), duplicate)
+            self.assertEqual(registry.pop(), duplicate)
+            self.assertIsNone(registry.get(1, "Gala"))
+            self.assertEqual(registry.by_variety("Gala"), [])
+            del registry[0:2]
+            rebuild.assert_not_called()
+        self.assertEqual(len(registry), 0)
+        self.assertEqual((registry.by_type(2), registry.by_type(3)), ([], []))
+
     def test_file_load(self):
         # test non exist file
         self.assertIsNone(fruit_info.file_load("../production_file_test/test_non_exist.csv"))
@@ -237,6 +271,109 @@ class FruitInfoAddRemoveTestCase(unittest.TestCase):
             self.assertEqual(load_fruit_list[i].describe(), self.fruit_list[i].describe())
 
 
+    def test_add_fruits(self):
+        file_path = "production_file_test/test_fruit_append.csv"
+        try:
+            added = fruit_info.add_fruits([(1, "Ambrosia", "big", "very sweet", "less sour", "crunchy", 1.2, "pie"),
+                                           (3, "Elberta", "big", "very sweet", "less sour", "crunchy", 1.2, "pie"),
+                                           (3, "Elberta", "small", "sweet", "less sour", "soft", 1.0, "pie"),
+                                           (2, "abc", "small", "median sweet", "median sour", "soft", 2.99, "cans"),
+                                           (2, "Lapins", "small", "median sweet", "median sour", "soft", 2.99, "cans"),
+                                           (3, "Redhaven", "median", "median sweet", "less sour", "crunchy", 3.2,
+                                            "pie")], file_path)
+            self.assertEqual([fruit.variety for fruit in added], ["Ambrosia", "Elberta", "Lapins", "Redhaven"])
+            # a removed fruit is a tombstone line, folded when the file is loaded
+            fruit_info.remove_fruit(3, "Elberta", file_path)
+            with open(file_path, 'r') as file:
+                lines = file.read().splitlines()
+            self.assertEqual(lines[-1], "-3,Elberta")
+            self.assertEqual([fruit.variety for fruit in fruit_info.fruit_class_load(file_path)],
+                             ["Ambrosia", "Lapins", "Redhaven"])
+            # the file is compacted when it has as many outdated lines as fruits
+            fruit_info.remove_fruit(1, "Ambrosia", file_path)
+            with open(file_path, 'r') as file:
+                lines = file.read().splitlines()
+            self.assertEqual(lines, ["2,Lapins,small,median sweet,median sour,soft,2.99,cans",
+                                     "3,Redhaven,median,median sweet,less sour,crunchy,3.2,pie"])
+            fruit_info.add_fruit(3, "Elberta", "big", "very sweet", "less sour", "crunchy", 1.3, "pie", file_path)
+            self.assertEqual(fruit_info.fruit_class_load(file_path).get(3, "Elberta").get_price(), 1.3)
+        finally:
+            for name in [file_path, file_path + ".lock"]:
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def test_iter_fruits(self):
+        file_path = "production_file_test/test_fruit_stream.csv"
+        try:
+            with open(file_path, 'w') as file:
+                file.write('1,Ambrosia,big,very sweet,less sour,"crisp, juicy",1.2,pie\n'
+                           '3,Elberta,big,very sweet,less sour,crunchy,1.2,pie\n'
+                           '\n'
+                           '-3,Elberta\n'
+                           '3,Redhaven,median,median sweet,less sour,crunchy,3.2,"pie, can"\n'
+                           '3,Elberta,small,sweet,less sour,soft,1.0,pie\n')
+            fruits = list(fruit_info.iter_fruits(file_path))
+            self.assertEqual([fruit.variety for fruit in fruits], ["Ambrosia", "Redhaven", "Elberta"])
+            self.assertEqual(fruits[0].taste, "crisp, juicy")
+            self.assertEqual(fruits[2].get_price(), 1.0)
+            # the pandas path loads the same fruits
+            frame = fruit_info.load_fruit_frame(file_path)
+            self.assertEqual(list(frame["variety"]), ["Ambrosia", "Redhaven", "Elberta"])
+            self.assertEqual(list(frame["line"]), [1, 5, 6])
+            self.assertEqual([fruit.describe() for fruit in fruit_info.fruit_class_load(file_path, engine="pandas")],
+                             [fruit.describe() for fruit in fruits])
+
+            # a bad line is reported with its line number
+            with open(file_path, 'a') as file:
+                file.write('2,Lapins,small,median sweet,median sour,soft,cheap,cans\n')
+            with self.assertRaises(fruit_info.FruitFileError) as context:
+                list(fruit_info.iter_fruits(file_path))
+            self.assertEqual(context.exception.line_number, 7)
+            with self.assertRaises(fruit_info.FruitFileError) as context:
+                fruit_info.load_fruit_frame(file_path)
+            self.assertEqual(context.exception.line_number, 7)
+            # and skipped when the fruits are loaded
+            self.assertEqual(len(fruit_info.fruit_class_load(file_path)), 3)
+            self.assertEqual(len(fruit_info.fruit_class_load(file_path, engine="pandas")), 3)
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def test_load_cache(self):
+        file_path = "production_file_test/test_fruit_cache.csv"
+        try:
+            fruit_info.add_fruit(1, "Ambrosia", "big", "very sweet", "less sour", "crunchy", 1.2, "pie", file_path)
+            load1 = fruit_info.fruit_class_load(file_path)
+            hits = fruit_info.load_cache.hits
+            load2 = fruit_info.fruit_class_load(file_path)
+            # a new registry of copies of the cached fruits
+            self.assertIsNot(load2, load1)
+            self.assertIsNot(load2.get(1, "Ambrosia"), load1.get(1, "Ambrosia"))
+            self.assertEqual(fruit_info.load_cache.hits, hits + 1)
+            # a price set on a loaded fruit is not seen by the next load
+            load1.get(1, "Ambrosia").set_price(1.5)
+            self.assertEqual(fruit_info.fruit_class_load(file_path).get(1, "Ambrosia").get_price(), 1.2)
+            # the writers of the package invalidate the cached fruits
+            fruit_info.add_fruit(2, "Lapins", "small", "median sweet", "median sour", "soft", 2.99, "cans", file_path)
+            self.assertEqual([fruit.variety for fruit in fruit_info.fruit_class_load(file_path)],
+                             ["Ambrosia", "Lapins"])
+            # a file written by another program is loaded again when its size or modification time changes
+            with open(file_path, 'a') as file:
+                file.write("3,Elberta,big,very sweet,less sour,crunchy,1.2,pie\n")
+            self.assertEqual(len(fruit_info.fruit_class_load(file_path)), 3)
+        finally:
+            for name in [file_path, file_path + ".lock"]:
+                if os.path.exists(name):
+                    os.remove(name)
+
+        # the least recently used value is dropped
+        cache = LoadCache(maxsize=2)
+        loads = []
+        for name in ["test_one.csv", "test_mutiple.csv", "test_one.csv", "test_empty.csv", "test_mutiple.csv"]:
+            cache.get("rows", "production_file_test/" + name, lambda: loads.append(name))
+        self.assertEqual(loads, ["test_one.csv", "test_mutiple.csv", "test_empty.csv", "test_mutiple.csv"])
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 4, 2))
+
     def test_remove(self):
         with open(self.file_path, 'w', newline='') as csvfile:
             csvfile.truncate(0)
@@ -51,6 +51,15 @@ class RegionTestCase(unittest.TestCase):
         self.r4.set_area_type("market")
         self.assertEqual(self.r4.get_area_type(), "market")
 
+    def test_slots(self):
+        # regions and fruits keep their attributes in __slots__, without a __dict__
+        self.assertFalse(hasattr(self.r1, "__dict__"))
+        self.assertFalse(hasattr(self.a1, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.r1.owner = "orchard"
+        self.r1.set_area_type("pick")
+        self.assertEqual(self.r1.get_area_type(), "pick")
+
     def test_get_area(self):
         self.assertEqual(self.r1.get_area(), 20)
         self.assertEqual(self.r2.get_area(), 30)
@@ -411,5 +420,20 @@ class RegionTestCase(unittest.TestCase):
             content = file.read()
         self.assertIn("5,2,Lapins,40,pick", content)
 
+    def test_region_class_load(self):
+        file1 = "production_file_test/test_region.csv"
+        plantation.region_saving(file1, self.region_list)
+        load1 = plantation.region_class_load(file1)
+        self.assertEqual([region.regionId for region in load1], [1, 2, 3, 4])
+        # each call returns copies of the cached regions, changing one doesn't change the others
+        plantation.set_picking_region(load1[0])
+        load2 = plantation.region_class_load(file1)
+        self.assertIsNot(load2[0], load1[0])
+        self.assertEqual(load2[0].areaType, self.region_list[0].areaType)
+        self.assertEqual(load1[0].areaType, "pick")
+        # region_saving invalidates the cached regions
+        plantation.region_saving(file1, [self.r2, self.r3])
+        self.assertEqual([region.regionId for region in plantation.region_class_load(file1)], [2, 3])
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,13 +1,38 @@
+import glob
+import multiprocessing
 import os
 import os.path
+import shutil
 import sys
+import threading
+import time
 import unittest
+from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
 import pandas as pd
 from unittest.mock import patch
 from io import StringIO
 from management.inventory import InventoryManagement, HistoricalPlotter
+from management.ledger import ColumnarLedger, DeltaLedger
+from management.sqlite_storage import SqliteLedger
+
+
+def add_inventory_worker(operations):
+    """Add Lapins to the inventory from another process, each operation with a new row."""
+    sys.stdout = StringIO()
+    manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+    for i in range(operations):
+        manager.add_inventory("Lapins", 1)
+        manager.try_reserve("Elberta", 1)
+
+
+def reserve_worker(attempts, results):
+    """Reserve Gala one at a time from another process, and send the number of successful reservations."""
+    sys.stdout = StringIO()
+    manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+    results.put(sum(manager.try_reserve("Gala", 1) for i in range(attempts)))
 
 
 class TestInventoryManagement(unittest.TestCase):
@@ -43,8 +68,10 @@ class TestInventoryManagement(unittest.TestCase):
         print("Tearing down test...")
         # Clean up any resources used during the test
         del self.inventory_manager
-        files_to_remove = ["inventory.csv", "orders.csv", "remaining_productivity.csv", "extra_productivity.csv"]
-        for file_name in files_to_remove:
+        files_to_remove = ["inventory.csv", "orders.csv", "remaining_productivity.csv", "extra_productivity.csv",
+                           "inventory_timeline.csv", "remaining_productivity_timeline.csv",
+                           "extra_productivity_timeline.csv"]
+        for file_name in files_to_remove + glob.glob("*.lock"):
             if os.path.exists(file_name):
                 os.remove(file_name)
 
@@ -105,6 +132,17 @@ class TestInventoryManagement(unittest.TestCase):
         printed_output2 = mock_stdout.getvalue().strip()
         self.assertIn("Inventory is empty.", printed_output2, "remove_inventory abnormal when inventory is empty")
 
+    def test_try_reserve(self):
+        self.assertTrue(self.inventory_manager.try_reserve("Elberta", 400))
+        self.assertListEqual(list(self.inventory_manager.inventory.iloc[-1]), [3, 300, 0, 0, 0, 0, 0, 0, 0, 0],
+                             "try_reserve abnormal")
+        # nothing is written when the reservation fails
+        self.assertFalse(self.inventory_manager.try_reserve("Elberta", 1))
+        self.assertFalse(self.inventory_manager.try_reserve("Amb", 1))
+        self.assertEqual(len(pd.read_csv("inventory.csv")), 3, "try_reserve abnormal")
+        self.inventory_manager.inventory = pd.read_csv("inventory.csv", nrows=0)
+        self.assertFalse(self.inventory_manager.try_reserve("Ambrosia", 1))
+
     @patch('sys.stdout', new_callable=StringIO)
     def test_remove_remaining_productivity(self, mock_stdout):
         # normal condition
@@ -152,6 +190,418 @@ class TestInventoryManagement(unittest.TestCase):
         printed_output = mock_stdout.getvalue().strip()
         self.assertIn("Inventory is empty.", printed_output, "get_current_inventory abnormal when empty")
 
+    def test_append_only_save(self):
+        with open("inventory.csv", "r") as file:
+            content_before = file.read()
+        self.inventory_manager.add_inventory("Ambrosia", 10)
+        with open("inventory.csv", "r") as file:
+            content_after = file.read()
+        # history is kept as it is, only the new row is written at the end of the file
+        self.assertTrue(content_after.startswith(content_before), "append_only save abnormal")
+        self.assertEqual(content_after[len(content_before):], "3,310,0,0,0,0,0,0,400,0\n",
+                         "append_only save abnormal")
+        self.assertListEqual(list(pd.read_csv("inventory.csv").iloc[-1]), [3, 310, 0, 0, 0, 0, 0, 0, 400, 0],
+                             "append_only save abnormal")
+
+    def test_compact(self):
+        rewrite_manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv",
+                                              "inventory.csv", append_only=False)
+        rewrite_manager.add_inventory("Gala", 100)
+        rewrite_manager.remove_inventory("Gala", 20)
+        expected_inventory = pd.read_csv("inventory.csv")
+
+        self.inventory_origin_df.to_csv("inventory.csv", index=False)
+        self.remaining_productivity_origin_df.to_csv("remaining_productivity.csv", index=False)
+        self.extra_productivity_origin_df.to_csv("extra_productivity.csv", index=False)
+        append_manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv",
+                                             "inventory.csv")
+        append_manager.add_inventory("Gala", 100)
+        append_manager.remove_inventory("Gala", 20)
+        self.assertTrue(pd.read_csv("inventory.csv").equals(expected_inventory), "append_only abnormal")
+        append_manager.compact()
+        self.assertTrue(pd.read_csv("inventory.csv").equals(expected_inventory), "compact abnormal")
+        self.assertListEqual(list(pd.read_csv("extra_productivity.csv").iloc[-1]), [2, 0, 200, 50, 0, 0, 0, 0, 0, 0],
+                             "compact abnormal")
+
+    def test_batch(self):
+        changes = [("Ambrosia", 10), ("Gala", 100), ("Elberta", -50), ("Lapins", 200), ("Ambrosia", -20)]
+        for fruit_type, number in changes:
+            if number >= 0:
+                self.inventory_manager.add_inventory(fruit_type, number)
+            else:
+                self.inventory_manager.remove_inventory(fruit_type, -number)
+        expected = [pd.read_csv(file_name) for file_name in
+                    ["inventory.csv", "remaining_productivity.csv", "extra_productivity.csv"]]
+
+        self.inventory_origin_df.to_csv("inventory.csv", index=False)
+        self.remaining_productivity_origin_df.to_csv("remaining_productivity.csv", index=False)
+        self.extra_productivity_origin_df.to_csv("extra_productivity.csv", index=False)
+        batch_manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+        with patch.object(batch_manager, "flush", wraps=batch_manager.flush) as mock_flush:
+            self.assertListEqual(batch_manager.apply_many(changes), [None, None, True, None, True],
+                                 "apply_many abnormal")
+        # all files are written once at the end of the batch
+        mock_flush.assert_called_once()
+        result = [pd.read_csv(file_name) for file_name in
+                  ["inventory.csv", "remaining_productivity.csv", "extra_productivity.csv"]]
+        for expected_df, result_df in zip(expected, result):
+            self.assertTrue(result_df.equals(expected_df), "apply_many abnormal")
+
+        # nothing is written before the batch exits
+        with batch_manager.batch():
+            batch_manager.add_inventory("Lapins", 5)
+            self.assertEqual(len(pd.read_csv("inventory.csv")), len(expected[0]), "batch abnormal")
+        self.assertEqual(len(pd.read_csv("inventory.csv")), len(expected[0]) + 1, "batch abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_current_state(self, mock_stdout):
+        # reads and writes use the current state vector, and don't build any DataFrame
+        with patch('pandas.DataFrame', side_effect=AssertionError("DataFrame built")), \
+                patch('pandas.concat', side_effect=AssertionError("DataFrame built")):
+            self.assertEqual(self.inventory_manager.available("Elberta"), 400, "available abnormal")
+            self.assertIsNone(self.inventory_manager.available("Elb"), "available abnormal")
+            self.inventory_manager.add_inventory("Elberta", 100)
+            self.assertTrue(self.inventory_manager.remove_inventory("Elberta", 30))
+            self.inventory_manager.add_inventory("Gala", 10)
+            self.assertEqual(self.inventory_manager.available("Elberta"), 470, "available abnormal")
+            self.assertListEqual(self.inventory_manager.get_current_inventory(), [5, 300, 10, 0, 0, 0, 0, 0, 470, 0],
+                                 "get_current_inventory abnormal")
+            self.assertListEqual(self.inventory_manager.get_extra_productivity(), [2, 0, 110, 50, 0, 0, 0, 0, 0, 0],
+                                 "get_extra_productivity abnormal")
+        self.assertListEqual(list(self.inventory_manager.inventory.iloc[-1]), [5, 300, 10, 0, 0, 0, 0, 0, 470, 0],
+                             "current state abnormal")
+        self.assertListEqual(list(self.inventory_manager.remaining_productivity.iloc[-1]),
+                             [3, 30000, 0, 0, 40000, 0, 0, 0, 71900, 0], "current state abnormal")
+
+        # replacing the history also replaces the current state
+        self.inventory_manager.inventory = pd.read_csv("inventory.csv", nrows=0)
+        self.assertEqual(self.inventory_manager.available("Elberta"), 0, "available abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_delta_ledger(self, mock_stdout):
+        delta_files = ["inventory_delta.csv", "remaining_productivity_delta.csv", "extra_productivity_delta.csv"]
+        origin_dfs = [self.inventory_origin_df, self.remaining_productivity_origin_df,
+                      self.extra_productivity_origin_df]
+        try:
+            ledgers = [DeltaLedger(file_name, snapshot_interval=3) for file_name in delta_files]
+            # import the existing history
+            for ledger, origin_df in zip(ledgers, origin_dfs):
+                ledger.frame = origin_df.copy()
+                ledger.rewrite()
+            delta_manager = InventoryManagement(ledgers[2], ledgers[1], ledgers[0])
+            changes = [("Ambrosia", 10), ("Gala", 100), ("Elberta", -50), ("Lapins", 200), ("Ambrosia", -20),
+                       ("Lapins", 0), ("Honeycrisp", 30)]
+            self.inventory_manager.apply_many(changes)
+            delta_manager.apply_many(changes)
+
+            # only the changed variety is stored
+            events = pd.read_csv("inventory_delta.csv")
+            self.assertListEqual(list(events.columns), ["seq", "variety", "delta", "reason"])
+            self.assertListEqual(list(events.iloc[-1]), [9, "Honeycrisp", 30, "add_inventory"],
+                                 "delta ledger abnormal")
+
+            # reopen from the last snapshot and the events after it
+            reopened = [DeltaLedger(file_name, snapshot_interval=3) for file_name in delta_files]
+            for ledger, reopened_ledger, manager_frame in zip(
+                    ledgers, reopened, [self.inventory_manager.inventory, self.inventory_manager.remaining_productivity,
+                                        self.inventory_manager.extra_productivity]):
+                self.assertEqual(reopened_ledger.index, manager_frame.iloc[-1]["index"], "delta ledger abnormal")
+                self.assertListEqual(reopened_ledger.current, list(manager_frame.iloc[-1])[1:],
+                                     "delta ledger abnormal")
+                self.assertListEqual(reopened_ledger.frame.values.tolist(), manager_frame.values.tolist(),
+                                     "delta ledger abnormal")
+                # the state at every seq number
+                for row in manager_frame.values.tolist():
+                    self.assertListEqual(reopened_ledger.state_at(row[0]), row, "state_at abnormal")
+            self.assertIsNone(reopened[0].state_at(0), "state_at abnormal")
+
+            # the rows of a batch are read before they are written, without writing half of the batch
+            events_size = os.path.getsize("inventory_delta.csv")
+            with delta_manager.batch():
+                delta_manager.add_inventory("Gala", 10)
+                self.assertListEqual(ledgers[0].state_at(10), [10, 290, 110, 30, 200, 0, 0, 0, 350, 0],
+                                     "state_at abnormal")
+                self.assertListEqual(delta_manager.inventory.values.tolist()[-1],
+                                     [10, 290, 110, 30, 200, 0, 0, 0, 350, 0], "delta ledger abnormal")
+                delta_manager.add_inventory("Gala", 5)
+                self.assertEqual(os.path.getsize("inventory_delta.csv"), events_size, "delta ledger abnormal")
+            self.assertListEqual(DeltaLedger("inventory_delta.csv").frame.values.tolist(),
+                                 delta_manager.inventory.values.tolist(), "delta ledger abnormal")
+            self.assertListEqual(DeltaLedger("inventory_delta.csv").state_at(11),
+                                 [11, 290, 115, 30, 200, 0, 0, 0, 350, 0], "state_at abnormal")
+        finally:
+            for file_name in delta_files + [file_name.replace(".csv", "_snapshots.csv") for file_name in delta_files] \
+                    + [file_name.replace(".csv", "_timeline.csv") for file_name in delta_files]:
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+
+    def test_state_at(self):
+        before_first = datetime.now()
+        time.sleep(0.01)
+        self.inventory_manager.add_inventory("Lapins", 100)
+        time.sleep(0.01)
+        after_first = datetime.now()
+        time.sleep(0.01)
+        self.inventory_manager.remove_inventory("Lapins", 40)
+
+        # by index
+        self.assertListEqual(self.inventory_manager.state_at(1), [1, 300, 0, 0, 0, 0, 0, 0, 0, 0],
+                             "state_at abnormal")
+        self.assertListEqual(self.inventory_manager.state_at(3), [3, 300, 0, 0, 100, 0, 0, 0, 400, 0],
+                             "state_at abnormal")
+        self.assertIsNone(self.inventory_manager.state_at(0), "state_at abnormal")
+        # by time, the rows of the original files have no timestamp
+        self.assertIsNone(self.inventory_manager.state_at(before_first), "state_at abnormal")
+        self.assertListEqual(self.inventory_manager.state_at(after_first), [3, 300, 0, 0, 100, 0, 0, 0, 400, 0],
+                             "state_at abnormal")
+        self.assertListEqual(self.inventory_manager.state_at(datetime.now().isoformat()),
+                             [4, 300, 0, 0, 60, 0, 0, 0, 400, 0], "state_at abnormal")
+        self.assertListEqual(self.inventory_manager.state_at(after_first, 2),
+                             [2, 30000, 0, 0, 39900, 0, 0, 0, 72000, 0], "state_at abnormal")
+
+        # timestamps are kept in the timeline file
+        reopened = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+        self.assertListEqual(reopened.state_at(after_first), [3, 300, 0, 0, 100, 0, 0, 0, 400, 0],
+                             "state_at abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_fast_open(self, mock_stdout):
+        # only the last row of each file is read when the manager is opened
+        with patch('pandas.read_csv', side_effect=AssertionError("full history read")):
+            manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+            self.assertListEqual(manager.get_current_inventory(), [2, 300, 0, 0, 0, 0, 0, 0, 400, 0],
+                                 "fast open abnormal")
+            self.assertListEqual(manager.get_remaining_productivity(), [1, 30000, 0, 0, 40000, 0, 0, 0, 72000, 0],
+                                 "fast open abnormal")
+            manager.add_inventory("Ambrosia", 10)
+            self.assertTrue(manager.remove_inventory("Elberta", 100))
+        # the full history is loaded when it is asked for
+        self.assertListEqual(manager.inventory.values.tolist(),
+                             [[1, 300, 0, 0, 0, 0, 0, 0, 0, 0], [2, 300, 0, 0, 0, 0, 0, 0, 400, 0],
+                              [3, 310, 0, 0, 0, 0, 0, 0, 400, 0], [4, 310, 0, 0, 0, 0, 0, 0, 300, 0]],
+                             "fast open abnormal")
+
+        # empty file with only the header
+        self.inventory_origin_df.iloc[0:0].to_csv("inventory.csv", index=False)
+        manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+        self.assertIsNone(manager.get_current_inventory(), "fast open abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_sqlite_ledger(self, mock_stdout):
+        db_path = "inventory_test.db"
+        try:
+            ledgers = {}
+            for table, origin_df in [("inventory", self.inventory_origin_df),
+                                     ("remaining_productivity", self.remaining_productivity_origin_df),
+                                     ("extra_productivity", self.extra_productivity_origin_df)]:
+                ledgers[table] = SqliteLedger(db_path, table)
+                ledgers[table].frame = origin_df
+                ledgers[table].rewrite()
+            manager = InventoryManagement(ledgers["extra_productivity"], ledgers["remaining_productivity"],
+                                          ledgers["inventory"])
+            manager.add_inventory("Lapins", 100)
+            self.assertTrue(manager.remove_inventory("Ambrosia", 100))
+            self.assertFalse(manager.remove_inventory("Gala", 100))
+            self.assertListEqual(manager.get_current_inventory(), [4, 200, 0, 0, 100, 0, 0, 0, 400, 0],
+                                 "sqlite ledger abnormal")
+
+            # reopen from the database
+            reopened = InventoryManagement(SqliteLedger(db_path, "extra_productivity"),
+                                           SqliteLedger(db_path, "remaining_productivity"),
+                                           SqliteLedger(db_path, "inventory"))
+            self.assertListEqual(reopened.get_current_inventory(), [4, 200, 0, 0, 100, 0, 0, 0, 400, 0],
+                                 "sqlite ledger abnormal")
+            self.assertListEqual(reopened.get_remaining_productivity(), [2, 30000, 0, 0, 39900, 0, 0, 0, 72000, 0],
+                                 "sqlite ledger abnormal")
+            self.assertListEqual(reopened.inventory.values.tolist(),
+                                 [[1, 300, 0, 0, 0, 0, 0, 0, 0, 0], [2, 300, 0, 0, 0, 0, 0, 0, 400, 0],
+                                  [3, 300, 0, 0, 100, 0, 0, 0, 400, 0], [4, 200, 0, 0, 100, 0, 0, 0, 400, 0]],
+                                 "sqlite ledger abnormal")
+            self.assertListEqual(reopened.state_at(3), [3, 300, 0, 0, 100, 0, 0, 0, 400, 0], "sqlite ledger abnormal")
+            self.assertListEqual(reopened.state_at(datetime.now()), [4, 200, 0, 0, 100, 0, 0, 0, 400, 0],
+                                 "sqlite ledger abnormal")
+            # rows of a batch are found before they are inserted
+            with reopened.batch():
+                reopened.add_inventory("Gala", 10)
+                self.assertListEqual(reopened.state_at(5), [5, 200, 10, 0, 100, 0, 0, 0, 400, 0],
+                                     "sqlite ledger abnormal")
+        finally:
+            for file_name in [db_path, db_path + "-wal", db_path + "-shm"]:
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_columnar_ledger(self, mock_stdout):
+        directories = ["inventory_columns", "remaining_productivity_columns", "extra_productivity_columns"]
+        try:
+            for directory, file_name in zip(directories, ["inventory.csv", "remaining_productivity.csv",
+                                                          "extra_productivity.csv"]):
+                ColumnarLedger(directory).import_csv(file_name)
+            # an existing directory is opened as a ColumnarLedger
+            manager = InventoryManagement(directories[2], directories[1], directories[0])
+            self.assertIsInstance(manager._ledgers[1], ColumnarLedger)
+            self.assertListEqual(manager.get_current_inventory(), [2, 300, 0, 0, 0, 0, 0, 0, 400, 0],
+                                 "columnar ledger abnormal")
+            manager.add_inventory("Lapins", 100.5)
+            self.assertTrue(manager.remove_inventory("Ambrosia", 100))
+
+            reopened = ColumnarLedger(directories[0])
+            self.assertEqual(len(reopened), 4, "columnar ledger abnormal")
+            self.assertListEqual([reopened.index] + reopened.current, [4, 200, 0, 0, 100.5, 0, 0, 0, 400, 0],
+                                 "columnar ledger abnormal")
+            # a column range is mapped to the file without being copied
+            lapins = reopened.column("Lapins", 1, 3)
+            self.assertIsInstance(lapins, np.memmap)
+            self.assertListEqual(lapins.tolist(), [0, 100.5], "columnar ledger abnormal")
+            self.assertEqual(reopened.column("Ambrosia").sum(), 1100, "columnar ledger abnormal")
+            self.assertListEqual(reopened.state_at(3), [3, 300, 0, 0, 100.5, 0, 0, 0, 400, 0],
+                                 "columnar ledger abnormal")
+            self.assertListEqual(reopened.frame["Ambrosia"].tolist(), [300, 300, 300, 200],
+                                 "columnar ledger abnormal")
+
+            # a row only partly written is dropped when the ledger is opened
+            with open(os.path.join(directories[0], "Ambrosia.bin"), "ab") as file:
+                file.write(np.zeros(1).tobytes())
+            self.assertEqual(len(ColumnarLedger(directories[0])), 4, "columnar ledger abnormal")
+
+            # export to CSV
+            reopened.export_csv("inventory_export.csv")
+            self.assertListEqual(pd.read_csv("inventory_export.csv")["Ambrosia"].tolist(), [300, 300, 300, 200],
+                                 "columnar ledger abnormal")
+
+            plotter = HistoricalPlotter(directories[1], directories[0])
+            with patch('pandas.read_csv') as mock_read_csv, patch('matplotlib.pyplot.show'):
+                self.assertEqual(plotter.plot_historical_data(2, 1), "Inventory Management - Cherry",
+                                 "columnar ledger abnormal")
+            mock_read_csv.assert_not_called()
+        finally:
+            for directory in directories:
+                shutil.rmtree(directory, ignore_errors=True)
+            if os.path.exists("inventory_export.csv"):
+                os.remove("inventory_export.csv")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_concurrent_operations(self, mock_stdout):
+        manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv",
+                                      write_behind=True)
+        threads_number, operations = 8, 100
+        reserved = {"Ambrosia": [], "Elberta": []}
+
+        def worker():
+            for i in range(operations):
+                for variety in reserved:
+                    reserved[variety].append(manager.try_reserve(variety, 1))
+                manager.add_inventory("Lapins", 1)
+
+        threads = [threading.Thread(target=worker) for i in range(threads_number)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        manager.close()
+
+        # no oversell and no lost update
+        self.assertEqual(reserved["Ambrosia"].count(True), 300, "concurrent operations abnormal")
+        self.assertEqual(reserved["Elberta"].count(True), 400, "concurrent operations abnormal")
+        inventory = pd.read_csv("inventory.csv")
+        added = threads_number * operations
+        self.assertEqual(len(inventory), 2 + 300 + 400 + added, "concurrent operations abnormal")
+        self.assertListEqual(list(inventory["index"]), list(range(1, len(inventory) + 1)),
+                             "concurrent operations abnormal")
+        self.assertListEqual(list(inventory.iloc[-1]), [len(inventory), 0, 0, 0, added, 0, 0, 0, 0, 0],
+                             "concurrent operations abnormal")
+        self.assertTrue((inventory[["Ambrosia", "Elberta"]] >= 0).all().all(), "concurrent operations abnormal")
+        remaining = pd.read_csv("remaining_productivity.csv")
+        self.assertEqual(remaining["Lapins"].iloc[-1], 40000 - added, "concurrent operations abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_thread_writes(self, mock_stdout):
+        threads_number, operations = 4, 50
+        written = []
+
+        def worker():
+            for i in range(operations):
+                self.inventory_manager.add_inventory("Lapins", 1)
+                # the rows of an operation are written when it returns
+                written.append(len(pd.read_csv("inventory.csv")) >= 3)
+
+        threads = [threading.Thread(target=worker) for i in range(threads_number)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(written), "thread writes abnormal")
+        self.assertEqual(len(pd.read_csv("inventory.csv")), 2 + threads_number * operations, "thread writes abnormal")
+
+        # the rows of a batch are not written by the flush of another thread
+        with self.inventory_manager.batch():
+            self.inventory_manager.add_inventory("Lapins", 1)
+            flushing = threading.Thread(target=self.inventory_manager.flush)
+            flushing.start()
+            flushing.join(0.2)
+            self.assertTrue(flushing.is_alive(), "thread writes abnormal")
+            self.assertEqual(len(pd.read_csv("inventory.csv")), 2 + threads_number * operations,
+                             "thread writes abnormal")
+        flushing.join()
+        self.assertEqual(len(pd.read_csv("inventory.csv")), 3 + threads_number * operations, "thread writes abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_multiprocess_last_units(self, mock_stdout):
+        self.inventory_manager.add_inventory("Gala", 60)
+        processes_number, attempts = 8, 20
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=reserve_worker, args=(attempts, results))
+                     for i in range(processes_number)]
+        for process in processes:
+            process.start()
+        reserved = sum(results.get(timeout=60) for process in processes)
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0, "multiprocess last units abnormal")
+        # the last units are reserved once, and the inventory never goes below 0
+        self.assertEqual(reserved, 60, "multiprocess last units abnormal")
+        inventory = pd.read_csv("inventory.csv")
+        self.assertEqual(len(inventory), 3 + 60, "multiprocess last units abnormal")
+        self.assertEqual(inventory["Gala"].iloc[-1], 0, "multiprocess last units abnormal")
+        self.assertTrue((inventory["Gala"] >= 0).all(), "multiprocess last units abnormal")
+
+        # an instance counts the reservations of another instance of the process that are not written yet
+        self.inventory_manager.add_inventory("Gala", 10)
+        other = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv", "inventory.csv")
+        with self.inventory_manager.batch():
+            self.assertTrue(self.inventory_manager.try_reserve("Gala", 10), "multiprocess last units abnormal")
+            with other.batch():
+                self.assertFalse(other.try_reserve("Gala", 10), "multiprocess last units abnormal")
+                self.assertEqual(other.available("Gala"), 0, "multiprocess last units abnormal")
+        self.assertEqual(pd.read_csv("inventory.csv")["Gala"].iloc[-1], 0, "multiprocess last units abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_multiprocess_writers(self, mock_stdout):
+        processes_number, operations = 4, 50
+        processes = [multiprocessing.Process(target=add_inventory_worker, args=(operations,))
+                     for i in range(processes_number)]
+        for process in processes:
+            process.start()
+        # this process writes too, and sees the rows written by the others
+        for i in range(operations):
+            self.inventory_manager.add_inventory("Lapins", 1)
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0, "multiprocess writers abnormal")
+
+        added = (processes_number + 1) * operations
+        inventory = pd.read_csv("inventory.csv")
+        # no row is lost or written twice
+        self.assertEqual(len(inventory), 2 + added + processes_number * operations, "multiprocess writers abnormal")
+        self.assertListEqual(list(inventory["index"]), list(range(1, len(inventory) + 1)),
+                             "multiprocess writers abnormal")
+        self.assertListEqual(list(inventory.iloc[-1]),
+                             [len(inventory), 300, 0, 0, added, 0, 0, 0, 400 - processes_number * operations, 0],
+                             "multiprocess writers abnormal")
+        self.assertEqual(self.inventory_manager.available("Lapins"), added, "multiprocess writers abnormal")
+        self.assertEqual(pd.read_csv("remaining_productivity.csv")["Lapins"].iloc[-1], 40000 - added,
+                         "multiprocess writers abnormal")
+
     def test_get_remaining_productivity(self):
         self.assertListEqual(self.inventory_manager.get_remaining_productivity(),
                              [1, 30000, 0, 0, 40000, 0, 0, 0, 72000, 0], "get_remaining_productivity abnormal")
@@ -1,13 +1,25 @@
+import glob
 import os
 import os.path
+import shutil
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import unittest
 import pandas as pd
+from datetime import date, datetime
 from unittest.mock import patch
 from io import StringIO
 from management.inventory import InventoryManagement
 from management.sales import SalesManagement
+from management.idempotency import IdempotencyIndex
+from management.journal import Journal
+from management.ledger import CsvLedger
+from management.order_store import ORDER_COLUMNS, CsvOrderStore, append_orders, compact_orders
+from management.partitioned_store import PartitionedOrderStore
+from management.pricing import PriceIndex
+from production import fruit_info
+from management.migrate import migrate
+from management.sqlite_storage import SqliteLedger, SqliteOrderStore
 
 
 class TestSalesManagement(unittest.TestCase):
@@ -46,8 +58,12 @@ class TestSalesManagement(unittest.TestCase):
         print("Tearing down test...")
         # Clean up any resources used during the test
         del self.inventory_manager
-        files_to_remove = ["inventory.csv", "orders.csv", "remaining_productivity.csv", "extra_productivity.csv"]
-        for file_name in files_to_remove:
+        files_to_remove = ["inventory.csv", "orders.csv", "remaining_productivity.csv", "extra_productivity.csv",
+                           "inventory_timeline.csv", "remaining_productivity_timeline.csv",
+                           "extra_productivity_timeline.csv", "orders_timeline.csv", "journal.log",
+                           "fruits_test.csv", "plantations_test.csv", "orders_keys.csv",
+                           "orders_prices.csv"]
+        for file_name in files_to_remove + glob.glob("*.lock"):
             if os.path.exists(file_name):
                 os.remove(file_name)
 
@@ -86,6 +102,120 @@ class TestSalesManagement(unittest.TestCase):
         self.assertListEqual(list(self.sales_manager.orders.iloc[0]),
                              [1, "selling", 1, "Ambrosia", 10, 1.2, 12], "add_order abnormal")
 
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_compact_orders(self, mock_stdout):
+        self.sales_manager.add_order('selling', 'Ambrosia', 50)
+        self.sales_manager.add_orders([("picking", "Lapins", 10), ("selling", "Elberta", 2.5)])
+        orders = self.sales_manager.orders
+        self.assertListEqual([str(dtype) for dtype in orders.dtypes],
+                             ["int64", "category", "int8", "category", "float64", "float64", "float64"],
+                             "compact orders abnormal")
+        # whole weights stay wide enough for their sums
+        whole = compact_orders(pd.DataFrame([[1, "selling", 1, "Ambrosia", 100, 1.2, 120.0],
+                                             [2, "selling", 1, "Ambrosia", 100, 1.2, 120.0]], columns=ORDER_COLUMNS))
+        self.assertListEqual([str(whole[column].dtype) for column in ["index", "fruit_type", "weight"]],
+                             ["int64", "int8", "int64"], "compact orders abnormal")
+        self.assertEqual((whole["weight"] * 2).sum(), 400, "compact orders abnormal")
+        self.assertListEqual(list(orders.iloc[5]), [6, "selling", 3, "Elberta", 2.5, 1.2, 3.0],
+                             "compact orders abnormal")
+        self.assertEqual(self.sales_manager.revenue_totals("fruit_variety")["Lapins"], 149.5, "compact orders abnormal")
+        # a new value is added to the end of the categories
+        orders = append_orders(orders, [[7, "picking", 1, "Gala", 10, 0.8, 8.0]])
+        self.assertListEqual(list(orders["fruit_variety"].cat.categories), ["Ambrosia", "Elberta", "Lapins", "Gala"],
+                             "compact orders abnormal")
+        self.assertListEqual(list(orders["fruit_variety"].cat.codes), [0, 1, 2, 0, 2, 1, 3], "compact orders abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_selling_order_inventory(self, mock_stdout):
+        # a selling order removes its weight from the inventory once, writing one row
+        self.assertTrue(self.sales_manager.add_order('selling', 'Ambrosia', 50))
+        self.assertEqual(self.inventory_manager.available("Ambrosia"), 250, "selling order abnormal")
+        self.assertEqual(len(pd.read_csv("inventory.csv")), 3, "selling order abnormal")
+        # an order larger than the inventory is not added and doesn't change the inventory
+        self.assertFalse(self.sales_manager.add_order('selling', 'Ambrosia', 300))
+        self.assertIn("Order cannot be added.", mock_stdout.getvalue(), "selling order abnormal")
+        self.assertEqual(self.inventory_manager.available("Ambrosia"), 250, "selling order abnormal")
+        self.assertEqual(len(self.sales_manager.orders), 4, "selling order abnormal")
+        self.assertEqual(len(pd.read_csv("orders.csv")), 4, "selling order abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_add_orders(self, mock_stdout):
+        orders = pd.DataFrame({"sales_type": ["selling", "selling", "picking", "sale", "selling", "selling",
+                                              "picking", "selling"],
+                               "fruit_variety": ["Ambrosia", "Ambrosia", "Lapins", "Gala", "Amb", "Gala", "Elberta",
+                                                 "Elberta"],
+                               "weight": [100, 250, 10, 1, 3, 3, -1, 20]})
+        rejects = self.sales_manager.add_orders(orders)
+        self.assertListEqual(list(rejects.index), [1, 3, 4, 5, 6], "add_orders abnormal")
+        self.assertListEqual(list(rejects["reason"]), ["not enough inventory", "unknown sales type",
+                                                       "unknown variety", "no price", "invalid weight"],
+                             "add_orders abnormal")
+        self.assertEqual(mock_stdout.getvalue(), "", "add_orders abnormal")
+        # the accepted orders are written in one write, with their revenue
+        self.assertListEqual(pd.read_csv("orders.csv").values.tolist()[3:],
+                             [[4, "selling", 1, "Ambrosia", 100, 1.2, 120.0],
+                              [5, "picking", 2, "Lapins", 10, 2.99, 29.9],
+                              [6, "selling", 3, "Elberta", 20, 1.2, 24.0]], "add_orders abnormal")
+        self.assertEqual(len(self.sales_manager.orders), 6, "add_orders abnormal")
+        # one row for all the selling orders, and one for all the picking orders
+        inventory = pd.read_csv("inventory.csv")
+        self.assertListEqual(inventory.values.tolist()[-1], [3, 200, 0, 0, 0, 0, 0, 0, 380, 0],
+                             "add_orders abnormal")
+        remaining = pd.read_csv("remaining_productivity.csv")
+        self.assertEqual(len(remaining), 2, "add_orders abnormal")
+        self.assertEqual(remaining["Lapins"].iloc[-1], 39990, "add_orders abnormal")
+
+        # tuples, and orders that are all rejected
+        rejects = self.sales_manager.add_orders([("selling", "Ambrosia", 500)])
+        self.assertListEqual(list(rejects["reason"]), ["not enough inventory"], "add_orders abnormal")
+        self.assertEqual(len(pd.read_csv("inventory.csv")), 3, "add_orders abnormal")
+        # a rejected order doesn't reserve inventory for the following orders
+        rejects = self.sales_manager.add_orders([("selling", "Ambrosia", 500), ("selling", "Ambrosia", 150),
+                                                 ("selling", "Ambrosia", 60), ("selling", "Ambrosia", 50)])
+        self.assertListEqual(list(rejects.index), [0, 2], "add_orders abnormal")
+        self.assertEqual(self.inventory_manager.available("Ambrosia"), 0, "add_orders abnormal")
+        self.assertEqual(len(pd.read_csv("orders.csv")), 8, "add_orders abnormal")
+        # nothing is written if the inventory cannot be removed
+        with patch.object(self.inventory_manager, "remove_many", return_value=False):
+            rejects = self.sales_manager.add_orders([("picking", "Lapins", 10)])
+        self.assertListEqual(list(rejects["reason"]), ["not enough inventory"], "add_orders abnormal")
+        self.assertEqual(len(pd.read_csv("orders.csv")), 8, "add_orders abnormal")
+        self.assertEqual(len(self.sales_manager.orders), 8, "add_orders abnormal")
+        with self.assertRaises(ValueError):
+            self.sales_manager.add_orders([{"sales_type": "selling", "weight": 1}])
+
+        # picking orders are rejected while the capacity is not estimated
+        pd.read_csv("remaining_productivity.csv").iloc[0:0].to_csv("remaining_empty.csv", index=False)
+        try:
+            inventory_manager = InventoryManagement("extra_productivity.csv", "remaining_empty.csv", "inventory.csv")
+            self.assertFalse(inventory_manager.remove_many(remaining={"Lapins": 10}), "add_orders abnormal")
+            sales_manager = SalesManagement(inventory_manager, "orders.csv")
+            rejects = sales_manager.add_orders([("picking", "Lapins", 10), ("selling", "Elberta", 10)])
+            self.assertListEqual(list(rejects.index), [0], "add_orders abnormal")
+            self.assertListEqual(list(rejects["reason"]), ["capacity not estimated"], "add_orders abnormal")
+            self.assertListEqual(pd.read_csv("orders.csv").values.tolist()[-1],
+                                 [9, "selling", 3, "Elberta", 10, 1.2, 12.0], "add_orders abnormal")
+            self.assertEqual(len(pd.read_csv("remaining_empty.csv")), 0, "add_orders abnormal")
+        finally:
+            for file_name in ["remaining_empty.csv", "remaining_empty_timeline.csv"]:
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_shared_order_file(self, mock_stdout):
+        # a second instance, as in another process, working on the same files
+        other_inventory = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv",
+                                              "inventory.csv")
+        other_sales = SalesManagement(other_inventory, "orders.csv")
+        self.assertTrue(other_sales.add_order('selling', 'Ambrosia', 50))
+        self.assertTrue(self.sales_manager.add_order('selling', 'Ambrosia', 100))
+        # the orders and the inventory written by the other instance are reloaded before writing
+        orders = pd.read_csv("orders.csv")
+        self.assertListEqual(list(orders["index"]), [1, 2, 3, 4, 5], "shared order file abnormal")
+        self.assertEqual(self.inventory_manager.available("Ambrosia"), 150, "shared order file abnormal")
+        self.assertEqual(other_sales.order_display(), 5, "shared order file abnormal")
+        self.assertEqual(other_inventory.available("Ambrosia"), 150, "shared order file abnormal")
+
     def test_order_display(self):
         self.assertEqual(self.sales_manager.order_display(), 3, "order_display abnormal")
 
@@ -118,6 +248,329 @@ class TestSalesManagement(unittest.TestCase):
         self.assertIn("No data available.",
                       printed_output, "revenue_display abnormal when orders empty")
 
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_revenue_totals(self, mock_stdout):
+        self.sales_manager.add_order('selling', 'Ambrosia', 50)
+        self.sales_manager.add_orders([("picking", "Lapins", 10), ("selling", "Elberta", 20)])
+        self.assertDictEqual(self.sales_manager.revenue_totals("fruit_type"), {1: 120.0, 2: 149.5, 3: 84.0},
+                             "revenue_totals abnormal")
+        self.assertDictEqual(self.sales_manager.revenue_totals("fruit_variety"),
+                             {"Ambrosia": 120.0, "Elberta": 84.0, "Lapins": 149.5}, "revenue_totals abnormal")
+        # the dashboards use the running totals, the orders are not grouped again
+        with patch.object(pd.DataFrame, "groupby", side_effect=AssertionError("orders grouped")), \
+                patch('matplotlib.pyplot.show'):
+            result = self.sales_manager.revenue_display("sales_type")
+            self.sales_manager.revenue_plotter()
+        self.assertTrue(result.equals(pd.DataFrame({'sales_type': ['picking', 'selling'],
+                                                    'revenue': [149.5, 204.0]})), "revenue_display abnormal")
+        with self.assertRaises(ValueError):
+            self.sales_manager.revenue_totals("weight")
+
+        # the totals are rebuilt when the orders written by another instance are reloaded
+        other_sales = SalesManagement(self.inventory_manager, "orders.csv")
+        other_sales.add_order('selling', 'Lapins', 0)
+        other_sales.add_order('picking', 'Ambrosia', 10)
+        self.assertEqual(self.sales_manager.revenue_totals("fruit_type")[1], 132.0, "revenue_totals abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_price_index(self, mock_stdout):
+        open("fruits_test.csv", "w").close()
+        fruit_info.add_fruit(1, "Ambrosia", "big", "very sweet", "less sour", "crunchy", 1.2, "pie", "fruits_test.csv")
+        sales_manager = SalesManagement(self.inventory_manager, "orders.csv", "fruits_test.csv")
+        self.assertEqual(sales_manager.price_index.price(1, "Ambrosia", 4), 1.2, "price index abnormal")
+        with self.assertRaises(ValueError):
+            sales_manager.add_order("picking", "Gala", 10)
+        # a fruit added to the catalog can be sold
+        fruit_info.add_fruit(1, "Gala", "big", "sweet", "less sour", "crunchy", 0.8, "snack", "fruits_test.csv")
+        self.assertTrue(sales_manager.add_order("picking", "Gala", 10))
+        self.assertListEqual(list(sales_manager.orders.iloc[-1]), [4, "picking", 1, "Gala", 10, 0.8, 8.0],
+                             "price index abnormal")
+        # a price set on a fruit of the index is used from the next order
+        sales_manager.price_index.fruits[(1, "Ambrosia")].set_price(1.5)
+        self.assertTrue(sales_manager.add_order("selling", "Ambrosia", 10))
+        rejects = sales_manager.add_orders([("selling", "Ambrosia", 10), ("selling", "Lapins", 10)])
+        self.assertListEqual(list(rejects["reason"]), ["no price"], "price index abnormal")
+        self.assertListEqual(list(sales_manager.orders["unit_price"])[3:], [0.8, 1.5, 1.5], "price index abnormal")
+
+        # the price history gives the price effective at each order
+        index = sales_manager.price_index
+        self.assertEqual(index.price_at(1, "Ambrosia", 4), 1.2, "price history abnormal")
+        self.assertEqual(index.price_at(1, "Ambrosia", 5), 1.5, "price history abnormal")
+        self.assertIsNone(index.price_at(1, "Gala", 3), "price history abnormal")
+        self.assertListEqual(index.reprice(sales_manager.orders.iloc[3:]), [0.8, 1.5, 1.5], "price history abnormal")
+        self.assertIsInstance(PriceIndex().price(2, "Lapins", 1), float, "price index abnormal")
+
+        # the price history is read back from its file, a price changed in between is effective from the next order
+        fruit_info.add_fruit(1, "Honeycrisp", "big", "sweet", "less sour", "crunchy", 2.0, "snack", "fruits_test.csv")
+        reopened = PriceIndex("fruits_test.csv", "orders_prices.csv")
+        self.assertEqual(reopened.price_at(1, "Ambrosia", 4), 1.2, "price history abnormal")
+        self.assertEqual(reopened.price_at(1, "Ambrosia", 5), 1.5, "price history abnormal")
+        self.assertEqual(reopened.price_at(1, "Gala", 4), 0.8, "price history abnormal")
+        self.assertEqual(reopened.price(1, "Honeycrisp", 7), 2.0, "price history abnormal")
+        self.assertIsNone(reopened.price_at(1, "Honeycrisp", 6), "price history abnormal")
+        self.assertEqual(PriceIndex("fruits_test.csv", "orders_prices.csv").price_at(1, "Honeycrisp", 7), 2.0,
+                         "price history abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_revenue_between(self, mock_stdout):
+        with patch("management.order_store.datetime") as mock_datetime:
+            mock_datetime.now.return_value = datetime(2026, 10, 16, 9)
+            self.sales_manager.add_order('selling', 'Ambrosia', 50)
+            mock_datetime.now.return_value = datetime(2026, 10, 16, 15)
+            self.sales_manager.add_order('picking', 'Lapins', 10)
+            mock_datetime.now.return_value = datetime(2026, 10, 19, 10)
+            self.sales_manager.add_orders([("selling", "Elberta", 20)])
+
+        # the orders written before the timeline existed have no timestamp
+        self.assertAlmostEqual(self.sales_manager.revenue_between(), 113.9, msg="revenue_between abnormal")
+        self.assertEqual(self.sales_manager.revenue_between("2026-10-16", "2026-10-16 12:00"), 60.0,
+                         "revenue_between abnormal")
+        result = self.sales_manager.revenue_between(datetime(2026, 10, 16), datetime(2026, 10, 17), by="fruit_type")
+        self.assertTrue(result.equals(pd.DataFrame({'fruit_type': [1, 2], 'revenue': [60.0, 29.9]})),
+                        "revenue_between abnormal")
+        self.assertEqual(self.sales_manager.revenue_between("2026-10-20"), 0, "revenue_between abnormal")
+
+        # the buckets of each period
+        days = self.sales_manager.revenue_rollup("day")
+        self.assertListEqual(days.values.tolist(), [[date(2026, 10, 16), 89.9], [date(2026, 10, 19), 24.0]],
+                             "revenue_rollup abnormal")
+        weeks = self.sales_manager.revenue_rollup("week", by="sales_type")
+        self.assertListEqual(weeks.values.tolist(), [[date(2026, 10, 12), "picking", 29.9],
+                                                     [date(2026, 10, 12), "selling", 60.0],
+                                                     [date(2026, 10, 19), "selling", 24.0]], "revenue_rollup abnormal")
+        with self.assertRaises(ValueError):
+            self.sales_manager.revenue_rollup("month")
+
+        # the index is rebuilt from the timeline when the orders are loaded
+        reopened = SalesManagement(self.inventory_manager, "orders.csv")
+        self.assertListEqual(reopened.revenue_rollup("season").values.tolist(), [[2026, 113.9]],
+                             "revenue_rollup abnormal")
+        self.assertEqual(reopened.revenue_between("2026-10-16 12:00", "2026-10-19 12:00"), 53.9,
+                         "revenue_between abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_revenue_cube(self, mock_stdout):
+        pd.DataFrame([[1, 1, "Ambrosia", 30, "market"], [2, 1, "Ambrosia", 10, "market"], [3, 2, "Lapins", 40, "pick"]],
+                     columns=["regionId", "fruit_type_num", "variety", "area", "areaType"]).to_csv(
+            "plantations_test.csv", index=False)
+        with patch("management.order_store.datetime") as mock_datetime:
+            mock_datetime.now.return_value = datetime(2026, 10, 16, 9)
+            self.sales_manager.add_order('selling', 'Ambrosia', 50)
+            cube = self.sales_manager.revenue_cube("plantations_test.csv")
+            # the cube is updated as orders are added
+            self.sales_manager.add_order('picking', 'Lapins', 10)
+            mock_datetime.now.return_value = datetime(2026, 10, 19, 10)
+            self.sales_manager.add_orders([("selling", "Elberta", 20), ("selling", "Ambrosia", 10)])
+        self.assertIs(self.sales_manager.revenue_cube("plantations_test.csv"), cube, "revenue_cube abnormal")
+
+        # the revenue of Ambrosia is shared by area, Elberta has no market region
+        result = cube.rollup("fruit_variety", "region")
+        self.assertListEqual(result.values.tolist(), [["Ambrosia", 1, 54.0], ["Ambrosia", 2, 18.0],
+                                                      ["Elberta", None, 24.0], ["Lapins", 3, 29.9]],
+                             "revenue_cube abnormal")
+        result = cube.rollup("week", "fruit_type")
+        self.assertListEqual(result.values.tolist(), [[date(2026, 10, 12), 1, 60.0], [date(2026, 10, 12), 2, 29.9],
+                                                      [date(2026, 10, 19), 1, 12.0], [date(2026, 10, 19), 3, 24.0]],
+                             "revenue_cube abnormal")
+        self.assertListEqual(cube.rollup().values.tolist(), [[125.9]], "revenue_cube abnormal")
+        result = cube.drilldown("week", fruit_type=1, sales_type="selling")
+        self.assertListEqual(result.values.tolist(), [[1, "selling", date(2026, 10, 12), 60.0],
+                                                      [1, "selling", date(2026, 10, 19), 12.0]],
+                             "revenue_cube abnormal")
+        result = cube.slice(season=2026, region=[1, 2]).rollup("sales_type")
+        self.assertListEqual(result.values.tolist(), [["selling", 72.0]], "revenue_cube abnormal")
+        # a slice holds only some regions, no order can be added to it
+        with self.assertRaises(ValueError):
+            cube.slice(region=[1, 2]).add(datetime(2026, 10, 16), "selling", 1, "Ambrosia", 10.0)
+        with self.assertRaises(ValueError):
+            cube.rollup("region", "month")
+        with self.assertRaises(ValueError):
+            cube.rollup("fruit_type", "fruit_variety")
+
+        # the cube built from the orders and their timeline is the same
+        reopened = SalesManagement(self.inventory_manager, "orders.csv")
+        self.assertTrue(reopened.revenue_cube("plantations_test.csv").rollup("week", "region", "sales_type").equals(
+            cube.rollup("week", "region", "sales_type")), "revenue_cube abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_sqlite_storage(self, mock_stdout):
+        db_path = "sales_test.db"
+        try:
+            self.inventory_manager.add_inventory("Elberta", 10)
+            copied = migrate(db_path, "extra_productivity.csv", "remaining_productivity.csv", "inventory.csv",
+                             "orders.csv")
+            self.assertDictEqual(copied, {"inventory": 3, "remaining_productivity": 2, "extra_productivity": 1,
+                                          "orders": 3}, "migrate abnormal")
+            # migrating again replaces the tables and their timelines
+            SqliteOrderStore(db_path).timeline._write_entries([(9, datetime(2026, 10, 16))])
+            migrate(db_path, "extra_productivity.csv", "remaining_productivity.csv", "inventory.csv", "orders.csv")
+            self.assertListEqual(SqliteOrderStore(db_path).timeline._read_entries(),
+                                 CsvOrderStore("orders.csv").timeline._read_entries(), "migrate abnormal")
+
+            inventory_manager = InventoryManagement(SqliteLedger(db_path, "extra_productivity"),
+                                                    SqliteLedger(db_path, "remaining_productivity"),
+                                                    SqliteLedger(db_path, "inventory"))
+            self.assertListEqual(inventory_manager.inventory.values.tolist(),
+                                 self.inventory_manager.inventory.values.tolist(), "migrate abnormal")
+            self.assertEqual(inventory_manager.state_at(datetime.now()), self.inventory_manager.state_at(3),
+                             "migrate abnormal")
+            sales_manager = SalesManagement(inventory_manager, SqliteOrderStore(db_path))
+            self.assertEqual(sales_manager.order_display(), 3, "sqlite orders abnormal")
+
+            sales_manager.add_order('selling', 'Ambrosia', 50)
+            # the rows written to the ledgers of the same database don't make the orders reload
+            self.assertFalse(sales_manager.order_store.changed(), "sqlite orders abnormal")
+            reopened = SalesManagement(inventory_manager, SqliteOrderStore(db_path))
+            self.assertListEqual(list(reopened.orders.iloc[3]), [4, "selling", 1, "Ambrosia", 50, 1.2, 60.0],
+                                 "sqlite orders abnormal")
+            result = reopened.revenue_display("sales_type")
+            self.assertListEqual(result.values.tolist(), [['picking', 119.6], ['selling', 180.0]],
+                                 "sqlite orders abnormal")
+            # indexed lookups
+            ambrosia = reopened.order_store.select("fruit_variety", "Ambrosia")
+            self.assertListEqual(list(ambrosia["index"]), [1, 4], "sqlite orders abnormal")
+            self.assertEqual(len(reopened.order_store.select("index", 2)), 1, "sqlite orders abnormal")
+            with self.assertRaises(ValueError):
+                reopened.order_store.select("price; DROP TABLE orders", 1)
+            # the inventory is stored in the database only
+            self.assertEqual(CsvLedger("inventory.csv").index, 3, "sqlite orders abnormal")
+            self.assertEqual(inventory_manager.get_current_inventory()[0], 4, "sqlite orders abnormal")
+        finally:
+            for file_name in [db_path, db_path + "-wal", db_path + "-shm", "sales_test_prices.csv"]:
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_partitioned_store(self, mock_stdout):
+        directory = "orders_partitions"
+        try:
+            with patch("management.order_store.datetime") as mock_datetime, \
+                    patch("management.partitioned_store.datetime") as mock_partition_datetime:
+                mock_datetime.now.return_value = mock_partition_datetime.now.return_value = datetime(2025, 10, 1)
+                sales_manager = SalesManagement(self.inventory_manager, PartitionedOrderStore(directory))
+                sales_manager.add_order('selling', 'Ambrosia', 50)
+                sales_manager.add_orders([("picking", "Lapins", 10)])
+                # a new season loads only its own partition, and the order indexes go on
+                mock_datetime.now.return_value = mock_partition_datetime.now.return_value = datetime(2026, 10, 16)
+                sales_manager = SalesManagement(self.inventory_manager, PartitionedOrderStore(directory))
+                self.assertEqual(sales_manager.order_display(), 0, "partitioned orders abnormal")
+                sales_manager.add_order('selling', 'Elberta', 20)
+            files = glob.glob("*.csv", root_dir=directory) + glob.glob("*.json", root_dir=directory)
+            self.assertListEqual(sorted(files), ["manifest.json", "manifest_prices.csv", "orders_2025.csv",
+                                                 "orders_2025_timeline.csv", "orders_2026.csv",
+                                                 "orders_2026_timeline.csv"],
+                                 "partitioned orders abnormal")
+            self.assertListEqual(list(sales_manager.orders["index"]), [3], "partitioned orders abnormal")
+            manifest = sales_manager.order_store.manifest()
+            self.assertListEqual([manifest["2025"]["rows"], manifest["2025"]["min_index"],
+                                  manifest["2025"]["max_index"]], [2, 1, 2], "partitioned orders abnormal")
+
+            with patch("management.partitioned_store.pd.read_csv", wraps=pd.read_csv) as read_csv:
+                # the summary of the whole history is read from the manifest only
+                result = sales_manager.revenue_history("fruit_type")
+                self.assertListEqual(result.values.tolist(), [[1, 1, 50, 60.0], [2, 1, 10, 29.9], [3, 1, 20, 24.0]],
+                                     "revenue_history abnormal")
+                self.assertEqual(read_csv.call_count, 0, "revenue_history abnormal")
+                # a lookup reads only the partitions that can hold the orders
+                lapins = sales_manager.order_store.select("fruit_variety", "Lapins")
+                self.assertListEqual(list(lapins["index"]), [2], "partitioned orders abnormal")
+                self.assertEqual(len(sales_manager.order_store.select("index", 3)), 1, "partitioned orders abnormal")
+                self.assertEqual(read_csv.call_count, 2, "partitioned orders abnormal")
+
+            # all partitions can be loaded, with the timeline of each one
+            store = PartitionedOrderStore(directory, load_partitions="all")
+            all_orders = SalesManagement(self.inventory_manager, store)
+            self.assertListEqual(list(all_orders.orders["index"]), [1, 2, 3], "partitioned orders abnormal")
+            # the strings are written once in the dictionaries of the manifest, the partitions hold their codes
+            self.assertDictEqual(store.dictionaries(), {"sales_type": ["selling", "picking"],
+                                                        "fruit_variety": ["Ambrosia", "Lapins", "Elberta"]},
+                                 "partitioned orders abnormal")
+            self.assertListEqual(pd.read_csv(os.path.join(directory, "orders_2025.csv"))["fruit_variety"].tolist(),
+                                 [0, 1], "partitioned orders abnormal")
+            self.assertListEqual(all_orders.orders["fruit_variety"].tolist(), ["Ambrosia", "Lapins", "Elberta"],
+                                 "partitioned orders abnormal")
+            self.assertListEqual(all_orders.revenue_rollup("season").values.tolist(), [[2025, 89.9], [2026, 24.0]],
+                                 "partitioned orders abnormal")
+            # a partition left without orders is removed with its timeline
+            store.rewrite(all_orders.orders.iloc[2:])
+            files = glob.glob("*.csv", root_dir=directory) + glob.glob("*.json", root_dir=directory)
+            self.assertListEqual(sorted(files), ["manifest.json", "manifest_prices.csv", "orders_2026.csv",
+                                                 "orders_2026_timeline.csv"], "partitioned orders abnormal")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_journal(self, mock_stdout):
+        inventory_manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv",
+                                                "inventory.csv", journal="journal.log")
+        sales_manager = SalesManagement(inventory_manager, "orders.csv")
+        sales_manager.add_order('selling', 'Ambrosia', 50)
+        # the order and its inventory row are written with one journal record
+        with open("journal.log") as file:
+            self.assertEqual(len(file.readlines()), 1, "journal abnormal")
+        self.assertEqual(CsvLedger("inventory.csv").current[0], 250, "journal abnormal")
+        self.assertEqual(CsvOrderStore("orders.csv").last_index(), 4, "journal abnormal")
+        inventory_manager.close()
+        self.assertEqual(os.path.getsize("journal.log"), 0, "journal checkpoint abnormal")
+
+        # the program stops after the journal is written, before the files are written
+        inventory = CsvLedger("inventory.csv")
+        inventory.add_rows([inventory.next_row()[:1] + [200] + inventory.current[1:]], "selling")
+        orders = CsvOrderStore("orders.csv")
+        orders.stage([[5, "selling", 1, "Ambrosia", 50, 1.2, 60.0]])
+        Journal("journal.log").write([inventory, orders])
+        with open("journal.log", "a") as file:
+            file.write('{"inventory.csv": [[6, 1')
+
+        inventory_manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv",
+                                                "inventory.csv", journal="journal.log")
+        sales_manager = SalesManagement(inventory_manager, "orders.csv")
+        self.assertListEqual(inventory_manager.get_current_inventory()[:2], [4, 200], "journal recovery abnormal")
+        self.assertListEqual(list(sales_manager.orders.iloc[-1]), [5, "selling", 1, "Ambrosia", 50, 1.2, 60.0],
+                             "journal recovery abnormal")
+        # the rows already written are not written again
+        inventory_manager = InventoryManagement("extra_productivity.csv", "remaining_productivity.csv",
+                                                "inventory.csv", journal="journal.log")
+        sales_manager = SalesManagement(inventory_manager, "orders.csv")
+        self.assertEqual(len(inventory_manager.inventory), 4, "journal recovery abnormal")
+        self.assertEqual(len(sales_manager.orders), 5, "journal recovery abnormal")
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_idempotency_key(self, mock_stdout):
+        self.assertTrue(self.sales_manager.add_order('selling', 'Ambrosia', 50, idempotency_key="tablet-1/0001"),
+                        "idempotency abnormal")
+        order = self.sales_manager.find_order_by_key("tablet-1/0001")
+        self.assertListEqual(list(order), [4, "selling", 1, "Ambrosia", 50, 1.2, 60.0], "idempotency abnormal")
+        inventory = self.inventory_manager.get_current_inventory()
+        # a retry adds nothing, and the same order is found without any inventory change
+        self.assertTrue(self.sales_manager.add_order('selling', 'Ambrosia', 50, idempotency_key="tablet-1/0001"),
+                        "idempotency abnormal")
+        self.assertListEqual(list(self.sales_manager.find_order_by_key("tablet-1/0001")), list(order),
+                             "idempotency abnormal")
+        self.assertEqual(len(self.sales_manager.orders), 4, "idempotency abnormal")
+        self.assertListEqual(self.inventory_manager.get_current_inventory(), inventory, "idempotency abnormal")
+        self.assertFalse(self.sales_manager.add_order('selling', 'Ambrosia', 10 ** 6, idempotency_key="tablet-1/0002"),
+                         "idempotency abnormal")
+        self.assertIsNone(self.sales_manager.find_order_by_key("tablet-1/0002"), "idempotency abnormal")
+
+        # the keys are persistent
+        reopened = SalesManagement(self.inventory_manager, "orders.csv")
+        self.assertTrue(reopened.add_order('selling', 'Ambrosia', 50, idempotency_key="tablet-1/0001"),
+                        "idempotency abnormal")
+        self.assertEqual(reopened.find_order_by_key("tablet-1/0001")["index"], 4, "idempotency abnormal")
+        self.assertEqual(len(pd.read_csv("orders.csv")), 4, "idempotency abnormal")
+
+        # only the last window keys are kept, and the file is compacted past twice the window
+        keys = IdempotencyIndex("orders_keys.csv", window=2)
+        keys.stage([[5, "a"], [6, "b"], [7, "c"]])
+        keys.flush()
+        self.assertIsNone(keys.get("tablet-1/0001"), "idempotency abnormal")
+        self.assertListEqual([keys.get("b"), keys.get("c"), len(keys)], [6, 7, 2], "idempotency abnormal")
+        self.assertEqual(len(pd.read_csv("orders_keys.csv")), 4, "idempotency abnormal")
+        keys.stage([[8, "d"]])
+        keys.flush()
+        self.assertListEqual(pd.read_csv("orders_keys.csv")["key"].tolist(), ["c", "d"], "idempotency abnormal")
+
     @patch('sys.stdout', new_callable=StringIO)
     def test_check_inventory(self, mock_stdout):
         self.sales_manager.check_inventory("Ambrosia", 10)